@@ -0,0 +1,270 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from mcp.server.lowlevel.server import request_ctx
+from .settings import PRIORITIES, Settings, add_reload_listener, get_settings
+from .logger import default_logger
+from .backends import Backend, get_backend_pool
+from .metrics import observe_phase
+from .tracing import get_tracer
+
+class AdmissionRejected(Exception):
+    """
+    等待队列已满，请求被拒绝
+    The wait queue is full and the request was rejected
+    """
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(
+            f"ComfyUI任务队列已满，请在 {retry_after} 秒后重试 | "
+            f"ComfyUI job queue is full, retry after {retry_after}s"
+        )
+
+class _Waiter:
+    __slots__ = ('future', 'client', 'priority', 'enqueued_at')
+
+    def __init__(self, client: str, priority: str):
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.client = client
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+def current_client() -> str:
+    """
+    当前MCP会话的标识，用于公平调度；不在MCP请求中时为 local
+    Identity of the current MCP session used for fair scheduling; local outside an MCP request
+    """
+    try:
+        return f"session-{id(request_ctx.get().session):x}"
+    except LookupError:
+        return "local"
+
+def current_priority() -> Optional[str]:
+    """
+    读取请求 _meta.priority 中客户端指定的优先级
+    Read the priority the client set in the request's _meta.priority
+    """
+    try:
+        meta = request_ctx.get().meta
+    except LookupError:
+        return None
+    priority = getattr(meta, 'priority', None) if meta is not None else None
+    return priority.lower() if isinstance(priority, str) else None
+
+class AdmissionController:
+    """
+    工具调用与ComfyUI之间的准入控制：限制每个后端的在途任务数，超出部分按优先级进入有界等待队列，
+    同一优先级内按MCP会话轮转以保证公平，队列满时立即拒绝并给出重试建议。
+
+    Admission control between tool calls and ComfyUI: caps in-flight jobs per backend, queues the
+    excess in a bounded wait queue by priority, rotates between MCP sessions within a priority for
+    fairness, and rejects immediately with a retry-after hint when the queue is full.
+    """
+
+    def __init__(self):
+        # 优先级 -> 会话 -> 等待者队列；会话的顺序即轮转顺序
+        # priority -> session -> waiter queue; session order is the rotation order
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._size = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        # 任务平均执行时长（指数移动平均），用于估算重试等待时间
+        # Moving average of job duration, used to estimate the retry-after hint
+        self._avg_duration = 10.0
+
+    @property
+    def settings(self):
+        return get_settings().admission
+
+    def queue_depth(self) -> int:
+        """
+        当前等待中的请求数
+        Number of requests currently waiting
+        """
+        return self._size
+
+    def _retry_after(self) -> int:
+        pool = get_backend_pool()
+        healthy = sum(1 for b in pool.backends if b.healthy) or 1
+        capacity = healthy * self.settings.max_inflight_per_backend
+        return max(1, math.ceil(self._avg_duration * (self._size + 1) / capacity))
+
+    def _pop_next(self) -> Optional[_Waiter]:
+        for priority in PRIORITIES:
+            clients = self._queues[priority]
+            while clients:
+                client, waiters = next(iter(clients.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    clients.move_to_end(client)
+                else:
+                    del clients[client]
+                self._size -= 1
+                if not waiter.future.done():
+                    return waiter
+        return None
+
+    def _remove(self, waiter: _Waiter) -> None:
+        clients = self._queues[waiter.priority]
+        waiters = clients.get(waiter.client)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self._size -= 1
+            if not waiters:
+                del clients[waiter.client]
+
+    def _grant(self, wait: float) -> None:
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def _dispatch(self) -> None:
+        pool = get_backend_pool()
+        while self._size:
+            backend = pool.select(self.settings.max_inflight_per_backend)
+            if backend is None:
+                return
+            waiter = self._pop_next()
+            if waiter is None:
+                return
+            backend.inflight += 1
+            self._grant(time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(backend)
+
+    async def acquire(self, priority: Optional[str] = None) -> Backend:
+        """
+        申请执行名额，返回已占用名额的后端；用完后必须调用 release()
+        Request an execution slot and return the backend holding it; release() must be called afterwards
+
+        参数:
+            priority: 优先级（high / normal / low），为None时取请求 _meta.priority 或默认优先级
+
+        Args:
+            priority: Priority (high / normal / low), the request's _meta.priority or the default if None
+
+        返回:
+            Backend: 分配的后端
+
+        Returns:
+            Backend: Assigned backend
+
+        异常:
+            AdmissionRejected: 等待队列已满
+
+        Raises:
+            AdmissionRejected: The wait queue is full
+        """
+        priority = priority or current_priority() or self.settings.default_priority
+        if priority not in self._queues:
+            priority = 'normal'
+        if not self._size:
+            backend = get_backend_pool().select(self.settings.max_inflight_per_backend)
+            if backend is not None:
+                backend.inflight += 1
+                self._grant(0.0)
+                return backend
+        if self._size >= self.settings.max_queue_size:
+            self.rejected += 1
+            error = AdmissionRejected(self._retry_after())
+            default_logger.warning(str(error))
+            raise error
+
+        waiter = _Waiter(current_client(), priority)
+        self._queues[priority].setdefault(waiter.client, deque()).append(waiter)
+        self._size += 1
+        default_logger.debug("任务进入等待队列: 优先级=%s, 会话=%s, 队列深度=%d", priority, waiter.client, self._size)
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.future.result())
+            else:
+                self._remove(waiter)
+            raise
+
+    def release(self, backend: Backend, duration: Optional[float] = None) -> None:
+        """
+        归还执行名额并唤醒下一个等待者
+        Return an execution slot and wake up the next waiter
+
+        参数:
+            backend: acquire() 返回的后端
+            duration: 任务执行时长（秒），用于估算重试等待时间
+
+        Args:
+            backend: Backend returned by acquire()
+            duration: Job duration (seconds), used to estimate the retry-after hint
+        """
+        backend.inflight -= 1
+        if duration is not None:
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None) -> AsyncIterator[Backend]:
+        """
+        占用一个执行名额直到退出上下文
+        Hold an execution slot until the context exits
+        """
+        start = time.monotonic()
+        with get_tracer().span('mcp.admission_wait') as span:
+            backend = await self.acquire(priority)
+            span.set_attribute('comfyui.backend', backend.url)
+        observe_phase('queue_wait', time.monotonic() - start)
+        start = time.monotonic()
+        try:
+            yield backend
+        finally:
+            self.release(backend, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        队列与准入统计
+        Queue and admission statistics
+        """
+        return {
+            'queue_depth': self._size,
+            'queue_depth_by_priority': {
+                p: sum(len(w) for w in clients.values()) for p, clients in self._queues.items()
+            },
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'avg_wait_seconds': round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+            'max_wait_seconds': round(self.max_wait, 3),
+            'avg_job_seconds': round(self._avg_duration, 3),
+            'backends': [b.to_dict() for b in get_backend_pool().backends],
+        }
+
+# 进程内唯一的准入控制器
+# The single process-wide admission controller
+_admission_controller: Optional[AdmissionController] = None
+
+def get_admission_controller() -> AdmissionController:
+    """
+    获取进程内共享的准入控制器
+    Get the process-wide shared admission controller
+
+    返回:
+        AdmissionController: 共享准入控制器
+
+    Returns:
+        AdmissionController: Shared admission controller
+    """
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
+
+def _on_settings_reload(old: Settings, new: Settings) -> None:
+    # 名额上限或后端列表变化后立即尝试放行等待者
+    # Try to admit waiters right away when the limits or the backend list change
+    if _admission_controller is not None and (old.admission != new.admission or old.comfyui_server != new.comfyui_server):
+        _admission_controller._dispatch()
+
+add_reload_listener(_on_settings_reload)
@@ -0,0 +1,264 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from .settings import ComfyUIServerSettings, Settings, add_reload_listener, get_settings
+from .logger import default_logger
+from .comfyui_client import get_comfyui_client
+
+class Backend:
+    """
+    单个ComfyUI后端的状态
+    State of a single ComfyUI backend
+    """
+
+    def __init__(self, url: str, weight: int = 1):
+        self.url = url
+        self.weight = weight
+        self.healthy = True
+        self.failures = 0
+        # 最近一次探测到的远端队列深度（运行中 + 等待中）
+        # Remote queue depth from the latest probe (running + pending)
+        self.queue_depth = 0
+        # 本进程提交到该后端且尚未结束的任务数
+        # Jobs submitted to this backend by this process that have not finished yet
+        self.inflight = 0
+        self.system_stats: Dict[str, Any] = {}
+        self.last_checked: Optional[float] = None
+        # 平滑加权轮询的当前权重
+        # Current weight for smooth weighted round robin
+        self._current_weight = 0
+
+    def load(self) -> float:
+        """
+        负载评分：队列深度与本地在途任务之和除以权重
+        Load score: queue depth plus local in-flight jobs divided by weight
+        """
+        return (self.queue_depth + self.inflight) / self.weight
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'weight': self.weight,
+            'healthy': self.healthy,
+            'failures': self.failures,
+            'queue_depth': self.queue_depth,
+            'inflight': self.inflight,
+            'last_checked': self.last_checked,
+        }
+
+class BackendPool:
+    """
+    ComfyUI后端池：定期健康检查，按最短队列或加权轮询为每次 /api/prompt 提交选择后端，
+    不健康的后端会被摘除，恢复后自动重新加入。
+
+    ComfyUI backend pool: periodic health checks, least-queue-depth or weighted routing of each
+    /api/prompt submission; unhealthy backends are ejected and re-admitted once they recover.
+    """
+
+    def __init__(self, settings: Optional[ComfyUIServerSettings] = None):
+        """
+        初始化后端池
+        Initialize the backend pool
+
+        参数:
+            settings: 后端配置，如果为None则使用当前 [comfyui_server] 配置
+
+        Args:
+            settings: Backend settings, the current [comfyui_server] settings if None
+        """
+        self.settings = settings if settings is not None else get_settings().comfyui_server
+        self.backends: List[Backend] = [Backend(b.url, b.weight) for b in self.settings.backends]
+        self._health_task: Optional[asyncio.Task] = None
+        default_logger.info(
+            f"ComfyUI后端池: {[b.url for b in self.backends]}, 路由策略: {self.settings.routing}"
+        )
+
+    def apply_settings(self, settings: ComfyUIServerSettings) -> None:
+        """
+        应用新的后端配置：保留仍在列表中的后端状态，新增或移除其余后端
+        Apply new backend settings: keep the state of backends still listed, add or drop the others
+
+        参数:
+            settings: 新的 [comfyui_server] 配置
+
+        Args:
+            settings: New [comfyui_server] settings
+        """
+        backends = []
+        for item in settings.backends:
+            backend = self.get(item.url) or Backend(item.url, item.weight)
+            backend.weight = item.weight
+            backends.append(backend)
+        self.settings = settings
+        self.backends = backends
+        default_logger.info(
+            f"ComfyUI后端池已更新: {[b.url for b in self.backends]}, 路由策略: {settings.routing}"
+        )
+
+    def get(self, url: str) -> Optional[Backend]:
+        """
+        按URL查找后端
+        Find a backend by URL
+        """
+        for backend in self.backends:
+            if backend.url == url:
+                return backend
+        return None
+
+    def start(self) -> None:
+        """
+        启动后台健康检查任务（需在事件循环中调用）
+        Start the background health check task (must be called inside an event loop)
+        """
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def select(self, max_inflight: int = 0) -> Optional[Backend]:
+        """
+        为新任务选择后端
+        Select a backend for a new job
+
+        参数:
+            max_inflight: 每个后端的在途任务上限，0表示不限制
+
+        Args:
+            max_inflight: In-flight job limit per backend, 0 means unlimited
+
+        返回:
+            Backend: 选中的后端；全部不健康时退而选择失败次数最少的后端；所有后端都已满时为None
+
+        Returns:
+            Backend: The selected backend; the one with the fewest failures when all are unhealthy;
+            None when every backend is at its limit
+        """
+        self.start()
+        candidates = [b for b in self.backends if b.healthy]
+        if not candidates:
+            candidates = [b for b in self.backends if not max_inflight or b.inflight < max_inflight]
+            if not candidates:
+                return None
+            backend = min(candidates, key=lambda b: b.failures)
+            default_logger.warning(f"没有健康的ComfyUI后端，尝试使用: {backend.url}")
+            return backend
+        if max_inflight:
+            candidates = [b for b in candidates if b.inflight < max_inflight]
+            if not candidates:
+                return None
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.settings.routing == 'weighted':
+            # 平滑加权轮询
+            # Smooth weighted round robin
+            total = sum(b.weight for b in candidates)
+            for b in candidates:
+                b._current_weight += b.weight
+            backend = max(candidates, key=lambda b: b._current_weight)
+            backend._current_weight -= total
+            return backend
+        return min(candidates, key=lambda b: b.load())
+
+    def report_failure(self, backend: Backend, error: Exception) -> None:
+        """
+        记录一次请求失败（如连接失败），连续失败达到阈值后摘除后端
+        Record a request failure (e.g. connection error); eject the backend after too many in a row
+        """
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.settings.max_failures:
+            backend.healthy = False
+            default_logger.warning(f"ComfyUI后端已摘除: {backend.url}, 原因: {str(error)}")
+
+    def _report_success(self, backend: Backend) -> None:
+        backend.failures = 0
+        if not backend.healthy:
+            backend.healthy = True
+            default_logger.info(f"ComfyUI后端已恢复并重新加入: {backend.url}")
+
+    async def check_backend(self, backend: Backend) -> bool:
+        """
+        探测单个后端的 /api/queue 和 /system_stats
+        Probe /api/queue and /system_stats of a single backend
+
+        返回:
+            bool: 后端是否健康
+
+        Returns:
+            bool: Whether the backend is healthy
+        """
+        client = get_comfyui_client()
+        timeout = self.settings.health_check_timeout
+        try:
+            queue = await client.get_queue(backend.url, timeout=timeout)
+            backend.system_stats = await client.get_system_stats(backend.url, timeout=timeout)
+            backend.queue_depth = len(queue.get('queue_running', [])) + len(queue.get('queue_pending', []))
+            backend.last_checked = time.time()
+            self._report_success(backend)
+            return True
+        except Exception as e:
+            backend.last_checked = time.time()
+            default_logger.debug(f"ComfyUI后端健康检查失败: {backend.url}, {str(e)}")
+            self.report_failure(backend, e)
+            return False
+
+    async def check_all(self) -> None:
+        """
+        并发探测所有后端
+        Probe all backends concurrently
+        """
+        await asyncio.gather(*(self.check_backend(b) for b in self.backends))
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                default_logger.error(f"ComfyUI后端健康检查出错: {str(e)}")
+            await asyncio.sleep(self.settings.health_check_interval)
+
+    async def aclose(self) -> None:
+        """
+        停止健康检查任务
+        Stop the health check task
+        """
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._health_task = None
+
+# 进程内唯一的后端池实例
+# The single process-wide backend pool instance
+_backend_pool: Optional[BackendPool] = None
+
+def get_backend_pool() -> BackendPool:
+    """
+    获取进程内共享的后端池
+    Get the process-wide shared backend pool
+
+    返回:
+        BackendPool: 共享后端池
+
+    Returns:
+        BackendPool: Shared backend pool
+    """
+    global _backend_pool
+    if _backend_pool is None:
+        _backend_pool = BackendPool()
+    return _backend_pool
+
+def _on_settings_reload(old: Settings, new: Settings) -> None:
+    if _backend_pool is not None and old.comfyui_server != new.comfyui_server:
+        _backend_pool.apply_settings(new.comfyui_server)
+
+add_reload_listener(_on_settings_reload)
+
+async def close_backend_pool() -> None:
+    """
+    关闭共享后端池（服务关闭时调用）
+    Close the shared backend pool (called on server shutdown)
+    """
+    global _backend_pool
+    if _backend_pool is not None:
+        await _backend_pool.aclose()
+        _backend_pool = None
@@ -0,0 +1,357 @@
+import httpx
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from .settings import HttpClientSettings, Settings, add_reload_listener, get_settings
+from .logger import default_logger
+from .templates import encode_prompt_body
+
+class ComfyUIClient:
+    """
+    进程内共享的ComfyUI HTTP客户端，持有一个保活连接池
+    Process-wide shared ComfyUI HTTP client owning a keep-alive connection pool
+
+    所有工具通过 get_comfyui_client() 获取同一个实例，避免每次调用都新建TCP连接。
+    All tools obtain the same instance through get_comfyui_client(), so no new TCP connection is opened per call.
+    """
+
+    def __init__(self, settings: Optional[HttpClientSettings] = None):
+        """
+        初始化ComfyUI客户端
+        Initialize the ComfyUI client
+
+        参数:
+            settings: HTTP客户端配置，如果为None则使用当前 [http_client] 配置
+
+        Args:
+            settings: HTTP client settings, the current [http_client] settings if None
+        """
+        self._client: Optional[httpx.AsyncClient] = None
+        self.apply_settings(settings if settings is not None else get_settings().http_client)
+
+    def apply_settings(self, settings: HttpClientSettings) -> None:
+        """
+        应用HTTP客户端配置；超时立即生效，连接池参数在下次创建客户端时生效
+        Apply HTTP client settings; timeouts apply immediately, pool limits when the client is next created
+
+        参数:
+            settings: [http_client] 配置
+
+        Args:
+            settings: [http_client] settings
+        """
+        self.settings = settings
+        connect_timeout = settings.connect_timeout
+        # 按操作类型区分的超时设置
+        # Per-operation timeouts
+        self.timeouts = {
+            'submit': httpx.Timeout(settings.submit_timeout, connect=connect_timeout),
+            'history': httpx.Timeout(settings.history_timeout, connect=connect_timeout),
+            'view': httpx.Timeout(settings.view_timeout, connect=connect_timeout),
+            'upload': httpx.Timeout(settings.upload_timeout, connect=connect_timeout),
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        获取底层httpx客户端（首次访问时创建）
+        Get the underlying httpx client (created on first access)
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.settings.max_connections,
+            max_keepalive_connections=self.settings.max_keepalive_connections,
+            keepalive_expiry=self.settings.keepalive_expiry,
+        )
+        http2 = self.settings.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                default_logger.warning("未安装h2，HTTP/2已禁用 | h2 is not installed, HTTP/2 disabled")
+                http2 = False
+        default_logger.info(
+            f"创建ComfyUI共享HTTP客户端: max_connections={limits.max_connections}, "
+            f"max_keepalive={limits.max_keepalive_connections}, http2={http2}"
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=http2,
+            timeout=self.timeouts['history'],
+        )
+
+    async def submit_prompt(self, comfyui_host: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        向ComfyUI提交工作流任务
+        Submit a workflow job to ComfyUI
+
+        参数:
+            comfyui_host: ComfyUI服务器URL
+            body: 请求体（包含client_id和prompt）
+
+        Args:
+            comfyui_host: ComfyUI server URL
+            body: Request body (containing client_id and prompt)
+
+        返回:
+            dict: /api/prompt 的响应（包含prompt_id）
+
+        Returns:
+            dict: Response of /api/prompt (containing prompt_id)
+        """
+        # 工作流的静态部分使用预编码的JSON片段，只序列化变化的节点
+        # Static parts of the workflow use pre-encoded JSON fragments; only changed nodes are serialized
+        resp = await self.client.post(
+            f"{comfyui_host}/api/prompt", content=encode_prompt_body(body),
+            headers={"Content-Type": "application/json"}, timeout=self.timeouts['submit'],
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def cancel_prompt(self, comfyui_host: str, prompt_id: str) -> None:
+        """
+        取消任务：从ComfyUI等待队列中删除，正在执行时中断它
+        Cancel a job: delete it from ComfyUI's pending queue and interrupt it if it is running
+
+        参数:
+            comfyui_host: 接受该任务的ComfyUI服务器URL
+            prompt_id: 任务ID
+
+        Args:
+            comfyui_host: ComfyUI server URL that accepted the job
+            prompt_id: Job ID
+        """
+        resp = await self.client.post(
+            f"{comfyui_host}/api/queue", json={"delete": [prompt_id]}, timeout=self.timeouts['submit']
+        )
+        resp.raise_for_status()
+        # 带 prompt_id 时ComfyUI只中断该任务，不影响其他正在执行的任务
+        # With a prompt_id ComfyUI only interrupts that job and leaves other running jobs alone
+        resp = await self.client.post(
+            f"{comfyui_host}/api/interrupt", json={"prompt_id": prompt_id}, timeout=self.timeouts['submit']
+        )
+        resp.raise_for_status()
+
+    async def get_history(self, comfyui_host: str, prompt_id: str) -> Dict[str, Any]:
+        """
+        查询任务历史
+        Query job history
+
+        参数:
+            comfyui_host: ComfyUI服务器URL
+            prompt_id: 任务ID
+
+        Args:
+            comfyui_host: ComfyUI server URL
+            prompt_id: Job ID
+
+        返回:
+            dict: /api/history/{prompt_id} 的响应
+
+        Returns:
+            dict: Response of /api/history/{prompt_id}
+        """
+        resp = await self.client.get(f"{comfyui_host}/api/history/{prompt_id}", timeout=self.timeouts['history'])
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_queue(self, comfyui_host: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        查询ComfyUI队列（用于健康检查和队列深度统计）
+        Query the ComfyUI queue (used for health checks and queue depth)
+
+        参数:
+            comfyui_host: ComfyUI服务器URL
+            timeout: 超时时间（秒），为None时使用history超时
+
+        Args:
+            comfyui_host: ComfyUI server URL
+            timeout: Timeout (seconds), the history timeout if None
+
+        返回:
+            dict: /api/queue 的响应
+
+        Returns:
+            dict: Response of /api/queue
+        """
+        resp = await self.client.get(f"{comfyui_host}/api/queue", timeout=timeout or self.timeouts['history'])
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_system_stats(self, comfyui_host: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        查询ComfyUI系统状态
+        Query ComfyUI system stats
+
+        参数:
+            comfyui_host: ComfyUI服务器URL
+            timeout: 超时时间（秒），为None时使用history超时
+
+        Args:
+            comfyui_host: ComfyUI server URL
+            timeout: Timeout (seconds), the history timeout if None
+
+        返回:
+            dict: /system_stats 的响应
+
+        Returns:
+            dict: Response of /system_stats
+        """
+        resp = await self.client.get(f"{comfyui_host}/system_stats", timeout=timeout or self.timeouts['history'])
+        resp.raise_for_status()
+        return resp.json()
+
+    async def fetch(self, url: str) -> httpx.Response:
+        """
+        下载任意URL（如 /api/view 图片或外部图片）
+        Download an arbitrary URL (e.g. /api/view images or external images)
+
+        参数:
+            url: 目标URL
+
+        Args:
+            url: Target URL
+
+        返回:
+            httpx.Response: 已校验状态码的响应
+
+        Returns:
+            httpx.Response: Response with status already checked
+        """
+        resp = await self.client.get(url, timeout=self.timeouts['view'])
+        resp.raise_for_status()
+        return resp
+
+    @asynccontextmanager
+    async def stream(self, url: str) -> AsyncIterator[httpx.Response]:
+        """
+        以流式方式下载URL，响应体按需分块读取而不是整体载入内存
+        Download a URL as a stream; the body is read in chunks instead of loaded into memory at once
+
+        参数:
+            url: 目标URL
+
+        Args:
+            url: Target URL
+
+        返回:
+            httpx.Response: 已校验状态码、尚未读取响应体的响应
+
+        Returns:
+            httpx.Response: Response with status already checked and body not yet read
+        """
+        async with self.client.stream("GET", url, timeout=self.timeouts['view']) as resp:
+            resp.raise_for_status()
+            yield resp
+
+    async def upload_image(self, comfyui_host: str, filename: str, content: bytes) -> Dict[str, Any]:
+        """
+        上传图片到ComfyUI服务器
+        Upload an image to the ComfyUI server
+
+        参数:
+            comfyui_host: ComfyUI服务器URL
+            filename: 文件名
+            content: 图片内容
+
+        Args:
+            comfyui_host: ComfyUI server URL
+            filename: File name
+            content: Image content
+
+        返回:
+            dict: /upload/image 的响应
+
+        Returns:
+            dict: Response of /upload/image
+        """
+        files = {"image": (filename, content)}
+        resp = await self.client.post(f"{comfyui_host}/upload/image", files=files, timeout=self.timeouts['upload'])
+        resp.raise_for_status()
+        return resp.json()
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        尽力统计连接池使用情况：按目标地址统计活动和空闲连接数
+        Best-effort connection pool usage: active and idle connections per target origin
+
+        httpx 没有公开连接池状态，这里读取 httpcore 的内部属性；httpx/httpcore 版本变化导致无法读取时
+        返回空字典而不是报错，因此不应把它当作稳定的指标。
+        httpx does not expose pool state, so this reads httpcore internals; when a different
+        httpx/httpcore version makes them unreadable it returns an empty dict instead of raising, so it
+        should not be treated as a stable metric.
+
+        返回:
+            dict: {origin: {'active': 数量, 'idle': 数量}}；客户端尚未创建或无法读取时为空
+
+        Returns:
+            dict: {origin: {'active': count, 'idle': count}}; empty before the client is created or when unreadable
+        """
+        stats: Dict[str, Dict[str, int]] = {}
+        if self._client is None or self._client.is_closed:
+            return stats
+        pool = getattr(getattr(self._client, '_transport', None), '_pool', None)
+        connections = getattr(pool, 'connections', None)
+        if connections is None:
+            return stats
+        try:
+            for conn in list(connections):
+                origin = conn._origin
+                key = f"{origin.scheme.decode()}://{origin.host.decode()}:{origin.port}"
+                counts = stats.setdefault(key, {'active': 0, 'idle': 0})
+                counts['idle' if conn.is_idle() else 'active'] += 1
+        except (AttributeError, TypeError, ValueError):
+            return {}
+        return stats
+
+    async def aclose(self) -> None:
+        """
+        关闭连接池
+        Close the connection pool
+        """
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            default_logger.info("ComfyUI共享HTTP客户端已关闭")
+        self._client = None
+
+# 进程内唯一的客户端实例
+# The single process-wide client instance
+_comfyui_client: Optional[ComfyUIClient] = None
+
+def get_comfyui_client() -> ComfyUIClient:
+    """
+    获取进程内共享的ComfyUI客户端
+    Get the process-wide shared ComfyUI client
+
+    返回:
+        ComfyUIClient: 共享客户端
+
+    Returns:
+        ComfyUIClient: Shared client
+    """
+    global _comfyui_client
+    if _comfyui_client is None:
+        _comfyui_client = ComfyUIClient()
+    return _comfyui_client
+
+def _on_settings_reload(old: Settings, new: Settings) -> None:
+    if _comfyui_client is not None and old.http_client != new.http_client:
+        _comfyui_client.apply_settings(new.http_client)
+
+add_reload_listener(_on_settings_reload)
+
+async def close_comfyui_client() -> None:
+    """
+    关闭共享客户端（服务关闭时调用）
+    Close the shared client (called on server shutdown)
+    """
+    global _comfyui_client
+    if _comfyui_client is not None:
+        try:
+            await _comfyui_client.aclose()
+        except Exception as e:
+            default_logger.error(f"关闭ComfyUI共享HTTP客户端时出错: {str(e)}")
+        _comfyui_client = None
@@ -0,0 +1,406 @@
+import asyncio
+import json
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from .settings import CompletionSettings, get_settings
+from .logger import default_logger
+from .comfyui_client import get_comfyui_client
+from .tracing import get_tracer
+
+try:
+    import websockets
+except ImportError:  # 未安装websockets时只能轮询 | Polling only when websockets is not installed
+    websockets = None
+
+# 记住最近已结束的任务，用于处理在等待者注册之前就到达的事件
+# Remember recently finished jobs to handle events that arrive before the waiter registers
+_FINISHED_CACHE_SIZE = 1024
+
+class ComfyUIExecutionError(Exception):
+    """
+    ComfyUI任务执行失败或被中断
+    ComfyUI job failed or was interrupted
+    """
+
+class _JobTrace:
+    """
+    根据ComfyUI推送事件记录一个任务的排队、执行和逐节点执行span
+    Records the queue, execution and per-node execution spans of a job from ComfyUI's pushed events
+    """
+
+    def __init__(self, prompt_id: str, workflow: Dict[str, Any]):
+        self.tracer = get_tracer()
+        self.prompt_id = prompt_id
+        self.parent = self.tracer.current_span()
+        self.workflow = workflow
+        self.queue_span = self.tracer.start_span('comfyui.queue_wait', attributes={'prompt_id': prompt_id})
+        self.execute_span = None
+        self.node_span = None
+
+    def _start_execution(self) -> None:
+        if self.execute_span is None:
+            self.queue_span.end()
+            self.execute_span = self.tracer.start_span(
+                'comfyui.execute', parent=self.parent, attributes={'prompt_id': self.prompt_id}
+            )
+
+    def _end_node(self) -> None:
+        if self.node_span is not None:
+            self.node_span.end()
+            self.node_span = None
+
+    def on_event(self, event_type: str, data: Dict[str, Any]) -> None:
+        if event_type == 'execution_start':
+            self._start_execution()
+        elif event_type == 'execution_cached':
+            self._start_execution()
+            self.execute_span.set_attribute('comfyui.cached_nodes', len(data.get('nodes') or []))
+        elif event_type == 'executing':
+            self._start_execution()
+            self._end_node()
+            node = data.get('node')
+            if node is not None:
+                self.node_span = self.tracer.start_span('comfyui.node', parent=self.execute_span, attributes={
+                    'prompt_id': self.prompt_id,
+                    'comfyui.node_id': str(node),
+                    'comfyui.node_type': self.workflow.get(str(node), {}).get('class_type', ''),
+                })
+        elif event_type in ('execution_error', 'execution_interrupted'):
+            error = ComfyUIExecutionError(data.get('exception_message') or event_type)
+            for span in (self.node_span, self.execute_span):
+                if span is not None:
+                    span.record_exception(error)
+
+    def finish(self) -> None:
+        # 没有收到执行事件时（如轮询模式）排队span覆盖整个等待过程
+        # Without execution events (e.g. in polling mode) the queue span covers the whole wait
+        if self.execute_span is None:
+            self.queue_span.set_attribute('comfyui.events', False)
+        self._end_node()
+        for span in (self.queue_span, self.execute_span):
+            if span is not None:
+                span.end()
+
+class CompletionTracker:
+    """
+    任务完成跟踪器：每个ComfyUI后端保持一条 /ws?clientId= 长连接，
+    将 executing / executed / execution_error 事件按 prompt_id 分发给等待中的工具调用。
+    WebSocket断开时退化为带自适应退避的 /api/history 轮询。
+
+    Completion tracker: keeps one persistent /ws?clientId= connection per ComfyUI backend and
+    routes executing / executed / execution_error events to waiting tool calls by prompt_id.
+    Falls back to /api/history polling with adaptive backoff while the WebSocket is down.
+    """
+
+    def __init__(self):
+        """
+        初始化任务完成跟踪器
+        Initialize the completion tracker
+        """
+        # 进程内唯一的client_id，提交任务时必须使用它才能收到推送事件
+        # Process-wide client_id; jobs must be submitted with it to receive pushed events
+        self.client_id = str(uuid.uuid4())
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._finished: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._sockets: Dict[str, asyncio.Task] = {}
+        self._connected: Dict[str, bool] = {}
+        # 每次（重新）连接递增，等待者据此判断是否需要核对history
+        # Bumped on every (re)connect so waiters know when to re-check history
+        self._generation: Dict[str, int] = {}
+        # prompt_id -> 跟踪中的任务 | prompt_id -> job being traced
+        self._traces: Dict[str, _JobTrace] = {}
+        # prompt_id -> 接收该任务推送事件的回调 | prompt_id -> callback receiving the job's pushed events
+        self._watchers: Dict[str, Callable[[str, Dict[str, Any]], None]] = {}
+        self._use_websocket = self.settings.use_websocket and websockets is not None
+        if self.settings.use_websocket and websockets is None:
+            default_logger.warning("未安装websockets，任务完成跟踪将使用轮询 | websockets is not installed, falling back to polling")
+
+    @property
+    def settings(self) -> CompletionSettings:
+        """
+        当前 [completion] 配置（重新加载后立即生效）
+        Current [completion] settings (take effect right after a reload)
+        """
+        return get_settings().completion
+
+    def ensure_connected(self, comfyui_host: str) -> None:
+        """
+        确保到指定后端的WebSocket连接任务已启动
+        Make sure the WebSocket task for the given backend is running
+
+        参数:
+            comfyui_host: ComfyUI服务器URL
+
+        Args:
+            comfyui_host: ComfyUI server URL
+        """
+        if not self._use_websocket:
+            return
+        task = self._sockets.get(comfyui_host)
+        if task is None or task.done():
+            self._sockets[comfyui_host] = asyncio.create_task(self._run_socket(comfyui_host))
+
+    def is_connected(self, comfyui_host: str) -> bool:
+        """
+        指定后端的WebSocket当前是否在线
+        Whether the WebSocket to the given backend is currently up
+        """
+        return self._connected.get(comfyui_host, False)
+
+    async def _run_socket(self, comfyui_host: str) -> None:
+        ws_url = f"{comfyui_host.replace('http', 'ws', 1)}/ws?clientId={self.client_id}"
+        while True:
+            try:
+                async with websockets.connect(ws_url, max_size=None) as ws:
+                    self._connected[comfyui_host] = True
+                    self._generation[comfyui_host] = self._generation.get(comfyui_host, 0) + 1
+                    default_logger.info(f"已连接ComfyUI事件流: {ws_url}")
+                    async for message in ws:
+                        # 二进制消息为预览图，忽略
+                        # Binary messages are previews, ignore them
+                        if isinstance(message, str):
+                            self._handle_message(message)
+            except asyncio.CancelledError:
+                self._connected[comfyui_host] = False
+                raise
+            except Exception as e:
+                default_logger.warning(f"ComfyUI事件流断开，{self.settings.reconnect_interval}秒后重连: {str(e)}")
+            self._connected[comfyui_host] = False
+            await asyncio.sleep(self.settings.reconnect_interval)
+
+    def _handle_message(self, message: str) -> None:
+        try:
+            event = json.loads(message)
+        except ValueError:
+            return
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        trace = self._traces.get(prompt_id)
+        if trace is not None:
+            trace.on_event(event_type, data)
+        watcher = self._watchers.get(prompt_id)
+        if watcher is not None:
+            watcher(event_type, data)
+        if event_type == "executing":
+            # node为None表示整个任务执行结束（此时history已写入）
+            # node None means the whole job finished (history is written by then)
+            if data.get("node") is None:
+                self._finish(prompt_id, None)
+        elif event_type == "executed":
+            default_logger.debug("ComfyUI节点执行完成: prompt_id=%s, node=%s", prompt_id, data.get('node'))
+        elif event_type == "execution_error":
+            error = (
+                f"ComfyUI执行失败: 节点 {data.get('node_id')} ({data.get('node_type')}): "
+                f"{(data.get('exception_message') or '').strip()}"
+            )
+            self._finish(prompt_id, error)
+        elif event_type == "execution_interrupted":
+            self._finish(prompt_id, f"ComfyUI任务被中断: 节点 {data.get('node_id')}")
+
+    def _finish(self, prompt_id: str, error: Optional[str]) -> None:
+        # 错误事件之后还会收到 executing=None，保留第一次的结果
+        # An executing=None event still follows an error; keep the first outcome
+        if prompt_id in self._finished:
+            return
+        self._finished[prompt_id] = error
+        if len(self._finished) > _FINISHED_CACHE_SIZE:
+            self._finished.popitem(last=False)
+        future = self._waiters.get(prompt_id)
+        if future is not None:
+            self._finish_waiter(future, error)
+
+    async def _check_history(self, comfyui_host: str, prompt_id: str) -> Optional[Dict[str, Any]]:
+        # 返回已结束任务的history条目，未结束返回None
+        # Return the history entry of a finished job, None if still running
+        data = await get_comfyui_client().get_history(comfyui_host, prompt_id)
+        if prompt_id not in data:
+            return None
+        entry = data[prompt_id]
+        status = entry.get("status", {})
+        if status.get("status_str") == "error":
+            messages = [m for m in status.get("messages", []) if m and m[0] == "execution_error"]
+            detail = (messages[0][1].get("exception_message") or "") if messages else ""
+            raise ComfyUIExecutionError(f"ComfyUI执行失败: {detail}".strip())
+        if status.get("completed"):
+            return entry
+        return None
+
+    def trace_job(self, prompt_id: str, workflow: Dict[str, Any]) -> None:
+        """
+        开始记录任务的排队与逐节点执行span（父span为当前上下文中的活动span），跟踪关闭时不做任何事
+        Start recording the job's queue and per-node execution spans (under the active span of the
+        current context); does nothing while tracing is disabled
+
+        参数:
+            prompt_id: 任务ID
+            workflow: 提交的工作流，用于查找节点类型
+
+        Args:
+            prompt_id: Job ID
+            workflow: Submitted workflow, used to look up node types
+        """
+        if get_tracer().enabled:
+            self._traces[prompt_id] = _JobTrace(prompt_id, workflow)
+
+    def watch(self, prompt_id: str, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        """
+        把任务的推送事件（executing / progress 等）转发给回调，直到 unwatch()
+        Forward the job's pushed events (executing / progress etc.) to a callback until unwatch()
+
+        参数:
+            prompt_id: 任务ID
+            callback: (事件类型, 事件数据) 回调
+
+        Args:
+            prompt_id: Job ID
+            callback: (event type, event data) callback
+        """
+        self._watchers[prompt_id] = callback
+
+    def unwatch(self, prompt_id: str) -> None:
+        """
+        停止转发任务的推送事件
+        Stop forwarding the job's pushed events
+        """
+        self._watchers.pop(prompt_id, None)
+
+    def end_trace(self, prompt_id: str) -> None:
+        """
+        结束任务的跟踪span
+        End the job's tracing spans
+        """
+        trace = self._traces.pop(prompt_id, None)
+        if trace is not None:
+            trace.finish()
+
+    async def wait_for_completion(self, comfyui_host: str, prompt_id: str) -> Dict[str, Any]:
+        """
+        等待任务完成并返回其history条目
+        Wait for a job to finish and return its history entry
+
+        参数:
+            comfyui_host: 接受该任务的ComfyUI服务器URL
+            prompt_id: 任务ID
+
+        Args:
+            comfyui_host: URL of the ComfyUI server that accepted the job
+            prompt_id: Job ID
+
+        返回:
+            dict: /api/history/{prompt_id} 中该任务的条目（包含outputs）
+
+        Returns:
+            dict: The job's entry in /api/history/{prompt_id} (containing outputs)
+
+        异常:
+            ComfyUIExecutionError: 任务执行失败或被中断
+            asyncio.TimeoutError: 超过job_timeout
+
+        Raises:
+            ComfyUIExecutionError: Job failed or was interrupted
+            asyncio.TimeoutError: job_timeout exceeded
+        """
+        job_timeout = self.settings.job_timeout
+        if job_timeout > 0:
+            return await asyncio.wait_for(self._wait(comfyui_host, prompt_id), timeout=job_timeout)
+        return await self._wait(comfyui_host, prompt_id)
+
+    async def _wait(self, comfyui_host: str, prompt_id: str) -> Dict[str, Any]:
+        self.ensure_connected(comfyui_host)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[prompt_id] = future
+        if prompt_id in self._finished:
+            self._finish_waiter(future, self._finished[prompt_id])
+        poll_interval = self.settings.poll_min_interval
+        seen_generation = None
+        try:
+            while True:
+                if not future.done():
+                    await asyncio.wait({future}, timeout=poll_interval)
+                if future.done():
+                    future.result()
+                    entry = await self._check_history(comfyui_host, prompt_id)
+                    if entry is not None:
+                        return entry
+                    # 事件先于history写入，稍后重试
+                    # The event arrived before history was written, retry shortly
+                    await asyncio.sleep(poll_interval)
+                elif self.is_connected(comfyui_host):
+                    # WebSocket在线时只等待推送；连接（重新）建立后核对一次history，弥补离线期间错过的事件
+                    # Only wait for pushes while the socket is up; check history once after each
+                    # (re)connect to cover events missed while it was down
+                    poll_interval = self.settings.poll_min_interval
+                    generation = self._generation.get(comfyui_host)
+                    if generation != seen_generation:
+                        seen_generation = generation
+                        entry = await self._check_history(comfyui_host, prompt_id)
+                        if entry is not None:
+                            return entry
+                else:
+                    # WebSocket离线时按自适应退避间隔轮询
+                    # Poll with adaptive backoff while the socket is down
+                    entry = await self._check_history(comfyui_host, prompt_id)
+                    if entry is not None:
+                        default_logger.debug("通过轮询确认ComfyUI任务完成: %s", prompt_id)
+                        return entry
+                    poll_interval = min(poll_interval * 1.5, self.settings.poll_max_interval)
+        finally:
+            self._waiters.pop(prompt_id, None)
+
+    @staticmethod
+    def _finish_waiter(future: asyncio.Future, error: Optional[str]) -> None:
+        if future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(ComfyUIExecutionError(error))
+
+    async def aclose(self) -> None:
+        """
+        关闭所有WebSocket连接
+        Close all WebSocket connections
+        """
+        for task in self._sockets.values():
+            task.cancel()
+        for task in self._sockets.values():
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._sockets.clear()
+        self._connected.clear()
+
+# 进程内唯一的跟踪器实例
+# The single process-wide tracker instance
+_completion_tracker: Optional[CompletionTracker] = None
+
+def get_completion_tracker() -> CompletionTracker:
+    """
+    获取进程内共享的任务完成跟踪器
+    Get the process-wide shared completion tracker
+
+    返回:
+        CompletionTracker: 共享跟踪器
+
+    Returns:
+        CompletionTracker: Shared tracker
+    """
+    global _completion_tracker
+    if _completion_tracker is None:
+        _completion_tracker = CompletionTracker()
+    return _completion_tracker
+
+async def close_completion_tracker() -> None:
+    """
+    关闭共享跟踪器（服务关闭时调用）
+    Close the shared tracker (called on server shutdown)
+    """
+    global _completion_tracker
+    if _completion_tracker is not None:
+        await _completion_tracker.aclose()
+        _completion_tracker = None
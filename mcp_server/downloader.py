@@ -0,0 +1,178 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from typing import List, Optional, Tuple
+from .settings import get_settings
+from .logger import default_logger
+from .comfyui_client import get_comfyui_client
+from .metrics import BACKEND_DOWNLOADED_BYTES, backend_of, observe_phase
+from .tracing import SPAN_KIND_CLIENT, get_tracer
+
+# 每次从网络读取并写入磁盘的块大小（字节）
+# Size of each chunk read from the network and written to disk (bytes)
+_CHUNK_SIZE = 256 * 1024
+
+# 进程级下载并发限制，上限随 [download] 配置变化时重建
+# Process-wide download concurrency limit, rebuilt when the [download] limit changes
+_global_semaphore: Optional[asyncio.Semaphore] = None
+_global_limit = 0
+
+def _get_global_semaphore() -> asyncio.Semaphore:
+    global _global_semaphore, _global_limit
+    limit = get_settings().download.max_concurrent_total
+    if _global_semaphore is None or _global_limit != limit:
+        _global_semaphore = asyncio.Semaphore(limit)
+        _global_limit = limit
+    return _global_semaphore
+
+def _open_temp_file(local_path: str):
+    # 临时文件与目标文件放在同一目录，保证 os.replace 是原子重命名
+    # The temp file lives next to the target so os.replace is an atomic rename
+    directory = os.path.dirname(os.path.abspath(local_path))
+    os.makedirs(directory, exist_ok=True)
+    # 与 open() 一样按 umask 设置权限（mkstemp 固定为 0600）
+    # Permissions follow the umask like open() does (mkstemp always uses 0600)
+    tmp_path = os.path.join(directory, f".{os.path.basename(local_path)}.{uuid.uuid4().hex}.part")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    return os.fdopen(fd, 'wb'), tmp_path
+
+def _discard(f, tmp_path: str) -> None:
+    f.close()
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+async def download_to_file(url: str, local_path: str) -> int:
+    """
+    流式下载URL到本地文件：分块写入线程池中的临时文件，完成后原子重命名，不阻塞事件循环
+    Stream a URL to a local file: chunks are written to a temp file in the thread pool
+    and atomically renamed when complete, without blocking the event loop
+
+    下载失败时不会留下不完整的目标文件。
+    A failed download never leaves a partial target file behind.
+
+    参数:
+        url: 图片URL（如 /api/view 地址）
+        local_path: 本地保存路径
+
+    Args:
+        url: Image URL (e.g. an /api/view URL)
+        local_path: Local save path
+
+    返回:
+        int: 写入的字节数
+
+    Returns:
+        int: Number of bytes written
+    """
+    client = get_comfyui_client()
+    tracer = get_tracer()
+    start = time.perf_counter()
+    with tracer.span('comfyui.download', {'url': url, 'file.path': local_path}, kind=SPAN_KIND_CLIENT) as span:
+        f, tmp_path = await asyncio.to_thread(_open_temp_file, local_path)
+        size = 0
+        # 写盘在span中单独记录：从第一次写入到重命名完成，另记累计的写入耗时
+        # Disk writes get their own span, from the first write until the rename, plus the cumulative write time
+        write_span = None
+        write_seconds = 0.0
+        try:
+            async with client.stream(url) as resp:
+                async for chunk in resp.aiter_bytes(_CHUNK_SIZE):
+                    if write_span is None:
+                        write_span = tracer.start_span('disk.write', attributes={'file.path': local_path})
+                    write_start = time.perf_counter()
+                    await asyncio.to_thread(f.write, chunk)
+                    write_seconds += time.perf_counter() - write_start
+                    size += len(chunk)
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.replace, tmp_path, local_path)
+        except BaseException as e:
+            await asyncio.to_thread(_discard, f, tmp_path)
+            if write_span is not None:
+                write_span.record_exception(e)
+            raise
+        finally:
+            if write_span is not None:
+                write_span.set_attribute('disk.write_seconds', round(write_seconds, 6))
+                write_span.set_attribute('file.bytes', size)
+                write_span.end()
+        span.set_attribute('file.bytes', size)
+    BACKEND_DOWNLOADED_BYTES.inc(backend_of(url), amount=size)
+    elapsed = time.perf_counter() - start
+    rate = size / elapsed if elapsed > 0 else 0.0
+    default_logger.debug(
+        f"图片已保存到: {local_path}, {size} 字节, 耗时 {elapsed:.2f}s, {rate / 1024 / 1024:.2f} MB/s"
+    )
+    return size
+
+async def download_all(targets: List[Tuple[str, str]]) -> List[str]:
+    """
+    并发下载一个任务的全部输出图片，受单任务和全局并发上限约束
+    Download all output images of a job concurrently, bounded by the per-job and global limits
+
+    每张图片单独处理错误：下载失败的图片在结果中以原URL代替本地路径。
+    Errors are handled per image: a failed image is reported by its URL instead of a local path.
+
+    参数:
+        targets: (图片URL, 本地保存路径) 列表
+
+    Args:
+        targets: List of (image URL, local save path)
+
+    返回:
+        list: 与targets一一对应的本地路径或（失败时）URL
+
+    Returns:
+        list: Local path or, on failure, URL for each entry of targets
+    """
+    job_semaphore = asyncio.Semaphore(get_settings().download.max_concurrent_per_job)
+    global_semaphore = _get_global_semaphore()
+
+    async def download_one(url: str, local_path: str) -> str:
+        async with job_semaphore, global_semaphore:
+            try:
+                await download_to_file(url, local_path)
+                return local_path
+            except Exception as e:
+                default_logger.error(f"下载图片失败: {url}, {str(e)}")
+                return url
+
+    start = time.perf_counter()
+    paths = list(await asyncio.gather(*(download_one(url, path) for url, path in targets)))
+    observe_phase('download', time.perf_counter() - start)
+    return paths
+
+def _copy_file(src: str, dst: str) -> None:
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    shutil.copyfile(src, dst)
+
+async def copy_all(targets: List[Tuple[str, str]]) -> List[str]:
+    """
+    把已在本地的图片复制到新的保存路径（在线程池中执行）；来源是URL的条目原样返回
+    Copy images already on disk to new save paths (in the thread pool); entries whose source is a URL are returned as is
+
+    参数:
+        targets: (来源路径或URL, 本地保存路径) 列表
+
+    Args:
+        targets: List of (source path or URL, local save path)
+
+    返回:
+        list: 与targets一一对应的本地路径或URL
+
+    Returns:
+        list: Local path or URL for each entry of targets
+    """
+    results = []
+    for src, dst in targets:
+        if src.startswith('http'):
+            results.append(src)
+            continue
+        await asyncio.to_thread(_copy_file, src, dst)
+        results.append(dst)
+    return results
@@ -0,0 +1,100 @@
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .logger import default_logger
+from .templates import canonical_hash
+from .pipeline import execute_workflow
+from .downloader import copy_all, download_all
+from .result_cache import get_result_cache
+from .singleflight import get_single_flight
+from .jobs import current_job
+
+class GenerationOutput:
+    """
+    一次生成的本地结果，供合并的调用方复制
+    Local result of a generation, copied by coalesced callers
+    """
+
+    def __init__(self, paths: List[str], names: List[str], seeds: Dict[str, Any]):
+        # 本地路径（下载失败的为URL）| Local paths (URLs for failed downloads)
+        self.paths = paths
+        # ComfyUI输出文件名，用于决定扩展名 | ComfyUI output file names, used for extensions
+        self.names = names
+        self.seeds = seeds
+
+async def generate_images(
+    prompt_template: Dict[str, Any],
+    seeds: Dict[str, Any],
+    seed_pinned: bool,
+    local_paths_for: Callable[[List[str]], List[str]],
+    extra_data: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    生成图片并保存到调用方指定的路径：依次尝试结果缓存、合并相同的并发任务，最后才提交到ComfyUI
+    Generate images and save them where the caller asked: try the result cache, then join an identical
+    in-flight job, and only then submit to ComfyUI
+
+    只有种子确定之后完全相同的工作流才会合并：随机种子的调用各自提交，也不读写结果缓存。
+    合并的调用方共享同一个 prompt_id，图片只下载一次，再复制到各自的 save_dir/filename。
+    Only workflows identical after seed resolution are coalesced: calls with random seeds are submitted
+    separately and skip the result cache. Coalesced callers share one prompt_id; images are downloaded
+    once and copied to each caller's save_dir/filename.
+
+    异步任务（submit_job）中的调用不参与合并，每个任务提交自己的工作流，job_cancel 只取消本任务的 prompt_id。
+    Calls inside async jobs (submit_job) are never coalesced: each job submits its own workflow, so
+    job_cancel only cancels that job's prompt_id.
+
+    参数:
+        prompt_template: 已填充参数和种子的工作流
+        seeds: apply_seeds() 返回的种子
+        seed_pinned: 种子是否可复现（决定是否使用结果缓存）
+        local_paths_for: 根据ComfyUI输出文件名列表计算本地保存路径的函数
+        extra_data: 可选的extra_data字段
+
+    Args:
+        prompt_template: Workflow with parameters and seeds filled in
+        seeds: Seeds returned by apply_seeds()
+        seed_pinned: Whether seeds are reproducible (decides whether the result cache is used)
+        local_paths_for: Function computing local save paths from the list of ComfyUI output file names
+        extra_data: Optional extra_data field
+
+    返回:
+        tuple: (本地路径列表（下载失败的为URL）, 实际使用的种子)
+
+    Returns:
+        tuple: (local paths, URLs for failed downloads; seeds actually used)
+    """
+    # 键包含已确定的种子：两次随机种子的调用即使参数相同也是不同的请求
+    # The key includes the resolved seeds: two calls with random seeds are different requests even with equal parameters
+    key = canonical_hash(prompt_template, include_seeds=True)
+    cache = get_result_cache()
+    use_cache = cache.enabled and seed_pinned
+    if use_cache:
+        hit = await cache.lookup(key)
+        if hit is not None:
+            cached_paths, metadata = hit
+            local_paths = local_paths_for([os.path.basename(p) for p in cached_paths])
+            restored = await cache.restore(key, list(zip(cached_paths, local_paths)))
+            # 查找之后条目被并发写入淘汰时按未命中处理 | An entry evicted by a concurrent store after the lookup counts as a miss
+            if restored is not None:
+                return restored, metadata.get('seeds', seeds)
+
+    async def run() -> GenerationOutput:
+        result = await execute_workflow(prompt_template, extra_data=extra_data)
+        sources = [result.image_url(img_meta) for img_meta in result.images]
+        names = [img_meta['filename'] for img_meta in result.images]
+        default_logger.debug("生成图片数量: %d", len(sources))
+        # 下载失败的图片以URL代替 | Failed downloads fall back to the URL
+        paths = await download_all(list(zip(sources, local_paths_for(names))))
+        if use_cache and not any(path.startswith('http') for path in paths):
+            await cache.store(key, paths, {'seeds': seeds})
+        return GenerationOutput(paths, names, seeds)
+
+    if current_job() is not None:
+        output = await run()
+        return output.paths, output.seeds
+    output, leader = await get_single_flight().do(key, run)
+    if leader:
+        return output.paths, output.seeds
+    # 合并的调用方：复制发起者已下载的文件，不再重复下载
+    # Coalesced caller: copy the files the leader already downloaded instead of downloading again
+    return await copy_all(list(zip(output.paths, local_paths_for(output.names)))), output.seeds
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .logger import default_logger
+
+# 健康检查接口路径 | Health endpoint path
+HEALTH_PATH = "/health"
+
+class _Component:
+    __slots__ = ('status', 'required', 'detail', 'started_at', 'finished_at')
+
+    def __init__(self, required: bool):
+        self.status = 'pending'
+        self.required = required
+        self.detail = ''
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+class Readiness:
+    """
+    启动就绪状态：服务先开始监听，节点描述获取、后端健康检查和模板预热在后台进行，
+    各项完成情况通过 /health 报告。
+
+    Startup readiness: the server starts listening right away while the node description fetch,
+    backend health checks and template warm-up run in the background; their progress is reported
+    through /health.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, _Component] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # 额外的实时检查，返回 (是否正常, 说明) | Extra live checks returning (ok, detail)
+        self._checks: Dict[str, Callable[[], tuple]] = {}
+
+    def start(self, name: str, job: Callable[[], Awaitable[Any]], required: bool = True) -> None:
+        """
+        在后台运行一个启动任务并记录其状态（需在事件循环中调用）
+        Run a startup job in the background and track its status (must be called inside an event loop)
+
+        参数:
+            name: 任务名称
+            job: 返回协程的函数，返回值为False时视为失败
+            required: 失败或未完成时服务是否视为未就绪
+
+        Args:
+            name: Job name
+            job: Function returning a coroutine; a False result counts as a failure
+            required: Whether the server is not ready while the job failed or has not finished
+        """
+        component = self._components[name] = _Component(required)
+
+        async def run() -> None:
+            try:
+                result = await job()
+                component.status = 'failed' if result is False else 'ready'
+            except asyncio.CancelledError:
+                component.status = 'cancelled'
+                raise
+            except Exception as e:
+                component.status = 'failed'
+                component.detail = str(e)
+                default_logger.error(f"启动任务失败: {name}, {str(e)}")
+            finally:
+                component.finished_at = time.time()
+
+        self._tasks[name] = asyncio.create_task(run())
+
+    def add_check(self, name: str, check: Callable[[], tuple]) -> None:
+        """
+        注册一个在每次查询 /health 时执行的实时检查
+        Register a live check evaluated on every /health query
+
+        参数:
+            name: 检查名称
+            check: 返回 (是否正常, 说明) 的函数
+
+        Args:
+            name: Check name
+            check: Function returning (ok, detail)
+        """
+        self._checks[name] = check
+
+    def report(self) -> Dict[str, Any]:
+        """
+        当前就绪状态
+        Current readiness state
+
+        返回:
+            dict: {'ready': bool, 'components': {名称: {...}}, 'checks': {名称: {...}}}
+
+        Returns:
+            dict: {'ready': bool, 'components': {name: {...}}, 'checks': {name: {...}}}
+        """
+        ready = True
+        components = {}
+        for name, component in self._components.items():
+            if component.required and component.status != 'ready':
+                ready = False
+            components[name] = {
+                'status': component.status,
+                'required': component.required,
+                'detail': component.detail,
+                'seconds': round((component.finished_at or time.time()) - component.started_at, 3),
+            }
+        checks = {}
+        for name, check in self._checks.items():
+            try:
+                ok, detail = check()
+            except Exception as e:
+                ok, detail = False, str(e)
+            ready = ready and ok
+            checks[name] = {'ok': ok, 'detail': detail}
+        return {'ready': ready, 'components': components, 'checks': checks}
+
+    async def aclose(self) -> None:
+        """
+        取消仍在运行的启动任务
+        Cancel startup jobs that are still running
+        """
+        for task in self._tasks.values():
+            task.cancel()
+        for task in self._tasks.values():
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks.clear()
+
+# 进程内唯一的就绪状态
+# The single process-wide readiness state
+_readiness: Optional[Readiness] = None
+
+def get_readiness() -> Readiness:
+    """
+    获取进程内共享的就绪状态
+    Get the process-wide shared readiness state
+
+    返回:
+        Readiness: 共享就绪状态
+
+    Returns:
+        Readiness: Shared readiness state
+    """
+    global _readiness
+    if _readiness is None:
+        _readiness = Readiness()
+    return _readiness
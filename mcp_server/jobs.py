@@ -0,0 +1,528 @@
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from .settings import get_settings
+from .logger import default_logger
+from .comfyui_client import get_comfyui_client
+from .completion import get_completion_tracker
+
+# 任务状态 | Job states
+QUEUED = 'queued'          # 已接受，等待后端名额 | accepted, waiting for a backend slot
+RUNNING = 'running'        # 已提交到ComfyUI | submitted to ComfyUI
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    status TEXT NOT NULL,
+    prompt_id TEXT,
+    backend TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at);
+"""
+
+class JobStore:
+    """
+    持久化的任务表（SQLite），记录 job_id 到 prompt_id 和后端的映射、状态与结果，服务重启后仍然保留
+    Persistent job table (SQLite) mapping job_id to prompt_id and backend, with status and result; survives restarts
+
+    所有方法都是同步的，由 JobManager 在单个工作线程中按顺序调用。
+    All methods are synchronous; JobManager calls them in order on a single worker thread.
+    """
+
+    def __init__(self, path: str):
+        """
+        打开（必要时创建）任务表
+        Open (creating if needed) the job table
+
+        参数:
+            path: SQLite数据库文件路径
+
+        Args:
+            path: SQLite database file path
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        """插入新任务 | Insert a new job"""
+        columns = ', '.join(job)
+        placeholders = ', '.join('?' for _ in job)
+        with self._lock:
+            self._conn.execute(f'INSERT INTO jobs ({columns}) VALUES ({placeholders})', tuple(job.values()))
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """更新任务字段 | Update job fields"""
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._conn.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?', (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务，不存在时返回None | Read a job, None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """所有未结束的任务 | Every job that has not finished"""
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge(self, before: float) -> int:
+        """
+        删除在该时间之前结束的任务
+        Delete jobs that finished before the given time
+
+        返回:
+            int: 删除的任务数
+
+        Returns:
+            int: Number of jobs deleted
+        """
+        placeholders = ', '.join('?' for _ in FINISHED_STATES)
+        with self._lock:
+            cursor = self._conn.execute(
+                f'DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?', (*FINISHED_STATES, before)
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class _JobProgress:
+    """
+    根据ComfyUI推送的 executing / execution_cached / progress 事件估算任务进度（0~1）
+    Estimates job progress (0 to 1) from the executing / execution_cached / progress events ComfyUI pushes
+    """
+
+    def __init__(self, node_count: int):
+        self.total = max(node_count, 1)
+        self.done = set()
+        self.current = None
+        self.fraction = 0.0
+        self.progress = 0.0
+
+    def on_event(self, event_type: str, data: Dict[str, Any]) -> Optional[float]:
+        # 返回新的进度，事件与进度无关时返回None | Return the new progress, None for unrelated events
+        if event_type == 'execution_cached':
+            self.done.update(data.get('nodes') or [])
+        elif event_type == 'executing':
+            if self.current is not None:
+                self.done.add(self.current)
+            self.current = data.get('node')
+            self.fraction = 0.0
+        elif event_type == 'progress':
+            maximum = data.get('max') or 0
+            self.fraction = data.get('value', 0) / maximum if maximum else 0.0
+        else:
+            return None
+        self.progress = min((len(self.done) + self.fraction) / self.total, 1.0)
+        return self.progress
+
+class _ActiveJob:
+    """
+    本进程中正在运行的任务
+    A job running in this process
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # 进度或状态变化时置位 | Set whenever progress or status changes
+        self.changed = asyncio.Event()
+        self.finished = False
+        self.progress = 0.0
+        # 每个已提交 prompt_id 各自的进度估计 | Progress estimate of each submitted prompt_id
+        self.prompts: Dict[str, _JobProgress] = {}
+        # 已提交的 (后端, prompt_id) | Submitted (backend, prompt_id) pairs
+        self.submissions: List[Tuple[str, str]] = []
+
+# 当前上下文所属的任务ID，提交工作流时据此记录 prompt_id 和后端
+# Job ID of the current context, used to record prompt_id and backend when a workflow is submitted
+_current_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('mcp_job', default=None)
+
+class JobManager:
+    """
+    异步任务管理器：submit() 立即返回 job_id，工具调用在后台运行；任务状态持久化到SQLite，
+    调用方可随时查询状态、等待结果或取消。
+
+    Asynchronous job manager: submit() returns a job_id right away while the tool call runs in the
+    background; job state is persisted to SQLite so callers can query status, wait for the result or
+    cancel at any time.
+
+    服务重启后，已提交到ComfyUI的任务在查询时按 history 恢复结果，尚未提交的任务标记为失败。
+    After a restart, jobs already submitted to ComfyUI are resolved from its history when queried, and
+    jobs that were not yet submitted are marked as failed.
+    """
+
+    def __init__(self):
+        self._store: Optional[JobStore] = None
+        self._open_lock = asyncio.Lock()
+        self._active: Dict[str, _ActiveJob] = {}
+        # 单个工作线程，保证数据库写入按顺序进行 | One worker thread so database writes stay in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mcp-jobs')
+        self._closing = False
+
+    def _open(self) -> JobStore:
+        # 在工作线程中打开任务表，并处理上次运行遗留的未结束任务
+        # Open the job table on the worker thread, handling jobs left unfinished by the previous run
+        settings = get_settings().jobs
+        store = JobStore(settings.db_path)
+        for job in store.unfinished():
+            if job['status'] == QUEUED or not job['prompt_id']:
+                store.update(job['job_id'], status=FAILED,
+                             error="服务重启时任务尚未提交 | the server restarted before the job was submitted")
+        if settings.retention > 0:
+            store.purge(time.time() - settings.retention)
+        default_logger.info(f"任务表已打开: {settings.db_path}")
+        return store
+
+    async def open(self) -> JobStore:
+        """
+        打开任务表（只在首次调用时打开，文件读写和恢复都在工作线程中进行，不阻塞事件循环）
+        Open the job table (only on the first call; file access and recovery run on the worker thread
+        without blocking the event loop)
+
+        返回:
+            JobStore: 任务表
+
+        Returns:
+            JobStore: The job table
+        """
+        async with self._open_lock:
+            if self._store is None:
+                self._store = await self._db(self._open)
+        return self._store
+
+    async def _db(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        # 在工作线程中按顺序执行数据库操作 | Run database operations in order on the worker thread
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def submit(self, tool: str, arguments: Dict[str, Any], run: Callable[[], Awaitable[str]]) -> str:
+        """
+        记录新任务并在后台运行
+        Record a new job and run it in the background
+
+        任务在独立的上下文中运行，与提交它的MCP请求分离，请求结束后仍继续执行。
+        The job runs in its own context, detached from the MCP request that submitted it, and keeps
+        running after that request ends.
+
+        参数:
+            tool: 工具名
+            arguments: 工具参数
+            run: 执行工具调用并返回结果文本的函数
+
+        Args:
+            tool: Tool name
+            arguments: Tool arguments
+            run: Function running the tool call and returning its result text
+
+        返回:
+            str: job_id
+
+        Returns:
+            str: job_id
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        store = await self.open()
+        await self._db(store.insert, {
+            'job_id': job_id,
+            'tool': tool,
+            'arguments': json.dumps(arguments, ensure_ascii=False),
+            'status': QUEUED,
+            'created_at': now,
+            'updated_at': now,
+        })
+        active = self._active[job_id] = _ActiveJob()
+        active.task = asyncio.get_running_loop().create_task(self._run(job_id, run), context=contextvars.Context())
+        default_logger.info(f"已接受异步任务: {job_id}, 工具: {tool}")
+        return job_id
+
+    async def _run(self, job_id: str, run: Callable[[], Awaitable[str]]) -> None:
+        _current_job.set(job_id)
+        try:
+            result = await run()
+        except asyncio.CancelledError:
+            if not self._closing:
+                await self._finish(job_id, CANCELLED, error="任务已取消 | the job was cancelled")
+            raise
+        except Exception as e:
+            default_logger.error(f"异步任务失败: {job_id}, {str(e)}")
+            await self._finish(job_id, FAILED, error=str(e))
+        else:
+            await self._finish(job_id, SUCCEEDED, result=result)
+
+    async def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        active = self._active.get(job_id)
+        progress = 1.0 if status == SUCCEEDED else (active.progress if active else 0.0)
+        await self._db((await self.open()).update, job_id, status=status, result=result, error=error, progress=progress)
+        if active is not None:
+            tracker = get_completion_tracker()
+            for _, prompt_id in active.submissions:
+                tracker.unwatch(prompt_id)
+            active.progress = progress
+            active.finished = True
+            active.changed.set()
+            self._active.pop(job_id, None)
+
+    def on_submitted(self, comfyui_host: str, prompt_id: str, workflow: Dict[str, Any]) -> None:
+        """
+        记录当前任务提交的工作流（由流水线在提交后调用），并开始跟踪它的进度
+        Record a workflow submitted by the current job (called by the pipeline after submission) and follow its progress
+
+        参数:
+            comfyui_host: 接受该任务的ComfyUI服务器URL
+            prompt_id: ComfyUI任务ID
+            workflow: 提交的工作流
+
+        Args:
+            comfyui_host: ComfyUI server URL that accepted the job
+            prompt_id: ComfyUI job ID
+            workflow: Submitted workflow
+        """
+        job_id = _current_job.get()
+        active = self._active.get(job_id) if job_id is not None else None
+        if active is None:
+            return
+        active.submissions.append((comfyui_host, prompt_id))
+        prompt = active.prompts[prompt_id] = _JobProgress(len(workflow))
+        active.changed.set()
+
+        def on_event(event_type: str, data: Dict[str, Any]) -> None:
+            # 事件只更新所属 prompt_id 的进度，任务进度取所有已提交工作流的平均值
+            # An event only updates its own prompt_id; the job's progress is the mean over all submitted workflows
+            if prompt.on_event(event_type, data) is not None:
+                active.progress = sum(p.progress for p in active.prompts.values()) / len(active.prompts)
+                active.changed.set()
+
+        get_completion_tracker().watch(prompt_id, on_event)
+        # 写入在工作线程中按顺序进行，不阻塞事件循环 | The write runs in order on the worker thread without blocking the event loop
+        self._executor.submit(self._store.update, job_id, status=RUNNING, prompt_id=prompt_id, backend=comfyui_host)
+
+    async def _recover(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        # 上次运行中已提交的任务：按ComfyUI的history补全结果（图片以URL返回，未下载到本地）
+        # A job submitted during the previous run: complete it from ComfyUI's history (images as URLs, not downloaded)
+        from .pipeline import WorkflowResult
+        prompt_id, backend = job['prompt_id'], job['backend']
+        try:
+            entry = (await get_comfyui_client().get_history(backend, prompt_id)).get(prompt_id)
+        except Exception as e:
+            default_logger.warning(f"查询任务history失败: {job['job_id']}, {str(e)}")
+            return job
+        if entry is None:
+            return job
+        status = entry.get('status', {})
+        if status.get('status_str') == 'error':
+            await self._finish(job['job_id'], FAILED, error="ComfyUI执行失败 | ComfyUI execution failed")
+        elif status.get('completed'):
+            try:
+                result = WorkflowResult(backend, prompt_id, entry)
+                lines = [f"![image]({result.image_url(img)})" for img in result.images]
+                await self._finish(job['job_id'], SUCCEEDED, result="\n".join(lines))
+            except Exception as e:
+                await self._finish(job['job_id'], FAILED, error=str(e))
+        return await self._db(self._store.get, job['job_id'])
+
+    async def status(self, job_id: str) -> Dict[str, Any]:
+        """
+        查询任务状态
+        Query a job's status
+
+        参数:
+            job_id: 任务ID
+
+        Args:
+            job_id: Job ID
+
+        返回:
+            dict: 任务记录（运行中的任务带实时进度）
+
+        Returns:
+            dict: Job record (live progress for running jobs)
+
+        异常:
+            ValueError: 任务不存在
+
+        Raises:
+            ValueError: The job does not exist
+        """
+        job = await self._db((await self.open()).get, job_id)
+        if job is None:
+            raise ValueError(f"任务不存在 | unknown job: {job_id}")
+        active = self._active.get(job_id)
+        if active is not None:
+            job['progress'] = active.progress
+            if active.submissions:
+                job['status'] = RUNNING
+                job['backend'], job['prompt_id'] = active.submissions[-1]
+        elif job['status'] == RUNNING:
+            job = await self._recover(job)
+        return job
+
+    async def wait(self, job_id: str, timeout: float,
+                   on_progress: Optional[Callable[[float], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """
+        等待任务结束，最多等待timeout秒；期间进度变化时回调
+        Wait up to timeout seconds for a job to finish, calling back whenever its progress changes
+
+        参数:
+            job_id: 任务ID
+            timeout: 最长等待时间（秒），不超过 [jobs] max_wait
+            on_progress: 可选的进度回调（0~1）
+
+        Args:
+            job_id: Job ID
+            timeout: Longest wait (seconds), capped at [jobs] max_wait
+            on_progress: Optional progress callback (0 to 1)
+
+        返回:
+            dict: 等待结束时的任务记录
+
+        Returns:
+            dict: Job record when the wait ends
+        """
+        active = self._active.get(job_id)
+        deadline = time.monotonic() + min(max(timeout, 0.0), get_settings().jobs.max_wait)
+        while active is not None and not active.finished:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            active.changed.clear()
+            try:
+                await asyncio.wait_for(active.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if on_progress is not None:
+                await on_progress(active.progress)
+        return await self.status(job_id)
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        """
+        取消任务：从ComfyUI队列删除或中断已提交的工作流，并停止后台调用
+        Cancel a job: delete or interrupt its submitted workflows on ComfyUI and stop the background call
+
+        参数:
+            job_id: 任务ID
+
+        Args:
+            job_id: Job ID
+
+        返回:
+            dict: 取消后的任务记录；已结束的任务原样返回
+
+        Returns:
+            dict: Job record after cancellation; finished jobs are returned unchanged
+        """
+        job = await self.status(job_id)
+        if job['status'] in FINISHED_STATES:
+            return job
+        active = self._active.get(job_id)
+        if active is not None:
+            submissions = list(active.submissions)
+        else:
+            submissions = [(job['backend'], job['prompt_id'])] if job['prompt_id'] else []
+        client = get_comfyui_client()
+        for comfyui_host, prompt_id in submissions:
+            try:
+                await client.cancel_prompt(comfyui_host, prompt_id)
+            except Exception as e:
+                default_logger.warning(f"取消ComfyUI任务失败: {prompt_id}, {str(e)}")
+        if active is not None:
+            active.task.cancel()
+            await asyncio.wait([active.task], timeout=10.0)
+        else:
+            await self._finish(job_id, CANCELLED, error="任务已取消 | the job was cancelled")
+        default_logger.info(f"已取消异步任务: {job_id}")
+        return await self._db(self._store.get, job_id)
+
+    async def aclose(self) -> None:
+        """
+        停止仍在运行的任务（已提交到ComfyUI的任务保留为running，重启后可恢复）并关闭任务表
+        Stop running jobs (jobs already submitted to ComfyUI stay running and can be recovered after a
+        restart) and close the job table
+        """
+        self._closing = True
+        tasks = [active.task for active in self._active.values() if active.task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=10.0)
+        self._active.clear()
+        if self._store is not None:
+            await self._db(self._store.close)
+            self._store = None
+        # 等待工作线程退出时不阻塞事件循环 | Wait for the worker thread to exit without blocking the event loop
+        await asyncio.to_thread(self._executor.shutdown, True)
+
+# 进程内唯一的任务管理器
+# The single process-wide job manager
+_job_manager: Optional[JobManager] = None
+
+def get_job_manager() -> JobManager:
+    """
+    获取进程内共享的任务管理器
+    Get the process-wide shared job manager
+
+    返回:
+        JobManager: 共享任务管理器
+
+    Returns:
+        JobManager: Shared job manager
+    """
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
+
+def current_job() -> Optional[str]:
+    """
+    当前上下文所属的异步任务ID，不在任务中时为None
+    Job ID the current context belongs to, None outside a job
+    """
+    return _current_job.get()
+
+def note_submitted(comfyui_host: str, prompt_id: str, workflow: Dict[str, Any]) -> None:
+    """
+    流水线提交工作流后调用；当前上下文属于异步任务时记录 prompt_id 和后端
+    Called by the pipeline after submitting a workflow; records prompt_id and backend when the current
+    context belongs to an asynchronous job
+    """
+    if _current_job.get() is not None and _job_manager is not None:
+        _job_manager.on_submitted(comfyui_host, prompt_id, workflow)
+
+async def close_job_manager() -> None:
+    """
+    停止后台任务并关闭任务表（服务退出时调用）
+    Stop background jobs and close the job table (called on server shutdown)
+    """
+    global _job_manager
+    if _job_manager is not None:
+        await _job_manager.aclose()
+        _job_manager = None
@@ -5,9 +5,13 @@ import json
 import datetime
 import socket
 import getpass
-from logging.handlers import RotatingFileHandler
-from typing import Any, Dict, Optional, Union
+import atexit
+import queue
+import reprlib
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Callable, Dict, Optional, Union
 from .utils import load_logging_config
+from .settings import add_reload_listener
 
 class JournalctlFormatter(logging.Formatter):
     """
@@ -77,13 +81,136 @@ class JournalctlFormatter(logging.Formatter):
         
         return " ".join(parts)
 
+class _BatchFlushMixin:
+    """
+    异步模式下由监听线程在每批记录写完后统一flush，而不是每条记录flush一次
+    In async mode the listener thread flushes once per batch instead of once per record
+    """
+    batch_flush = False
+
+    def flush(self) -> None:
+        if not self.batch_flush:
+            super().flush()
+
+    def flush_batch(self) -> None:
+        super().flush()
+
+class _StreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+class _RotatingFileHandler(_BatchFlushMixin, RotatingFileHandler):
+    def _open(self):
+        # 第一条日志写入时才创建目录和文件，导入模块不会在磁盘上留下任何东西
+        # The directory and file are created when the first record is written, so importing leaves nothing on disk
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+class _BoundedQueueHandler(QueueHandler):
+    """
+    写入有界队列的日志处理器，队列满时按策略丢弃或阻塞
+    Handler writing to a bounded queue; drops or blocks by policy when the queue is full
+    """
+
+    def __init__(self, log_queue: queue.Queue, block: bool):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _BatchingQueueListener(QueueListener):
+    """
+    后台日志线程：一次取出队列中所有可用记录写入，再统一flush，并报告被丢弃的记录数
+    Background log thread: writes every record available in the queue, flushes once,
+    and reports how many records were dropped
+    """
+
+    # 单批最多处理的记录数
+    # Maximum records handled per batch
+    max_batch = 512
+
+    def __init__(self, log_queue: queue.Queue, queue_handler: _BoundedQueueHandler, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.queue_handler = queue_handler
+        self._reported_dropped = 0
+
+    def enqueue_sentinel(self) -> None:
+        # 队列满时也要确保结束标记能放进去
+        # Make sure the sentinel gets in even when the queue is full
+        self.queue.put(self._sentinel)
+
+    def _monitor(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+            self._report_dropped()
+            for handler in self.handlers:
+                try:
+                    handler.flush_batch()
+                except Exception:
+                    pass
+
+    def _report_dropped(self) -> None:
+        dropped = self.queue_handler.dropped
+        if dropped > self._reported_dropped:
+            record = logging.LogRecord(
+                name="mcp_logger",
+                level=logging.WARNING,
+                pathname=__file__,
+                lineno=0,
+                msg=f"日志队列已满，丢弃了 {dropped - self._reported_dropped} 条日志",
+                args=(),
+                exc_info=None
+            )
+            self._reported_dropped = dropped
+            self.handle(record)
+
+def _truncate_result(result: Any, max_chars: int) -> str:
+    # 只截取需要的部分，不先生成完整字符串；非字符串结果用 reprlib 限制容器元素数和嵌套深度
+    # Only take the part that is needed instead of building the full string first; non-string
+    # results go through reprlib, which bounds container sizes and nesting depth
+    if isinstance(result, str):
+        text = result[:max_chars + 1]
+    else:
+        limited = reprlib.Repr()
+        limited.maxlevel = 4
+        limited.maxlist = limited.maxtuple = limited.maxdict = 20
+        limited.maxstring = limited.maxother = max_chars
+        text = limited.repr(result)
+    if len(text) > max_chars:
+        text = text[:max(max_chars - 3, 0)] + "..."
+    return text
+
+# 负载调试通道关闭时使用的级别（高于所有标准级别）
+# Level used while the payload debug channel is off (above every standard level)
+_PAYLOAD_DISABLED = logging.CRITICAL + 10
+
 class MCPLogger:
     """
     MCP日志记录器，用于记录MCP调用和输出
     MCP logger for recording MCP calls and outputs
     """
     
-    def __init__(self, log_path: Optional[str] = None, console_output: bool = True, log_level: int = logging.INFO, max_file_size: int = 10*1024*1024, backup_count: int = 5):
+    def __init__(self, log_path: Optional[str] = None, console_output: bool = True, log_level: int = logging.INFO, max_file_size: int = 10*1024*1024, backup_count: int = 5,
+                 async_mode: bool = False, queue_size: int = 10000, queue_full_policy: str = 'drop',
+                 payload_debug: bool = False):
         """
         初始化MCP日志记录器
         Initialize the MCP logger
@@ -94,6 +221,10 @@ class MCPLogger:
             log_level: 日志级别
             max_file_size: 最大日志文件大小（字节）
             backup_count: 备份文件数量
+            async_mode: 是否通过有界队列和后台线程写日志
+            queue_size: 异步模式下的队列容量
+            queue_full_policy: 队列满时的策略（drop / block）
+            payload_debug: 是否开启负载调试通道（输出完整工作流等大负载）
         
         Args:
             log_path: Path to log file, if None then output to console only
@@ -101,9 +232,17 @@ class MCPLogger:
             log_level: Log level
             max_file_size: Maximum log file size (bytes)
             backup_count: Number of backup files
+            async_mode: Whether logs are written through a bounded queue and a background thread
+            queue_size: Queue capacity in async mode
+            queue_full_policy: Policy when the queue is full (drop / block)
+            payload_debug: Whether the payload debug channel (full workflows and other large payloads) is on
         """
         self.logger = logging.getLogger("mcp_logger")
         self.logger.setLevel(log_level)
+        # 负载调试通道，记录经父记录器的处理器输出
+        # Payload debug channel; its records go out through the parent logger's handlers
+        self.payload_logger = logging.getLogger("mcp_logger.payload")
+        self.set_payload_debug(payload_debug)
         
         # 文件用详细格式
         formatter_file = JournalctlFormatter()
@@ -113,32 +252,46 @@ class MCPLogger:
         # 清除现有的处理器
         # Clear existing handlers
         self.logger.handlers = []
+        self._listener: Optional[_BatchingQueueListener] = None
+        handlers = []
         
         # 添加控制台处理器
         # Add console handler
         if console_output:
-            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler = _StreamHandler(sys.stdout)
             console_handler.setFormatter(formatter_console)
-            self.logger.addHandler(console_handler)
+            handlers.append(console_handler)
         
         # 添加文件处理器（如果提供了路径）
         # Add file handler (if path is provided)
         if log_path:
-            # 确保日志目录存在
-            # Ensure log directory exists
-            os.makedirs(os.path.dirname(log_path), exist_ok=True)
-            
-            # 使用循环日志文件处理器
-            # Use rotating file handler
-            file_handler = RotatingFileHandler(
+            # 使用循环日志文件处理器（延迟到首次写入时才打开文件）
+            # Use rotating file handler (the file is opened on the first write)
+            file_handler = _RotatingFileHandler(
                 log_path, 
                 maxBytes=max_file_size,
                 backupCount=backup_count,
-                encoding='utf-8'
+                encoding='utf-8',
+                delay=True
             )
             file_handler.setFormatter(formatter_file)
-            self.logger.addHandler(file_handler)
+            handlers.append(file_handler)
             self.logger.propagate = False
+
+        if async_mode and handlers:
+            # 调用线程只把记录放进队列，文件/控制台I/O和日志轮转都在后台线程中进行
+            # The calling thread only enqueues; file/console I/O and rotation happen on the background thread
+            for handler in handlers:
+                handler.batch_flush = True
+            log_queue = queue.Queue(maxsize=queue_size)
+            queue_handler = _BoundedQueueHandler(log_queue, block=queue_full_policy == 'block')
+            self.logger.addHandler(queue_handler)
+            self._listener = _BatchingQueueListener(log_queue, queue_handler, *handlers)
+            self._listener.start()
+            atexit.register(self.close)
+        else:
+            for handler in handlers:
+                self.logger.addHandler(handler)
     
     def log_mcp_call(self, 
                      tool_name: str, 
@@ -158,6 +311,8 @@ class MCPLogger:
             tool_args: Tool arguments
             level: Log level
         """
+        if not self.logger.isEnabledFor(level):
+            return
         record = logging.LogRecord(
             name="mcp_logger",
             level=level,
@@ -177,7 +332,8 @@ class MCPLogger:
                        tool_name: str, 
                        result: Any, 
                        execution_time: float,
-                       level: int = logging.INFO) -> None:
+                       level: int = logging.INFO,
+                       max_chars: int = 1000) -> None:
         """
         记录MCP工具调用结果
         Log MCP tool call result
@@ -187,19 +343,21 @@ class MCPLogger:
             result: 调用结果
             execution_time: 执行时间（毫秒）
             level: 日志级别
+            max_chars: 结果的最大字符数
         
         Args:
             tool_name: Tool name
             result: Call result
             execution_time: Execution time (ms)
             level: Log level
+            max_chars: Maximum characters of the result
         """
+        if not self.logger.isEnabledFor(level):
+            return
         # 对于大型结果进行截断，避免日志过大
         # Truncate large results to avoid large logs
-        result_str = str(result)
-        if len(result_str) > 1000:
-            result_str = result_str[:997] + "..."
-            
+        result_str = _truncate_result(result, max_chars)
+
         record = logging.LogRecord(
             name="mcp_logger",
             level=level,
@@ -213,25 +371,79 @@ class MCPLogger:
         record.execution_time = round(execution_time, 2)
         self.logger.handle(record)
     
-    def error(self, message: str) -> None:
+    def close(self) -> None:
+        """
+        停止后台日志线程并写出队列中剩余的记录
+        Stop the background log thread and write out the records left in the queue
+        """
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            listener.stop()
+    
+    def _log(self, level: int, message: Union[str, Callable[[], str]], args: tuple) -> None:
+        # 先检查级别，未启用时既不格式化参数也不调用延迟函数
+        # Check the level first; when disabled, neither the args are formatted nor the callable invoked
+        if not self.logger.isEnabledFor(level):
+            return
+        if callable(message):
+            message = message()
+        # stacklevel=3 让 CODE_FILE/CODE_LINE 指向调用方而不是本文件
+        # stacklevel=3 makes CODE_FILE/CODE_LINE point at the caller instead of this file
+        self.logger.log(level, message, *args, stacklevel=3)
+    
+    def error(self, message: Union[str, Callable[[], str]], *args: Any) -> None:
         """记录错误日志 | Log error message"""
-        self.logger.error(message)
+        self._log(logging.ERROR, message, args)
     
-    def info(self, message: str) -> None:
+    def info(self, message: Union[str, Callable[[], str]], *args: Any) -> None:
         """记录信息日志 | Log info message"""
-        self.logger.info(message)
+        self._log(logging.INFO, message, args)
     
-    def warning(self, message: str) -> None:
+    def warning(self, message: Union[str, Callable[[], str]], *args: Any) -> None:
         """记录警告日志 | Log warning message"""
-        self.logger.warning(message)
+        self._log(logging.WARNING, message, args)
     
-    def debug(self, message: str) -> None:
-        """记录调试日志 | Log debug message"""
-        self.logger.debug(message)
+    def debug(self, message: Union[str, Callable[[], str]], *args: Any) -> None:
+        """
+        记录调试日志；参数按 % 格式延迟格式化，message 也可以是仅在DEBUG启用时才调用的函数
+        Log debug message; args are %-formatted lazily, and message may be a callable invoked only when DEBUG is enabled
+        """
+        self._log(logging.DEBUG, message, args)
     
-    def critical(self, message: str) -> None:
+    def critical(self, message: Union[str, Callable[[], str]], *args: Any) -> None:
         """记录严重错误日志 | Log critical message"""
-        self.logger.critical(message)
+        self._log(logging.CRITICAL, message, args)
+    
+    def is_enabled_for(self, level: int) -> bool:
+        """是否会记录该级别的日志 | Whether records of this level are logged"""
+        return self.logger.isEnabledFor(level)
+    
+    def set_payload_debug(self, enabled: bool) -> None:
+        """
+        开启或关闭负载调试通道
+        Enable or disable the payload debug channel
+        """
+        self.payload_logger.setLevel(logging.DEBUG if enabled else _PAYLOAD_DISABLED)
+    
+    def payload(self, label: str, payload: Any) -> None:
+        """
+        结构化调试通道：输出完整的请求/响应负载（如工作流JSON），独立于日志级别开关，关闭时不做任何序列化
+        Structured debug channel: dumps full request/response payloads (e.g. workflow JSON); switched
+        independently of the log level and does no serialization at all while disabled
+        
+        参数:
+            label: 负载说明
+            payload: 可JSON序列化的负载
+        
+        Args:
+            label: Payload description
+            payload: JSON-serializable payload
+        """
+        if not self.payload_logger.isEnabledFor(logging.DEBUG):
+            return
+        self.payload_logger.debug(
+            "%s: %s", label, json.dumps(payload, ensure_ascii=False, indent=2, default=str), stacklevel=2
+        )
 
 # 创建默认日志记录器实例
 # Create default logger instance
@@ -244,7 +456,11 @@ try:
         console_output=config['console_output'],
         log_level=config['level'],
         max_file_size=config['max_file_size'],
-        backup_count=config['backup_count']
+        backup_count=config['backup_count'],
+        async_mode=config['async_mode'],
+        queue_size=config['queue_size'],
+        queue_full_policy=config['queue_full_policy'],
+        payload_debug=config['payload_debug']
     )
 except Exception as e:
     # 如果配置加载失败，使用默认配置
@@ -254,4 +470,15 @@ except Exception as e:
         log_path=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "mcp_server.log"),
         console_output=True,
         log_level=logging.INFO
-    ) 
\ No newline at end of file
+    )
+
+def _on_settings_reload(old, new) -> None:
+    # 日志级别可在运行时切换，输出目标需重启生效
+    # The log level can change at runtime, the outputs need a restart
+    if old.logging.level != new.logging.level:
+        default_logger.logger.setLevel(new.logging.level)
+        default_logger.info(f"日志级别已切换为: {logging.getLevelName(new.logging.level)}")
+    if old.logging.payload_debug != new.logging.payload_debug:
+        default_logger.set_payload_debug(new.logging.payload_debug)
+
+add_reload_listener(_on_settings_reload)
@@ -1,15 +1,71 @@
 import functools
+import logging
+import random
 import time
 import inspect
-from typing import Any, Callable, Dict, TypeVar, cast, Optional
+from typing import Any, Callable, Dict, TypeVar, cast, Optional, Tuple
+from mcp.server.fastmcp import Context
 from .logger import default_logger
+from .settings import CallLogRule, get_settings
+from .metrics import track_tool
+from .tracing import get_tracer
 
 F = TypeVar('F', bound=Callable[..., Any])
 
+# 被脱敏参数在日志中的占位符
+# Placeholder for redacted arguments in logs
+_REDACTED = "***"
+
+def _make_arg_collector(func: Callable[..., Any]) -> Callable[[Tuple[Any, ...], Dict[str, Any]], Dict[str, Any]]:
+    """
+    在装饰时解析一次函数签名，返回按参数顺序收集调用参数（含默认值）的函数
+    Parse the function signature once at decoration time and return a function collecting the
+    call arguments (defaults included) in parameter order
+    """
+    signature = inspect.signature(func)
+    parameters = list(signature.parameters.values())
+    # FastMCP注入的请求上下文不是调用参数，不记录 | The request context injected by FastMCP is not a call argument and is not logged
+    context_names = {p.name for p in parameters if isinstance(p.annotation, type) and issubclass(p.annotation, Context)}
+    if any(p.kind in (p.VAR_POSITIONAL, p.POSITIONAL_ONLY) for p in parameters):
+        # 少见的签名仍走完整绑定 | Uncommon signatures still use full binding
+        def collect_bound(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+            bound_args = signature.bind(*args, **kwargs)
+            bound_args.apply_defaults()
+            tool_args = dict(bound_args.arguments)
+            tool_args.pop('self', None)
+            for name in context_names:
+                tool_args.pop(name, None)
+            return tool_args
+        return collect_bound
+
+    names = [p.name for p in parameters if p.kind is not p.VAR_KEYWORD and p.name not in context_names]
+    positional = [p.name for p in parameters if p.kind is p.POSITIONAL_OR_KEYWORD]
+    defaults = {p.name: p.default for p in parameters if p.default is not p.empty}
+
+    def collect(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        values = dict(zip(positional, args))
+        values.update(kwargs)
+        tool_args = {name: values[name] if name in values else defaults[name]
+                     for name in names if name in values or name in defaults}
+        # **kwargs 收到的额外参数 | Extra arguments received by **kwargs
+        for name, value in kwargs.items():
+            if name not in context_names:
+                tool_args.setdefault(name, value)
+        # 排除self参数（如果存在）
+        # Exclude self parameter (if exists)
+        tool_args.pop('self', None)
+        return tool_args
+    return collect
+
 def log_mcp_call(func: F) -> F:
     """
     装饰器：记录MCP工具调用和结果
     Decorator: Log MCP tool call and result
+
+    签名在装饰时解析一次；采样、参数脱敏和结果截断按 [call_logging] 中该工具的规则进行，
+    未采样的调用除计时外几乎没有额外开销。
+    The signature is parsed once at decoration time; sampling, argument redaction and result
+    truncation follow the tool's rule in [call_logging], so unsampled calls cost little beyond timing.
     
     参数:
         func: 要装饰的函数
@@ -23,111 +79,78 @@ def log_mcp_call(func: F) -> F:
     Returns:
         Decorated function
     """
-    @functools.wraps(func)
-    async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
-        # 获取工具名称
-        # Get tool name
-        tool_name = func.__name__
-        
-        # 获取调用参数
-        # Get call parameters
-        signature = inspect.signature(func)
-        bound_args = signature.bind(*args, **kwargs)
-        bound_args.apply_defaults()
-        tool_args = dict(bound_args.arguments)
-        
-        # 排除self参数（如果存在）
-        # Exclude self parameter (if exists)
-        if 'self' in tool_args:
-            del tool_args['self']
-        
+    # 获取工具名称
+    # Get tool name
+    tool_name = func.__name__
+    collect_args = _make_arg_collector(func)
+
+    def log_call(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Optional[CallLogRule]:
+        # 返回本次调用适用的规则；不记录时返回None
+        # Return the rule for this call, or None when the call is not logged
+        rule = get_settings().call_logging.rule_for(tool_name)
+        if rule.sample_rate <= 0.0 or not default_logger.is_enabled_for(logging.INFO):
+            return None
+        if rule.sample_rate < 1.0 and random.random() >= rule.sample_rate:
+            return None
+        if rule.log_args:
+            tool_args = collect_args(args, kwargs)
+            for name in rule.redact_args:
+                if name in tool_args:
+                    tool_args[name] = _REDACTED
+        else:
+            tool_args = {}
         # 记录调用
         # Log call
         default_logger.log_mcp_call(tool_name, tool_args)
-        
-        # 计算执行时间
-        # Calculate execution time
-        start_time = time.time()
-        
+        return rule
+
+    def log_result(rule: Optional[CallLogRule], result: Any, start_time: float) -> None:
+        if rule is None or not rule.log_result:
+            return
+        # 计算执行时间（毫秒）
+        # Calculate execution time (ms)
+        execution_time = (time.perf_counter() - start_time) * 1000
+        # 记录结果
+        # Log result
+        default_logger.log_mcp_result(tool_name, result, execution_time, max_chars=rule.result_max_chars)
+
+    @functools.wraps(func)
+    async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+        rule = log_call(args, kwargs)
+        start_time = time.perf_counter()
         try:
-            # 执行原函数
-            # Execute original function
-            result = await func(*args, **kwargs)
-            
-            # 计算执行时间（毫秒）
-            # Calculate execution time (ms)
-            execution_time = (time.time() - start_time) * 1000
-            
-            # 记录结果
-            # Log result
-            default_logger.log_mcp_result(tool_name, result, execution_time)
-            
-            return result
+            # 执行原函数，同时统计调用次数、错误和耗时指标
+            # Execute original function, recording call count, error and latency metrics
+            with track_tool(tool_name), get_tracer().span(f"mcp.tool/{tool_name}", {'mcp.tool': tool_name}):
+                result = await func(*args, **kwargs)
         except Exception as e:
-            # 计算执行时间（毫秒）
-            # Calculate execution time (ms)
-            execution_time = (time.time() - start_time) * 1000
-            
-            # 记录错误
-            # Log error
+            # 记录错误（不受采样影响）
+            # Log error (not subject to sampling)
             default_logger.error(f"MCP工具 {tool_name} 执行失败: {str(e)}")
-            
             # 重新抛出异常
             # Re-raise exception
             raise
+        log_result(rule, result, start_time)
+        return result
     
     @functools.wraps(func)
     def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
-        # 获取工具名称
-        # Get tool name
-        tool_name = func.__name__
-        
-        # 获取调用参数
-        # Get call parameters
-        signature = inspect.signature(func)
-        bound_args = signature.bind(*args, **kwargs)
-        bound_args.apply_defaults()
-        tool_args = dict(bound_args.arguments)
-        
-        # 排除self参数（如果存在）
-        # Exclude self parameter (if exists)
-        if 'self' in tool_args:
-            del tool_args['self']
-        
-        # 记录调用
-        # Log call
-        default_logger.log_mcp_call(tool_name, tool_args)
-        
-        # 计算执行时间
-        # Calculate execution time
-        start_time = time.time()
-        
+        rule = log_call(args, kwargs)
+        start_time = time.perf_counter()
         try:
-            # 执行原函数
-            # Execute original function
-            result = func(*args, **kwargs)
-            
-            # 计算执行时间（毫秒）
-            # Calculate execution time (ms)
-            execution_time = (time.time() - start_time) * 1000
-            
-            # 记录结果
-            # Log result
-            default_logger.log_mcp_result(tool_name, result, execution_time)
-            
-            return result
+            # 执行原函数，同时统计调用次数、错误和耗时指标
+            # Execute original function, recording call count, error and latency metrics
+            with track_tool(tool_name), get_tracer().span(f"mcp.tool/{tool_name}", {'mcp.tool': tool_name}):
+                result = func(*args, **kwargs)
         except Exception as e:
-            # 计算执行时间（毫秒）
-            # Calculate execution time (ms)
-            execution_time = (time.time() - start_time) * 1000
-            
-            # 记录错误
-            # Log error
+            # 记录错误（不受采样影响）
+            # Log error (not subject to sampling)
             default_logger.error(f"MCP工具 {tool_name} 执行失败: {str(e)}")
-            
             # 重新抛出异常
             # Re-raise exception
             raise
+        log_result(rule, result, start_time)
+        return result
     
     # 根据原函数是否为异步函数选择对应的装饰器
     # Choose corresponding decorator based on whether the original function is async
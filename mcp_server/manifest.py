@@ -0,0 +1,605 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+import httpx
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+from pydantic import Field
+from .logger import default_logger
+from .logger_decorator import log_mcp_call
+from .settings import get_settings
+from .backends import get_backend_pool
+from .templates import Slot, TemplateRegistry, get_template_registry
+from .utils import apply_seeds, is_seed_pinned, format_seeds
+from .generation import generate_images
+from .pipeline import execute_workflow
+
+# 清单文件名后缀，与 *_api.json 放在同一目录
+# Manifest file name suffix; manifests live next to the *_api.json templates
+MANIFEST_SUFFIX = '_manifest.json'
+
+# 清单中的参数类型 -> Python类型
+# Parameter types in a manifest -> Python types
+_PARAM_TYPES: Dict[str, type] = {
+    'string': str,
+    'integer': int,
+    'number': float,
+    'boolean': bool,
+}
+
+# 结果输出方式：files 下载到本地并返回本地路径，urls 直接返回ComfyUI图片地址
+# Output modes: files downloads to disk and returns local paths, urls returns the ComfyUI image URLs
+_OUTPUT_MODES = ('files', 'urls')
+
+# 默认输出目录：项目根目录下的 output
+# Default output directory: output under the project root
+_DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+
+class ManifestError(ValueError):
+    """
+    工作流清单格式错误或与模板不匹配
+    The workflow manifest is malformed or does not match its template
+    """
+
+# 布尔参数接受的字符串 | Strings accepted for boolean parameters
+_BOOL_STRINGS = {'true': True, '1': True, 'yes': True, 'on': True,
+                 'false': False, '0': False, 'no': False, 'off': False}
+
+def _convert(param_type: type, value: Any) -> Any:
+    # 按参数类型转换，无法无损转换时返回None | Convert to the parameter type; None when it cannot be done losslessly
+    if param_type is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int) and value in (0, 1):
+            return bool(value)
+        if isinstance(value, str):
+            return _BOOL_STRINGS.get(value.strip().lower())
+        return None
+    if param_type is int:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float):
+            return int(value) if value.is_integer() else None
+        if isinstance(value, str):
+            try:
+                return int(value.strip())
+            except ValueError:
+                return None
+        return None
+    if param_type is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, str) else str(value)
+
+class ParamSpec:
+    """
+    清单中声明的一个工具参数及其写入的节点输入
+    A tool parameter declared in a manifest and the node inputs it is written to
+    """
+
+    __slots__ = ('name', 'type', 'targets', 'required', 'default', 'minimum', 'maximum', 'choices', 'description')
+
+    def __init__(self, name: str, spec: Dict[str, Any], template: Dict[str, Any]):
+        """
+        解析并校验参数声明
+        Parse and validate a parameter declaration
+
+        参数:
+            name: 参数名
+            spec: 清单中的参数声明
+            template: 工作流模板，用于校验目标输入并读取默认值
+
+        Args:
+            name: Parameter name
+            spec: Parameter declaration from the manifest
+            template: Workflow template, used to validate the targets and read defaults
+        """
+        if not name.isidentifier():
+            raise ManifestError(f"参数名无效 | invalid parameter name: {name}")
+        self.name = name
+        type_name = spec.get('type', 'string')
+        if type_name not in _PARAM_TYPES:
+            raise ManifestError(f"参数 {name} 的类型不受支持 | unsupported type for {name}: {type_name}")
+        self.type = _PARAM_TYPES[type_name]
+        targets = spec.get('inputs')
+        if isinstance(targets, str):
+            targets = [targets]
+        if not targets:
+            raise ManifestError(f"参数 {name} 未声明 inputs | parameter {name} declares no inputs")
+        self.targets: List[Slot] = []
+        for target in targets:
+            node_id, _, input_name = str(target).partition('.')
+            inputs = template.get(node_id, {}).get('inputs', {}) if isinstance(template.get(node_id), dict) else {}
+            if input_name not in inputs:
+                raise ManifestError(f"模板中不存在输入 | input not found in template: {target}")
+            if isinstance(inputs[input_name], list):
+                raise ManifestError(f"输入是节点连接，不能作为参数 | input is a node link, not a value: {target}")
+            self.targets.append((node_id, input_name))
+        self.minimum = spec.get('minimum')
+        self.maximum = spec.get('maximum')
+        self.choices = spec.get('enum')
+        self.description = spec.get('description', '')
+        # 必填参数没有默认值，调用方必须传入
+        # Required parameters have no default; callers must pass them
+        self.required = bool(spec.get('required', False))
+        if self.required:
+            if 'default' in spec:
+                raise ManifestError(f"必填参数 {name} 不能声明默认值 | required parameter {name} cannot declare a default")
+            self.default = None
+            return
+        # 未声明默认值时取模板中第一个目标输入的当前值
+        # Without a declared default, use the current value of the first target input in the template
+        node_id, input_name = self.targets[0]
+        default = spec['default'] if 'default' in spec else template[node_id]['inputs'][input_name]
+        self.default = self.coerce(default)
+
+    def annotation(self) -> Any:
+        """
+        带取值约束的类型注解，FastMCP据此生成参数的JSON Schema
+        Type annotation carrying the value constraints; FastMCP builds the parameter JSON Schema from it
+        """
+        base = Literal[tuple(self.choices)] if self.choices else self.type
+        return Annotated[base, Field(description=self.description, ge=self.minimum, le=self.maximum)]
+
+    def coerce(self, value: Any) -> Any:
+        """
+        转换并校验参数值：整数不接受带小数部分的数，布尔值只接受 true/false、1/0、yes/no、on/off
+        Convert and validate a parameter value: integers reject numbers with a fractional part, booleans
+        only accept true/false, 1/0, yes/no and on/off
+
+        参数:
+            value: 调用方传入的值
+
+        Args:
+            value: Value given by the caller
+
+        返回:
+            转换后的值
+
+        Returns:
+            The converted value
+        """
+        converted = _convert(self.type, value)
+        if converted is None:
+            raise ValueError(f"参数 {self.name} 类型错误 | {self.name} must be {self.type.__name__}: {value!r}")
+        value = converted
+        if self.choices and value not in self.choices:
+            raise ValueError(f"参数 {self.name} 须为 {self.choices} 之一 | {self.name} must be one of {self.choices}")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"参数 {self.name} 不能小于 {self.minimum} | {self.name} must be >= {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"参数 {self.name} 不能大于 {self.maximum} | {self.name} must be <= {self.maximum}")
+        return value
+
+class WorkflowManifest:
+    """
+    工作流清单：把工具参数映射到模板中的节点输入，并声明类型、取值范围、默认值和输出方式。
+    引擎据此生成MCP工具，所有清单工具共用同一条提交/等待/下载流水线，新增工作流无需编写Python。
+
+    Workflow manifest: maps tool parameters to node inputs of the template and declares their types,
+    ranges, defaults and the output mode. The engine builds an MCP tool from it; every manifest tool
+    shares one submit/wait/download pipeline, so new workflows need no Python.
+    """
+
+    def __init__(self, api_name: str, data: Dict[str, Any], template: Dict[str, Any]):
+        """
+        解析并校验清单
+        Parse and validate a manifest
+
+        参数:
+            api_name: API名称，如 txt2img
+            data: 清单内容
+            template: 对应的工作流模板
+
+        Args:
+            api_name: API name, e.g. txt2img
+            data: Manifest content
+            template: Matching workflow template
+        """
+        self.api_name = api_name
+        self.tool = data.get('tool', api_name)
+        if not self.tool.isidentifier():
+            raise ManifestError(f"工具名无效 | invalid tool name: {self.tool}")
+        self.description = data.get('description', '')
+        self.output = data.get('output', 'files')
+        if self.output not in _OUTPUT_MODES:
+            raise ManifestError(f"不支持的输出方式 | unsupported output mode: {self.output}")
+        self.seed = bool(data.get('seed', True))
+        self.params = [ParamSpec(name, spec, template) for name, spec in data.get('params', {}).items()]
+        reserved = {'save_dir', 'filename', 'seed'} & {p.name for p in self.params}
+        if reserved:
+            raise ManifestError(f"参数名与内置参数冲突 | parameters clash with built-in ones: {sorted(reserved)}")
+        # 所有参数的注入位置，用于编译模板的注入计划 | Slots of every parameter, compiled into the template's injection plan
+        self.slots: Tuple[Slot, ...] = tuple(slot for param in self.params for slot in param.targets)
+
+    @classmethod
+    def load(cls, api_name: str, registry: Optional[TemplateRegistry] = None) -> "WorkflowManifest":
+        """
+        读取 tools/<api_name>_manifest.json 并按模板校验
+        Read tools/<api_name>_manifest.json and validate it against the template
+
+        参数:
+            api_name: API名称
+            registry: 模板注册表，默认为共享注册表
+
+        Args:
+            api_name: API name
+            registry: Template registry, the shared one by default
+
+        返回:
+            WorkflowManifest: 清单
+
+        Returns:
+            WorkflowManifest: The manifest
+        """
+        registry = registry or get_template_registry()
+        with open(manifest_path(api_name, registry), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(api_name, data, registry.peek(api_name))
+
+    def signature(self) -> inspect.Signature:
+        """
+        生成工具函数的签名：清单参数在前，之后是内置的 save_dir / filename / seed
+        Build the tool function signature: manifest parameters first, then the built-in save_dir / filename / seed
+        """
+        parameters = [
+            inspect.Parameter(p.name, inspect.Parameter.KEYWORD_ONLY, annotation=p.annotation(),
+                              default=inspect.Parameter.empty if p.required else p.default)
+            for p in self.params
+        ]
+        if self.output == 'files':
+            parameters.append(inspect.Parameter(
+                'save_dir', inspect.Parameter.KEYWORD_ONLY, default=None,
+                annotation=Annotated[Optional[str], Field(description=(
+                    'Absolute directory or file path to save the image(s) to; '
+                    'the output directory of the project root if omitted.'))],
+            ))
+            parameters.append(inspect.Parameter(
+                'filename', inspect.Parameter.KEYWORD_ONLY, default=None,
+                annotation=Annotated[Optional[str], Field(description=(
+                    'File name without extension; an index is appended when several images are generated. '
+                    'A timestamp-based name if omitted.'))],
+            ))
+        if self.seed:
+            parameters.append(inspect.Parameter(
+                'seed', inspect.Parameter.KEYWORD_ONLY, default=None,
+                annotation=Annotated[Optional[int], Field(description=(
+                    "Seed for reproducible results; the server's seed policy decides if omitted. "
+                    'The seed actually used is reported in the result.'))],
+            ))
+        return inspect.Signature(parameters, return_annotation=str)
+
+    def argument_names(self) -> List[str]:
+        """
+        工具接受的全部参数名（含内置参数）
+        Every argument name the tool accepts (built-in ones included)
+        """
+        return list(self.signature().parameters)
+
+    def slot_values(self, values: Dict[str, Any]) -> Dict[Slot, Any]:
+        """
+        把参数值转换为注入计划的 (节点ID, 输入名) -> 值
+        Turn parameter values into the (node ID, input name) -> value mapping of the injection plan
+
+        参数:
+            values: 参数名 -> 值，缺少的参数使用默认值
+
+        Args:
+            values: Parameter name -> value; missing parameters use their defaults
+
+        返回:
+            dict: 注入位置 -> 值
+
+        Returns:
+            dict: Slot -> value
+
+        异常:
+            ValueError: 缺少必填参数或参数值无效
+
+        Raises:
+            ValueError: A required parameter is missing or a value is invalid
+        """
+        slot_values = {}
+        for param in self.params:
+            if param.required and param.name not in values:
+                raise ValueError(f"缺少必填参数 {param.name} | missing required parameter: {param.name}")
+            value = param.coerce(values[param.name]) if param.name in values else param.default
+            for slot in param.targets:
+                slot_values[slot] = value
+        return slot_values
+
+def manifest_path(api_name: str, registry: Optional[TemplateRegistry] = None) -> str:
+    """
+    获取清单文件路径
+    Get the manifest file path
+    """
+    registry = registry or get_template_registry()
+    return os.path.join(registry.tools_dir, f'{api_name}{MANIFEST_SUFFIX}')
+
+def manifest_names(registry: Optional[TemplateRegistry] = None) -> List[str]:
+    """
+    同时存在清单和 *_api.json 模板的API名称
+    API names that have both a manifest and an *_api.json template
+    """
+    registry = registry or get_template_registry()
+    return [name for name in registry.api_names() if os.path.exists(manifest_path(name, registry))]
+
+def _output_location(save_dir: Optional[str], filename: Optional[str], default_prefix: str) -> Tuple[str, str]:
+    # save_dir 可以是目录或完整文件路径，返回 (输出目录, 文件名前缀)
+    # save_dir may be a directory or a full file path; returns (output directory, file name prefix)
+    if save_dir and not os.path.isdir(save_dir):
+        output_dir = os.path.dirname(save_dir) or _DEFAULT_OUTPUT_DIR
+        prefix = os.path.splitext(os.path.basename(save_dir))[0]
+    else:
+        output_dir = save_dir or _DEFAULT_OUTPUT_DIR
+        prefix = filename or default_prefix
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir, prefix
+
+def _markdown_image(path: str) -> str:
+    if path.startswith('http'):
+        return f"![image]({path})"
+    abs_path = os.path.abspath(path)
+    return f"![image](file:///{abs_path.replace(os.sep, '/')})"
+
+async def run_manifest(manifest: WorkflowManifest, values: Dict[str, Any]) -> str:
+    """
+    按清单填充模板并执行工作流，返回图片的Markdown和实际使用的种子
+    Fill the template per the manifest, run the workflow and return the images as Markdown plus the seeds used
+
+    files 模式依次尝试结果缓存、合并相同的并发任务，最后才提交到ComfyUI，并把图片并发下载到本地。
+    The files mode tries the result cache, then joins identical in-flight jobs, and only then submits to
+    ComfyUI, streaming the images to disk concurrently.
+
+    参数:
+        manifest: 工作流清单
+        values: 工具参数（含 save_dir / filename / seed）
+
+    Args:
+        manifest: Workflow manifest
+        values: Tool arguments (including save_dir / filename / seed)
+
+    返回:
+        str: Markdown格式的图片，最后一行为种子
+
+    Returns:
+        str: Images in Markdown format, the seeds on the last line
+    """
+    # 按编译好的注入计划生成请求体，只复制参数和种子所在的节点
+    # Build the request body from the compiled injection plan, copying only the nodes holding parameters and seeds
+    plan = await get_template_registry().aplan(manifest.api_name, manifest.slots)
+    prompt_template = plan.build(manifest.slot_values(values))
+    seed = values.get('seed')
+    # seed 在其余参数填充后处理（调用方指定或按 seed_policy）
+    # Seeds are applied after all other parameters (caller-given or by seed_policy)
+    seeds = apply_seeds(prompt_template, seed, plan.seed_slots) if manifest.seed else {}
+    default_logger.debug("配置ComfyUI模板参数完成: %s", manifest.api_name)
+
+    if manifest.output == 'urls':
+        result = await execute_workflow(prompt_template)
+        lines = [f"![image]({result.image_url(img)})" for img in result.images]
+    else:
+        save_dir = values.get('save_dir')
+        output_dir, prefix = _output_location(save_dir, values.get('filename'),
+                                              f"{manifest.api_name}_{int(time.time())}")
+
+        def local_paths_for(source_names: List[str]) -> List[str]:
+            # 根据ComfyUI输出文件名构建本地保存路径；save_dir为文件路径且只有一张图时直接使用它
+            # Build local save paths from the ComfyUI output names; a file path save_dir is used as is for a single image
+            if save_dir and not os.path.isdir(save_dir) and len(source_names) == 1:
+                return [save_dir]
+            paths = []
+            for i, source_name in enumerate(source_names):
+                extension = source_name.rsplit('.', 1)[-1] if '.' in source_name else 'png'
+                name = f"{prefix}_{i}.{extension}" if len(source_names) > 1 else f"{prefix}.{extension}"
+                paths.append(os.path.join(output_dir, name))
+            return paths
+
+        local_image_paths, seeds = await generate_images(
+            prompt_template, seeds, is_seed_pinned(seed), local_paths_for
+        )
+        lines = [_markdown_image(path) for path in local_image_paths]
+    # 报告实际使用的种子，之后传入相同seed即可复现 | Report the seeds used so a later call can reproduce them
+    if seeds:
+        lines.append(format_seeds(seeds))
+    return "\n".join(lines)
+
+def build_tool(manifest: WorkflowManifest) -> Callable[..., Any]:
+    """
+    根据清单生成MCP工具函数（签名、名称和说明都来自清单）
+    Build the MCP tool function from a manifest (signature, name and description all come from it)
+
+    参数:
+        manifest: 工作流清单
+
+    Args:
+        manifest: Workflow manifest
+
+    返回:
+        已记录调用日志的异步工具函数
+
+    Returns:
+        Async tool function with call logging
+    """
+    async def tool(**values: Any) -> str:
+        try:
+            default_logger.info(f"接收到工作流请求: {manifest.tool}")
+            result = await run_manifest(manifest, values)
+            default_logger.info(f"工作流请求完成: {manifest.tool}")
+            return result
+        except httpx.RequestError as e:
+            error_msg = f"API请求失败: {str(e)} | API request failed: {str(e)}"
+            default_logger.error(error_msg)
+            raise Exception(error_msg)
+        except KeyError as e:
+            error_msg = f"返回数据格式错误: {str(e)} | response data format error: {str(e)}"
+            default_logger.error(error_msg)
+            raise Exception(error_msg)
+        except Exception as e:
+            error_msg = f"{manifest.tool}服务异常: {str(e)} | {manifest.tool} service error: {str(e)}"
+            default_logger.error(error_msg)
+            raise Exception(error_msg)
+
+    tool.__name__ = tool.__qualname__ = manifest.tool
+    tool.__doc__ = manifest.description
+    tool.__signature__ = manifest.signature()
+    return log_mcp_call(tool)
+
+# 已注册的清单工具：工具名 -> 清单 | Registered manifest tools: tool name -> manifest
+_manifests: Dict[str, WorkflowManifest] = {}
+
+def get_manifest(tool_name: str) -> WorkflowManifest:
+    """
+    按工具名获取已注册的清单
+    Get a registered manifest by tool name
+
+    参数:
+        tool_name: 工具名，如 txt2img
+
+    Args:
+        tool_name: Tool name, e.g. txt2img
+
+    返回:
+        WorkflowManifest: 清单
+
+    Returns:
+        WorkflowManifest: The manifest
+
+    异常:
+        ValueError: 没有该名称的清单工具
+
+    Raises:
+        ValueError: No manifest tool has that name
+    """
+    manifest = _manifests.get(tool_name)
+    if manifest is None:
+        raise ValueError(f"未知的生成工具 {tool_name}，可用: {sorted(_manifests)} | "
+                         f"unknown generation tool {tool_name}, available: {sorted(_manifests)}")
+    return manifest
+
+def manifest_tools() -> List[str]:
+    """
+    已注册的清单工具名
+    Names of the registered manifest tools
+    """
+    return sorted(_manifests)
+
+def batch_concurrency() -> int:
+    """
+    单次批量调用同时进入准入队列的任务数（[batch] max_concurrency，0时为所有后端的在途上限之和）
+    Jobs of one batch call entering the admission queue at once ([batch] max_concurrency, or the sum of
+    the in-flight caps of all backends when 0)
+    """
+    settings = get_settings()
+    return settings.batch.max_concurrency or (
+        len(get_backend_pool().backends) * settings.admission.max_inflight_per_backend
+    )
+
+async def run_batch(
+    manifest: WorkflowManifest,
+    items: List[Dict[str, Any]],
+    on_result: Optional[Callable[[int, bool, str], Awaitable[None]]] = None,
+) -> List[Tuple[bool, str]]:
+    """
+    并发执行同一工具的多组参数：任务经准入控制分散到各后端，共用同一个任务完成监听，每完成一个就回调一次
+    Run many argument sets of one tool concurrently: jobs are spread over the backends by admission control,
+    share the one completion listener, and the callback fires as each finishes
+
+    所有参数在提交前先校验；同时进入准入队列的任务数受 batch_concurrency() 限制，大批量不会占满等待队列。
+    单个任务失败不影响其余任务。
+    All arguments are validated before anything is submitted; the jobs entering the admission queue at once
+    are capped by batch_concurrency() so a large batch does not fill the wait queue. A failing job does not
+    affect the others.
+
+    参数:
+        manifest: 工作流清单
+        items: 每个任务的参数（与单次调用相同）
+        on_result: 可选回调 (序号, 是否成功, 结果或错误信息)
+
+    Args:
+        manifest: Workflow manifest
+        items: Arguments of each job (the same as for a single call)
+        on_result: Optional callback (index, succeeded, result or error message)
+
+    返回:
+        list: 按输入顺序的 (是否成功, 结果或错误信息)
+
+    Returns:
+        list: (succeeded, result or error message) in input order
+    """
+    max_items = get_settings().batch.max_items
+    if not items:
+        raise ValueError("批量任务不能为空 | a batch needs at least one item")
+    if len(items) > max_items:
+        raise ValueError(f"批量任务最多 {max_items} 个 | a batch holds at most {max_items} items")
+    allowed = set(manifest.argument_names())
+    batch_stamp = int(time.time())
+    prepared = []
+    for index, item in enumerate(items):
+        unknown = set(item) - allowed
+        if unknown:
+            raise ValueError(f"第 {index + 1} 个任务包含未知参数 {sorted(unknown)} | item {index + 1} has unknown arguments {sorted(unknown)}")
+        try:
+            manifest.slot_values(item)
+        except ValueError as e:
+            raise ValueError(f"第 {index + 1} 个任务 | item {index + 1}: {str(e)}")
+        values = dict(item)
+        if manifest.output == 'files' and not values.get('filename'):
+            # 同一批次的默认文件名按序号区分 | Default file names within a batch are told apart by index
+            values['filename'] = f"{manifest.api_name}_{batch_stamp}_{index}"
+        prepared.append(values)
+
+    semaphore = asyncio.Semaphore(batch_concurrency())
+    results: List[Tuple[bool, str]] = [(False, '')] * len(prepared)
+
+    async def run_one(index: int, values: Dict[str, Any]) -> None:
+        async with semaphore:
+            try:
+                result = (True, await run_manifest(manifest, values))
+            except Exception as e:
+                default_logger.error(f"批量任务 {manifest.tool}[{index}] 失败: {str(e)}")
+                result = (False, str(e))
+        results[index] = result
+        if on_result is not None:
+            await on_result(index, *result)
+
+    await asyncio.gather(*(run_one(index, values) for index, values in enumerate(prepared)))
+    return results
+
+def register_manifest_tools(mcp, registry: Optional[TemplateRegistry] = None) -> int:
+    """
+    为 tools/ 目录中每个带清单的工作流注册MCP工具；格式错误的清单记录错误后跳过
+    Register an MCP tool for every workflow in tools/ that has a manifest; malformed manifests are logged and skipped
+
+    参数:
+        mcp: FastMCP实例
+        registry: 模板注册表，默认为共享注册表
+
+    Args:
+        mcp: FastMCP instance
+        registry: Template registry, the shared one by default
+
+    返回:
+        int: 注册的工具数量
+
+    Returns:
+        int: Number of tools registered
+    """
+    count = 0
+    for api_name in manifest_names(registry):
+        try:
+            manifest = WorkflowManifest.load(api_name, registry)
+            mcp.add_tool(build_tool(manifest), name=manifest.tool, description=manifest.description)
+            _manifests[manifest.tool] = manifest
+            count += 1
+            default_logger.debug(f"成功注册清单工具: {manifest.tool}")
+        except Exception as e:
+            default_logger.error(f"注册清单工具 {api_name} 时出错: {str(e)}")
+    return count
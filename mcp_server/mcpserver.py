@@ -1,57 +1,240 @@
 import importlib
 import os
 import asyncio
+import signal
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 from mcp.server.fastmcp import FastMCP
 from .logger import default_logger
 from .utils import load_logging_config, init_mcp, get_tools_dir, load_uvicorn_config
+from .comfyui_client import close_comfyui_client
+from .completion import close_completion_tracker
+from .jobs import close_job_manager, get_job_manager
+from .backends import close_backend_pool, get_backend_pool
+from .settings import get_settings, reload_settings
+from .metrics import CONTENT_TYPE, get_metrics_registry
+from .tracing import close_tracer
+from .object_info import close_object_info_refresh, get_object_info_store, start_object_info_refresh
+from .templates import get_template_registry
+from .manifest import register_manifest_tools
+from .health import HEALTH_PATH, get_readiness
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
 import logging
 
-# 获取工具目录路径
-# Get tools directory path
-tools_dir = get_tools_dir()
-
-# 异步初始化 MCP 服务环境
-# Asynchronously initialize MCP service environment
-loop = asyncio.get_event_loop()
-try:
-    loop.run_until_complete(init_mcp(default_logger))
-except Exception as e:
-    default_logger.error(f"初始化MCP服务环境时出错: {str(e)}")
-
-mcp = FastMCP("ComfyUI-MCP-Server")
-# 从配置文件中读取MCP服务器的主机、端口和传输模式配置
-# Load MCP server host, port and transport mode from configuration file
-host, port, transport = load_uvicorn_config()
-mcp.settings.port = port
-mcp.settings.host = host
-# mcp.settings.transport = transport
-
-# 记录MCP服务器配置信息
-# Log MCP server configuration information
-default_logger.info(f"MCP服务器配置 - 主机: {host}, 端口: {port}, 传输模式: {transport}")
-
-# 自动遍历tools目录下所有.py文件，注册为MCP工具
-# Automatically traverse all .py files in the tools directory and register as MCP tools
-tool_count = 0
-for fname in os.listdir(tools_dir):
-    if fname.endswith('.py') and not fname.startswith('__'):
-        modname = fname[:-3]
-        import_path = f"mcp_server.tools.{modname}"
+async def _prepare_object_info() -> bool:
+    # 创建目录并在缓存文件不存在时获取节点描述，在工作线程中加载索引，之后交给后台刷新任务
+    # Create directories and fetch node descriptions when no cache file exists, load the index in a worker
+    # thread, then hand over to the background refresher
+    await init_mcp(default_logger)
+    index = await get_object_info_store().load()
+    start_object_info_refresh()
+    return len(index) > 0
+
+async def _check_backends() -> None:
+    # 启动定期健康检查并等待第一轮探测完成
+    # Start the periodic health checks and wait for the first probe round
+    pool = get_backend_pool()
+    pool.start()
+    await pool.check_all()
+
+def _backends_healthy() -> tuple:
+    backends = get_backend_pool().backends
+    healthy = [b.url for b in backends if b.healthy and b.last_checked is not None]
+    return bool(healthy), f"{len(healthy)}/{len(backends)} healthy"
+
+def _warm_templates() -> int:
+    # 预先解析所有工作流模板，首个请求无需读盘
+    # Parse every workflow template up front so the first request does not hit the disk
+    registry = get_template_registry()
+    for api_name in registry.api_names():
+        registry.peek(api_name)
+    return len(registry.api_names())
+
+def _start_runtime() -> None:
+    # SIGHUP 触发重新加载 config.ini（Windows 无此信号）
+    # SIGHUP reloads config.ini (not available on Windows)
+    if hasattr(signal, 'SIGHUP'):
         try:
-            mod = importlib.import_module(import_path)
-            register_func = getattr(mod, f"register_{modname}_tool", None)
-            if register_func:
-                register_func(mcp)
-                tool_count += 1
-                default_logger.debug(f"成功注册MCP工具: {modname}")
-            else:
-                default_logger.warning(f"模块 {modname} 中未找到注册函数 register_{modname}_tool")
-        except Exception as e:
-            default_logger.error(f"注册MCP工具 {modname} 时出错: {str(e)}")
-
-# 记录服务初始化信息
-# Log service initialization information
-default_logger.info(f"====== MCP服务已初始化完成，共加载 {tool_count} 个工具 ======")
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_settings)
+        except (RuntimeError, ValueError):
+            # 事件循环不在主线程时（如由其他程序托管）无法注册信号 | Signals cannot be registered off the main thread (e.g. when hosted by another program)
+            default_logger.warning("无法注册SIGHUP，请使用 reload_config 工具重新加载配置")
+    readiness = get_readiness()
+    # 节点描述只用于资源接口，获取失败不影响生成任务
+    # Node descriptions only serve the resource endpoints, so failing to fetch them does not block generation
+    readiness.start('object_info', _prepare_object_info, required=False)
+    readiness.start('backends', _check_backends)
+    readiness.start('templates', lambda: asyncio.to_thread(_warm_templates))
+    # 在任务线程中打开任务表并处理上次运行遗留的任务，只影响异步任务工具
+    # Open the job table and settle jobs left by the previous run on the job thread; only the job tools depend on it
+    readiness.start('jobs', lambda: get_job_manager().open(), required=False)
+    readiness.add_check('backends_healthy', _backends_healthy)
+
+async def _stop_runtime() -> None:
+    # 停止启动任务和后台刷新、后端健康检查、异步任务，关闭ComfyUI事件流和共享连接池
+    # Stop startup jobs, the background refresh, backend health checks and async jobs, close the ComfyUI event streams and the shared connection pool
+    await get_readiness().aclose()
+    await close_object_info_refresh()
+    await close_backend_pool()
+    await close_job_manager()
+    await close_completion_tracker()
+    await close_tracer()
+    await close_comfyui_client()
+    default_logger.info("====== MCP服务已停止 ======")
+
+# 当前处于生命周期中的使用者（会话或 run_server）数量
+# Number of users (sessions or run_server) currently inside the lifespan
+_lifespan_users = 0
+_lifespan_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def lifespan(server: Optional[FastMCP] = None) -> AsyncIterator[None]:
+    """
+    服务生命周期：启动时在后台运行初始化任务（服务立即开始监听），退出时释放共享资源
+    Server lifespan: run the startup jobs in the background on start (the server listens right away)
+    and release shared resources on exit
+
+    作为 FastMCP 的 lifespan，它在每个会话开始时进入（stdio 一个会话，sse / streamable-http 每个连接一个），
+    因此 mcp run、mcp dev、Inspector 和ASGI部署都会执行。第一个使用者进入时启动，最后一个退出时释放；
+    run_server() 在整个运行期间持有一次，共享资源不会随连接反复创建。
+    As the FastMCP lifespan it is entered at the start of every session (one for stdio, one per connection
+    for sse / streamable-http), so it also runs under mcp run, mcp dev, the Inspector and ASGI deployments.
+    The first user to enter starts the runtime and the last one to leave releases it; run_server() holds
+    one reference for its whole run so shared resources are not recreated per connection.
+
+    参数:
+        server: FastMCP实例（由FastMCP传入，未使用）
+
+    Args:
+        server: FastMCP instance (passed by FastMCP, unused)
+    """
+    global _lifespan_users
+    async with _lifespan_lock:
+        if _lifespan_users == 0:
+            _start_runtime()
+        _lifespan_users += 1
+    try:
+        yield
+    finally:
+        async with _lifespan_lock:
+            _lifespan_users -= 1
+            if _lifespan_users == 0:
+                await _stop_runtime()
+
+def create_server() -> FastMCP:
+    """
+    创建MCP服务：读取监听配置，注册指标和就绪接口，自动注册 tools 目录下的工具和清单工具
+    Create the MCP server: read the listen settings, register the metrics and readiness endpoints, and
+    auto-register the tools in the tools directory plus the manifest tools
+
+    返回:
+        FastMCP: 已注册全部工具、生命周期为 lifespan() 的服务
+
+    Returns:
+        FastMCP: Server with every tool registered and lifespan() as its lifespan
+    """
+    server = FastMCP("ComfyUI-MCP-Server", lifespan=lifespan)
+    # 从配置文件中读取MCP服务器的主机、端口和传输模式配置
+    # Load MCP server host, port and transport mode from configuration file
+    host, port, transport = load_uvicorn_config()
+    server.settings.port = port
+    server.settings.host = host
+
+    # 记录MCP服务器配置信息
+    # Log MCP server configuration information
+    default_logger.info(f"MCP服务器配置 - 主机: {host}, 端口: {port}, 传输模式: {transport}")
+
+    # 在MCP的HTTP应用上提供 Prometheus 指标接口
+    # Serve Prometheus metrics on the MCP HTTP app
+    metrics_settings = get_settings().metrics
+    if metrics_settings.enabled:
+        @server.custom_route(metrics_settings.path, methods=["GET"])
+        async def metrics_endpoint(request: Request) -> Response:
+            return Response(get_metrics_registry().render(), media_type=CONTENT_TYPE)
+
+    # 就绪检查接口：启动任务全部完成且至少有一个健康的ComfyUI后端时返回200，否则返回503
+    # Readiness endpoint: 200 once the startup jobs are done and at least one ComfyUI backend is healthy, 503 otherwise
+    @server.custom_route(HEALTH_PATH, methods=["GET"])
+    async def health_endpoint(request: Request) -> Response:
+        report = get_readiness().report()
+        return JSONResponse(report, status_code=200 if report['ready'] else 503)
+
+    # 自动遍历tools目录下所有.py文件，注册为MCP工具
+    # Automatically traverse all .py files in the tools directory and register as MCP tools
+    tools_dir = get_tools_dir()
+    tool_count = 0
+    for fname in os.listdir(tools_dir):
+        if fname.endswith('.py') and not fname.startswith('__'):
+            modname = fname[:-3]
+            import_path = f"mcp_server.tools.{modname}"
+            try:
+                mod = importlib.import_module(import_path)
+                register_func = getattr(mod, f"register_{modname}_tool", None)
+                if register_func:
+                    register_func(server)
+                    tool_count += 1
+                    default_logger.debug(f"成功注册MCP工具: {modname}")
+                else:
+                    default_logger.warning(f"模块 {modname} 中未找到注册函数 register_{modname}_tool")
+            except Exception as e:
+                default_logger.error(f"注册MCP工具 {modname} 时出错: {str(e)}")
+
+    # 为每个带 *_manifest.json 清单的工作流模板生成MCP工具
+    # Build an MCP tool for every workflow template that has a *_manifest.json manifest
+    tool_count += register_manifest_tools(server)
+
+    # 记录服务初始化信息
+    # Log service initialization information
+    default_logger.info(f"====== MCP服务已初始化完成，共加载 {tool_count} 个工具 ======")
+    return server
+
+# 进程内唯一的MCP服务，首次使用时创建 | The single process-wide MCP server, created on first use
+_mcp: Optional[FastMCP] = None
+
+def get_server() -> FastMCP:
+    """
+    获取进程内共享的MCP服务（首次调用时创建并注册工具）
+    Get the process-wide shared MCP server (created, with its tools registered, on first call)
+
+    返回:
+        FastMCP: 共享服务
+
+    Returns:
+        FastMCP: Shared server
+    """
+    global _mcp
+    if _mcp is None:
+        _mcp = create_server()
+    return _mcp
+
+def __getattr__(name: str):
+    # mcp run / mcp dev 和ASGI部署通过模块属性 mcp 获取服务，导入模块本身不创建服务、不注册工具
+    # mcp run / mcp dev and ASGI deployments read the module attribute mcp; importing the module alone
+    # neither creates the server nor registers tools
+    if name == 'mcp':
+        return get_server()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def run_server(transport: str) -> None:
+    """
+    按传输模式运行MCP服务，并在退出时释放共享资源
+    Run the MCP server with the given transport and release shared resources on exit
+
+    参数:
+        transport: 传输模式（stdio / sse / streamable-http）
+
+    Args:
+        transport: Transport mode (stdio / sse / streamable-http)
+    """
+    server = get_server()
+    async with lifespan(server):
+        if transport == "stdio":
+            await server.run_stdio_async()
+        elif transport == "sse":
+            await server.run_sse_async()
+        else:
+            await server.run_streamable_http_async()
 
 if __name__ == "__main__":
     try:
@@ -65,8 +248,9 @@ if __name__ == "__main__":
         default_logger.info(f"日志级别: {logging.getLevelName(log_config['level'])}")
         default_logger.info(f"日志文件: {log_config['log_path']}")
         
+        _, _, transport = load_uvicorn_config()
 
-        mcp.run(transport=transport)
+        asyncio.run(run_server(transport))
         
     except Exception as e:
         # 记录服务异常信息
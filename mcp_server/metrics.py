@@ -0,0 +1,264 @@
+import bisect
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# 延迟直方图的默认分桶（秒），覆盖从资源读取到长时间生成任务
+# Default latency histogram buckets (seconds), from resource reads to long generation jobs
+DEFAULT_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Prometheus 文本格式的Content-Type
+# Content-Type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """
+    只增不减的计数器
+    Monotonically increasing counter
+    """
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """
+        按标签值增加计数
+        Increase the count for the given label values
+        """
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Histogram:
+    """
+    固定分桶的直方图
+    Histogram with fixed buckets
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数（非累积）, 总和, 次数]
+        # label values -> [per-bucket counts (not cumulative), sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        记录一次观测值
+        Record an observation
+        """
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        names = self.labelnames + ('le',)
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+class GaugeCallback:
+    """
+    抓取时才计算的仪表，值来自回调函数
+    Gauge computed at scrape time from a callback
+    """
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.callback():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class MetricsRegistry:
+    """
+    进程内指标注册表，按 Prometheus 文本格式输出
+    In-process metrics registry rendered in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._metrics: List[object] = []
+
+    def register(self, metric):
+        """
+        注册指标并原样返回
+        Register a metric and return it
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        生成 /metrics 响应内容
+        Render the /metrics response body
+
+        返回:
+            str: Prometheus 文本格式的全部指标
+
+        Returns:
+            str: All metrics in the Prometheus text format
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+# 进程内唯一的指标注册表
+# The single process-wide metrics registry
+_registry = MetricsRegistry()
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    获取进程内共享的指标注册表
+    Get the process-wide shared metrics registry
+
+    返回:
+        MetricsRegistry: 共享注册表
+
+    Returns:
+        MetricsRegistry: Shared registry
+    """
+    return _registry
+
+# 当前正在执行的MCP工具，阶段耗时按它归类
+# The MCP tool currently running; phase timings are attributed to it
+_current_tool: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('mcp_tool', default=None)
+
+TOOL_REQUESTS = _registry.register(Counter(
+    'mcp_tool_requests_total', 'MCP tool and resource calls', ('tool',)))
+TOOL_ERRORS = _registry.register(Counter(
+    'mcp_tool_errors_total', 'MCP tool and resource calls that raised', ('tool',)))
+TOOL_DURATION = _registry.register(Histogram(
+    'mcp_tool_duration_seconds',
+    'Time spent per call, by phase: queue_wait, execution, download, total', ('tool', 'phase')))
+BACKEND_JOBS = _registry.register(Counter(
+    'comfyui_backend_jobs_total', 'Workflows submitted to each ComfyUI backend', ('backend',)))
+BACKEND_DOWNLOADED_BYTES = _registry.register(Counter(
+    'comfyui_backend_downloaded_bytes_total', 'Bytes of output images downloaded from each ComfyUI backend',
+    ('backend',)))
+
+def _admission_queue_depth() -> Iterable[Tuple[LabelValues, float]]:
+    from .admission import get_admission_controller
+    for priority, depth in get_admission_controller().stats()['queue_depth_by_priority'].items():
+        yield (priority,), depth
+
+def _backend_gauge(attribute: str) -> Callable[[], Iterable[Tuple[LabelValues, float]]]:
+    def collect() -> Iterable[Tuple[LabelValues, float]]:
+        from .backends import get_backend_pool
+        for backend in get_backend_pool().backends:
+            yield (backend.url,), float(getattr(backend, attribute))
+    return collect
+
+def _http_connections() -> Iterable[Tuple[LabelValues, float]]:
+    from .comfyui_client import get_comfyui_client
+    for origin, counts in get_comfyui_client().pool_stats().items():
+        for state, count in counts.items():
+            yield (origin, state), count
+
+_registry.register(GaugeCallback(
+    'mcp_admission_queue_depth', 'Tool calls waiting for a ComfyUI slot', ('priority',), _admission_queue_depth))
+_registry.register(GaugeCallback(
+    'comfyui_backend_queue_depth', 'Remote queue depth (running + pending) from the latest health probe',
+    ('backend',), _backend_gauge('queue_depth')))
+_registry.register(GaugeCallback(
+    'comfyui_backend_inflight', 'Jobs this process has running on each backend', ('backend',),
+    _backend_gauge('inflight')))
+_registry.register(GaugeCallback(
+    'comfyui_backend_healthy', 'Whether each backend passed its latest health probe', ('backend',),
+    _backend_gauge('healthy')))
+_registry.register(GaugeCallback(
+    'comfyui_http_connections',
+    'Best-effort count of shared HTTP client pool connections by origin and state (read from httpx internals, '
+    'absent when unavailable)', ('origin', 'state'),
+    _http_connections))
+
+@contextmanager
+def track_tool(tool_name: str) -> Iterator[None]:
+    """
+    统计一次工具调用的次数、错误和总耗时，并让期间记录的阶段耗时归到该工具
+    Count a tool call, its errors and total time, and attribute phase timings recorded meanwhile to the tool
+
+    参数:
+        tool_name: 工具名称
+
+    Args:
+        tool_name: Tool name
+    """
+    TOOL_REQUESTS.inc(tool_name)
+    token = _current_tool.set(tool_name)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        TOOL_ERRORS.inc(tool_name)
+        raise
+    finally:
+        TOOL_DURATION.observe(time.perf_counter() - start, tool_name, 'total')
+        _current_tool.reset(token)
+
+def observe_phase(phase: str, seconds: float) -> None:
+    """
+    记录当前工具某个阶段的耗时（queue_wait / execution / download）
+    Record the time of a phase of the current tool (queue_wait / execution / download)
+
+    参数:
+        phase: 阶段名称
+        seconds: 耗时（秒）
+
+    Args:
+        phase: Phase name
+        seconds: Duration (seconds)
+    """
+    TOOL_DURATION.observe(seconds, _current_tool.get() or 'unknown', phase)
+
+def backend_of(url: str) -> str:
+    """
+    URL所属的后端地址（scheme://host:port），与 [comfyui_server] 中的后端URL一致
+    Backend address (scheme://host:port) of a URL, matching the backend URLs in [comfyui_server]
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
@@ -0,0 +1,596 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote
+import httpx
+from .settings import get_settings
+from .logger import default_logger
+
+try:
+    import msgpack
+except ImportError:  # 未安装msgpack时只能使用紧凑JSON | Compact JSON only when msgpack is not installed
+    msgpack = None
+
+# 节点描述缓存目录 | Node description cache directory
+OBJECT_INFO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'object_info')
+
+# per_node 模式下同时获取的节点类数 | Node classes fetched at the same time in per_node mode
+_PER_NODE_CONCURRENCY = 8
+
+# 资源接口等代码中用到的节点类（模板中的节点类另行扫描）
+# Node classes used in code such as the resource endpoints (template classes are scanned separately)
+_required_classes: Set[str] = set()
+
+def require_node_classes(*class_names: str) -> None:
+    """
+    声明代码中用到的节点类，per_node 模式下会被预先获取
+    Declare node classes used in code; they are prefetched in per_node mode
+    """
+    _required_classes.update(class_names)
+
+def required_node_classes() -> Set[str]:
+    """
+    per_node 模式下需要预先获取的节点类：所有 *_api.json 模板中的节点类加上代码声明的节点类
+    Node classes to prefetch in per_node mode: the classes in every *_api.json template plus those declared in code
+    """
+    from .templates import get_template_registry
+    return get_template_registry().node_classes() | _required_classes
+
+def combo_options(spec: Any) -> Optional[List[Any]]:
+    """
+    从输入定义中取出下拉选项列表，兼容旧格式 [[选项...], {...}] 和新格式 ["COMBO", {"options": [...]}]
+    Extract the combo options from an input spec, supporting both the old [[options...], {...}]
+    and the new ["COMBO", {"options": [...]}] formats
+
+    参数:
+        spec: object_info 中单个输入的定义
+
+    Args:
+        spec: Definition of a single input in object_info
+
+    返回:
+        list: 选项列表；不是下拉输入时为None
+
+    Returns:
+        list: Option list; None when the input is not a combo
+    """
+    if not isinstance(spec, list) or not spec:
+        return None
+    if isinstance(spec[0], list):
+        return spec[0]
+    if spec[0] == 'COMBO' and len(spec) > 1 and isinstance(spec[1], dict):
+        options = spec[1].get('options')
+        return options if isinstance(options, list) else None
+    return None
+
+def object_info_digest(nodes: Dict[str, Any]) -> str:
+    """
+    节点描述内容的哈希（键排序的紧凑JSON的sha256），用于判断内容是否变化
+    Hash of the node descriptions (sha256 of key-sorted compact JSON), used to detect changes
+    """
+    data = json.dumps(nodes, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+class ObjectInfoIndex:
+    """
+    object_info 的只读快照及其索引：按节点类、输入名和下拉选项值查找都是O(1)
+    Read-only snapshot of object_info with indexes: lookups by node class, input name and
+    combo option value are all O(1)
+    """
+
+    def __init__(self, nodes: Dict[str, Any]):
+        self.nodes = nodes
+        # 输入名 -> 拥有该输入的节点类 | input name -> node classes having that input
+        self._by_input: Dict[str, FrozenSet[str]] = {}
+        # 输入名 -> 所有节点类中该输入的下拉选项（去重、保持首次出现的顺序）
+        # input name -> combo options of that input across node classes (deduplicated, first-seen order)
+        self._combo_values: Dict[str, Tuple[Any, ...]] = {}
+        # 选项值 -> (节点类, 输入名) 列表 | option value -> list of (node class, input name)
+        self._by_value: Dict[Any, List[Tuple[str, str]]] = {}
+        self._build()
+
+    def _build(self) -> None:
+        by_input: Dict[str, set] = {}
+        combo_values: Dict[str, Dict[Any, None]] = {}
+        for class_name, node in self.nodes.items():
+            for name, spec in self._iter_inputs(node):
+                by_input.setdefault(name, set()).add(class_name)
+                options = combo_options(spec)
+                if not options:
+                    continue
+                values = combo_values.setdefault(name, {})
+                for value in options:
+                    if not isinstance(value, (str, int, float)):
+                        continue
+                    values[value] = None
+                    self._by_value.setdefault(value, []).append((class_name, name))
+        self._by_input = {name: frozenset(classes) for name, classes in by_input.items()}
+        self._combo_values = {name: tuple(values) for name, values in combo_values.items()}
+
+    @staticmethod
+    def _iter_inputs(node: Dict[str, Any]):
+        inputs = node.get('input') if isinstance(node, dict) else None
+        if not isinstance(inputs, dict):
+            return
+        for section in ('required', 'optional'):
+            specs = inputs.get(section)
+            if isinstance(specs, dict):
+                yield from specs.items()
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, class_name: str) -> bool:
+        return class_name in self.nodes
+
+    def node(self, class_name: str) -> Optional[Dict[str, Any]]:
+        """
+        节点类的描述
+        Description of a node class
+        """
+        return self.nodes.get(class_name)
+
+    def input_spec(self, class_name: str, input_name: str) -> Optional[Any]:
+        """
+        节点类中某个输入的定义（required 或 optional）
+        Definition of an input (required or optional) of a node class
+        """
+        node = self.nodes.get(class_name)
+        if node is None:
+            return None
+        inputs = node.get('input') or {}
+        for section in ('required', 'optional'):
+            spec = (inputs.get(section) or {}).get(input_name)
+            if spec is not None:
+                return spec
+        return None
+
+    def classes_with_input(self, input_name: str) -> FrozenSet[str]:
+        """
+        拥有该输入名的所有节点类
+        All node classes having the given input name
+        """
+        return self._by_input.get(input_name, frozenset())
+
+    def combo_values(self, input_name: str) -> Tuple[Any, ...]:
+        """
+        该输入名在所有节点类中的下拉选项，如 ckpt_name / lora_name / vae_name / unet_name 对应的模型列表
+        Combo options of the input name across node classes, e.g. the model lists behind
+        ckpt_name / lora_name / vae_name / unet_name
+        """
+        return self._combo_values.get(input_name, ())
+
+    def find_value(self, value: Any) -> List[Tuple[str, str]]:
+        """
+        哪些 (节点类, 输入名) 的下拉选项中包含该值
+        Which (node class, input name) pairs offer the value as a combo option
+        """
+        return self._by_value.get(value, [])
+
+    def combo_inputs(self) -> Dict[str, Tuple[Any, ...]]:
+        """
+        所有下拉输入名及其选项
+        All combo input names and their options
+        """
+        return self._combo_values
+
+def diff_object_info(old: ObjectInfoIndex, new: ObjectInfoIndex) -> Dict[str, Any]:
+    """
+    比较两个快照：新增/移除的节点类，以及每个下拉输入新增/移除的选项（如新模型、LoRA）
+    Compare two snapshots: node classes added/removed and options added/removed per combo input
+    (e.g. new models or LoRAs)
+
+    返回:
+        dict: {'added_nodes': [...], 'removed_nodes': [...], 'options': {输入名: {'added': [...], 'removed': [...]}}}
+
+    Returns:
+        dict: {'added_nodes': [...], 'removed_nodes': [...], 'options': {input name: {'added': [...], 'removed': [...]}}}
+    """
+    old_combos, new_combos = old.combo_inputs(), new.combo_inputs()
+    options = {}
+    for name in old_combos.keys() | new_combos.keys():
+        before, after = set(old_combos.get(name, ())), set(new_combos.get(name, ()))
+        if before != after:
+            options[name] = {'added': sorted(map(str, after - before)), 'removed': sorted(map(str, before - after))}
+    return {
+        'added_nodes': sorted(new.nodes.keys() - old.nodes.keys()),
+        'removed_nodes': sorted(old.nodes.keys() - new.nodes.keys()),
+        'options': options,
+    }
+
+# load() 之前使用的空索引 | Empty index used before load()
+_EMPTY_INDEX = ObjectInfoIndex({})
+
+def _preview(items: List[str], limit: int = 20) -> str:
+    text = ", ".join(items[:limit])
+    return text + (f" ... (+{len(items) - limit})" if len(items) > limit else "")
+
+class ObjectInfoStore:
+    """
+    节点描述存储：磁盘文件在启动时由 load() 在工作线程中解析一次，之后所有查询都走内存中的索引。
+    磁盘上使用紧凑JSON（或在安装了msgpack时使用msgpack），冷启动加载更快。
+
+    Node description store: the file on disk is parsed once at startup by load() in a worker thread,
+    and every later query goes to the in-memory index. It is stored on disk as compact JSON (or msgpack
+    when installed) for faster cold loads.
+    """
+
+    def __init__(self, host: str, port: str):
+        self.host = host
+        self.port = port
+        self._index: Optional[ObjectInfoIndex] = None
+        self.digest: Optional[str] = None
+        # 上次成功刷新的时间（monotonic）与响应的ETag
+        # Time of the last successful refresh (monotonic) and the response ETag
+        self.refreshed_at: Optional[float] = None
+        self._etag: Optional[str] = None
+        # 返回该ETag的后端，切换后端后不再发送旧ETag | Backend that returned the ETag; it is not sent to another backend
+        self._etag_url: Optional[str] = None
+        # per_node 模式下服务器上不存在的节点类 | Classes the server does not have, in per_node mode
+        self._unknown: Set[str] = set()
+        # per_node 模式下本进程按需请求过的节点类；刷新只覆盖它们和模板用到的节点类，
+        # 不包括磁盘上旧的完整描述中的其余节点类
+        # Classes requested on demand by this process in per_node mode; refreshes only cover them and the
+        # template classes, not the rest of an older full dump on disk
+        self._requested: Set[str] = set()
+        self._lock = asyncio.Lock()
+
+    def _base_path(self) -> str:
+        return os.path.join(OBJECT_INFO_DIR, f"{self.host}_{self.port}_object_info")
+
+    @property
+    def json_path(self) -> str:
+        return self._base_path() + '.json'
+
+    @property
+    def msgpack_path(self) -> str:
+        return self._base_path() + '.msgpack'
+
+    def _use_msgpack(self) -> bool:
+        return get_settings().object_info.cache_format == 'msgpack' and msgpack is not None
+
+    def exists(self) -> bool:
+        """
+        磁盘上是否已有缓存文件
+        Whether a cache file already exists on disk
+        """
+        return os.path.exists(self.json_path) or (self._use_msgpack() and os.path.exists(self.msgpack_path))
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        if self._use_msgpack() and os.path.exists(self.msgpack_path):
+            with open(self.msgpack_path, 'rb') as f:
+                return msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+        if os.path.exists(self.json_path):
+            with open(self.json_path, 'rb') as f:
+                return json.loads(f.read())
+        return None
+
+    @property
+    def index(self) -> ObjectInfoIndex:
+        """
+        内存中的索引；load() 完成之前为空索引
+        The in-memory index; empty until load() has completed
+        """
+        return self._index if self._index is not None else _EMPTY_INDEX
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def _load(self) -> Tuple[ObjectInfoIndex, Optional[str]]:
+        # 读取、解析磁盘文件并建立索引和哈希（在工作线程中运行）
+        # Read and parse the file on disk, then build the index and digest (runs in a worker thread)
+        nodes = None
+        try:
+            nodes = self._read()
+        except Exception as e:
+            default_logger.error(f"加载ComfyUI节点描述信息时出错: {str(e)}")
+        if nodes is None:
+            default_logger.warning(f"ComfyUI节点描述文件不存在: {self.json_path}")
+        nodes = nodes or {}
+        index = ObjectInfoIndex(nodes)
+        if nodes:
+            default_logger.info(f"已加载ComfyUI节点描述信息: {len(index)} 个节点类")
+        return index, object_info_digest(nodes) if nodes else None
+
+    async def load(self) -> ObjectInfoIndex:
+        """
+        从磁盘加载索引（只加载一次），解析和哈希都在工作线程中进行，不阻塞事件循环
+        Load the index from disk (once); parsing and hashing run in a worker thread off the event loop
+
+        返回:
+            ObjectInfoIndex: 当前索引；文件不存在或损坏时为空索引
+
+        Returns:
+            ObjectInfoIndex: The current index; empty when the file is missing or corrupt
+        """
+        if self._index is None:
+            async with self._lock:
+                if self._index is None:
+                    self._index, self.digest = await asyncio.to_thread(self._load)
+        return self._index
+
+    def _set(self, nodes: Dict[str, Any]) -> None:
+        self._index = ObjectInfoIndex(nodes)
+        self.digest = object_info_digest(nodes) if nodes else None
+
+    def _write(self, nodes: Dict[str, Any]) -> None:
+        # 先写临时文件再原子重命名，读者不会看到写了一半的文件
+        # Write a temp file then rename atomically so readers never see a half-written file
+        os.makedirs(OBJECT_INFO_DIR, exist_ok=True)
+        if self._use_msgpack():
+            path, data = self.msgpack_path, msgpack.packb(nodes, use_bin_type=True)
+        else:
+            path = self.json_path
+            data = json.dumps(nodes, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def save(self, nodes: Dict[str, Any]) -> None:
+        """
+        替换内存中的索引并写入磁盘
+        Replace the in-memory index and write it to disk
+
+        参数:
+            nodes: /api/object_info 返回的节点描述
+
+        Args:
+            nodes: Node descriptions returned by /api/object_info
+        """
+        self._write(nodes)
+        self._set(nodes)
+
+    def source_url(self) -> str:
+        """
+        获取节点描述的后端：[comfyui_server] host/port 健康时使用它，否则使用后端池中第一个健康的后端；
+        都不健康时仍使用 host/port。缓存文件按 host/port 命名，因此各后端应安装相同的节点和模型。
+        Backend to fetch node descriptions from: [comfyui_server] host/port while it is healthy, otherwise
+        the first healthy backend of the pool; host/port again when none is healthy. The cache file is
+        named after host/port, so every backend is expected to have the same nodes and models installed.
+
+        返回:
+            str: 后端URL
+
+        Returns:
+            str: Backend URL
+        """
+        from .backends import get_backend_pool
+        default_url = get_settings().comfyui_server.url
+        pool = get_backend_pool()
+        backend = pool.get(default_url)
+        if backend is not None and backend.healthy:
+            return default_url
+        for backend in pool.backends:
+            if backend.healthy:
+                return backend.url
+        return default_url
+
+    async def _fetch_full(self, client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+        # 返回None表示服务器确认内容未变化（304）| None means the server confirmed nothing changed (304)
+        source = self.source_url()
+        url = f"{source}/api/object_info"
+        headers = {'If-None-Match': self._etag} if self._etag and self._etag_url == source else None
+        resp = await client.get(url, headers=headers, timeout=60.0)
+        if resp.status_code == 304:
+            return None
+        resp.raise_for_status()
+        self._etag = resp.headers.get('etag')
+        self._etag_url = source
+        return resp.json()
+
+    async def _fetch_classes(self, client: httpx.AsyncClient, class_names: List[str]) -> Dict[str, Any]:
+        # 并发获取 /api/object_info/{节点类}，不存在的节点类记入 _unknown，避免反复请求
+        # Fetch /api/object_info/{class} concurrently; unknown classes go into _unknown so they are not requested again
+        base_url = self.source_url()
+        semaphore = asyncio.Semaphore(_PER_NODE_CONCURRENCY)
+
+        async def fetch_one(class_name: str) -> Dict[str, Any]:
+            async with semaphore:
+                resp = await client.get(f"{base_url}/api/object_info/{quote(class_name, safe='')}", timeout=30.0)
+            if resp.status_code == 404:
+                return {}
+            resp.raise_for_status()
+            return resp.json()
+
+        nodes: Dict[str, Any] = {}
+        for class_name, result in zip(class_names, await asyncio.gather(*(fetch_one(c) for c in class_names))):
+            if class_name in result:
+                nodes[class_name] = result[class_name]
+            else:
+                self._unknown.add(class_name)
+        return nodes
+
+    async def fetch(self, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
+        """
+        按 [object_info] fetch_mode 获取节点描述：full 获取完整的 /api/object_info；per_node 只获取
+        模板和资源接口用到的节点类以及已经按需加载过的节点类
+        Fetch node descriptions according to [object_info] fetch_mode: full downloads the whole
+        /api/object_info; per_node only fetches the classes used by templates and resource endpoints
+        plus the classes already loaded on demand
+
+        参数:
+            client: 使用的HTTP客户端，为None时使用共享客户端
+
+        Args:
+            client: HTTP client to use, the shared client if None
+
+        返回:
+            dict: 节点描述；服务器确认内容未变化时为None
+
+        Returns:
+            dict: Node descriptions; None when the server confirmed nothing changed
+        """
+        if client is None:
+            from .comfyui_client import get_comfyui_client
+            client = get_comfyui_client().client
+        if get_settings().object_info.fetch_mode != 'per_node':
+            return await self._fetch_full(client)
+        self._unknown.clear()
+        return await self._fetch_classes(client, sorted(self.tracked_classes()))
+
+    def tracked_classes(self) -> Set[str]:
+        """
+        per_node 模式下需要保持最新的节点类：模板和代码声明的节点类，加上按需请求过的节点类
+        Classes kept up to date in per_node mode: those used by templates and declared in code, plus
+        those requested on demand
+        """
+        return required_node_classes() | self._requested
+
+    async def refresh(self) -> bool:
+        """
+        重新获取节点描述；内容（哈希）变化时才写文件并原子替换内存索引，同时记录新增和移除的节点与模型
+        Re-fetch node descriptions; only when the content (hash) changed, write the file and atomically
+        swap the in-memory index, logging the nodes and models that were added or removed
+
+        返回:
+            bool: 内容是否有变化
+
+        Returns:
+            bool: Whether the content changed
+        """
+        old = await self.load()
+        nodes = await self.fetch()
+        self.refreshed_at = time.monotonic()
+        if nodes is None:
+            return False
+        digest = await asyncio.to_thread(object_info_digest, nodes)
+        if digest == self.digest:
+            default_logger.debug("ComfyUI节点描述信息未变化")
+            return False
+        new = await asyncio.to_thread(ObjectInfoIndex, nodes)
+        await asyncio.to_thread(self._write, nodes)
+        self._index, self.digest = new, digest
+        if get_settings().object_info.fetch_mode == 'per_node':
+            # 只比较获取的节点类，未跟踪的旧节点类被丢弃不算作服务器上移除
+            # Only compare the fetched classes; dropping untracked old classes is not a removal on the server
+            tracked = self.tracked_classes()
+            old = ObjectInfoIndex({name: node for name, node in old.nodes.items() if name in tracked})
+        self._log_diff(diff_object_info(old, new))
+        return True
+
+    async def ensure(self, class_names: Iterable[str]) -> ObjectInfoIndex:
+        """
+        确保这些节点类已在索引中：per_node 模式下按需获取缺少的节点类并缓存（内存和磁盘）
+        Make sure the node classes are in the index: in per_node mode, missing classes are fetched
+        on demand and cached (in memory and on disk)
+
+        参数:
+            class_names: 节点类名称
+
+        Args:
+            class_names: Node class names
+
+        返回:
+            ObjectInfoIndex: 当前索引
+
+        Returns:
+            ObjectInfoIndex: The current index
+        """
+        index = await self.load()
+        if get_settings().object_info.fetch_mode != 'per_node':
+            return index
+        class_names = list(class_names)
+        self._requested.update(class_names)
+        missing = [c for c in class_names if c not in index and c not in self._unknown]
+        if not missing:
+            return index
+        async with self._lock:
+            missing = [c for c in missing if c not in self.index]
+            if missing:
+                from .comfyui_client import get_comfyui_client
+                fetched = await self._fetch_classes(get_comfyui_client().client, missing)
+                if fetched:
+                    await asyncio.to_thread(self.save, {**self.index.nodes, **fetched})
+                    default_logger.info(f"按需加载节点描述: {', '.join(sorted(fetched))}")
+        return self.index
+
+    def _log_diff(self, diff: Dict[str, Any]) -> None:
+        default_logger.info(f"ComfyUI节点描述信息已更新: {len(self._index)} 个节点类")
+        if diff['added_nodes']:
+            default_logger.info(f"新增节点: {_preview(diff['added_nodes'])}")
+        if diff['removed_nodes']:
+            default_logger.info(f"移除节点: {_preview(diff['removed_nodes'])}")
+        for name, change in sorted(diff['options'].items()):
+            if change['added']:
+                default_logger.info(f"{name} 新增: {_preview(change['added'])}")
+            if change['removed']:
+                default_logger.info(f"{name} 移除: {_preview(change['removed'])}")
+
+# 进程内唯一的节点描述存储
+# The single process-wide node description store
+_object_info_store: Optional[ObjectInfoStore] = None
+
+def get_object_info_store() -> ObjectInfoStore:
+    """
+    获取当前 [comfyui_server] 对应的节点描述存储
+    Get the node description store of the current [comfyui_server]
+
+    返回:
+        ObjectInfoStore: 共享存储
+
+    Returns:
+        ObjectInfoStore: Shared store
+    """
+    global _object_info_store
+    server = get_settings().comfyui_server
+    if _object_info_store is None or (_object_info_store.host, _object_info_store.port) != (server.host, server.port):
+        _object_info_store = ObjectInfoStore(server.host, server.port)
+    return _object_info_store
+
+# 后台刷新任务 | Background refresh task
+_refresh_task: Optional[asyncio.Task] = None
+
+async def _refresh_loop() -> None:
+    while True:
+        interval = get_settings().object_info.refresh_interval
+        if interval <= 0:
+            # 已关闭，等待配置重新加载后再检查 | Disabled; check again after a possible reload
+            await asyncio.sleep(60)
+            continue
+        store = get_object_info_store()
+        last = store.refreshed_at
+        if last is None and store.exists():
+            # 启动时已有缓存文件：先用它，一个间隔后再刷新
+            # A cache file exists at startup: use it and refresh after one interval
+            last = store.refreshed_at = time.monotonic()
+        delay = 0.0 if last is None else last + interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            continue
+        try:
+            await store.refresh()
+        except Exception as e:
+            # 还没有任何节点描述时（如启动时ComfyUI未就绪）更快重试
+            # Retry sooner while there are no node descriptions at all (e.g. ComfyUI was not up at startup)
+            retry = interval if len(store.index) else min(interval, 30.0)
+            store.refreshed_at = time.monotonic() - interval + retry
+            default_logger.warning(f"刷新ComfyUI节点描述信息失败，{retry}秒后重试: {str(e)}")
+
+def start_object_info_refresh() -> None:
+    """
+    启动后台刷新任务（需在事件循环中调用），间隔由 [object_info] refresh_interval 决定
+    Start the background refresh task (must be called inside an event loop); the interval
+    comes from [object_info] refresh_interval
+    """
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def close_object_info_refresh() -> None:
+    """
+    停止后台刷新任务
+    Stop the background refresh task
+    """
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
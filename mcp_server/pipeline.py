@@ -0,0 +1,149 @@
+import time
+import httpx
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .logger import default_logger
+from .comfyui_client import get_comfyui_client
+from .completion import get_completion_tracker
+from .jobs import note_submitted
+from .backends import get_backend_pool
+from .admission import get_admission_controller
+from .metrics import BACKEND_JOBS, observe_phase
+from .tracing import SPAN_KIND_CLIENT, get_tracer
+
+# 错误日志中ComfyUI响应内容的最大字符数 | Maximum characters of the ComfyUI response kept in error logs
+_ERROR_BODY_CHARS = 2000
+
+def find_output_images(outputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    从任务输出中找到第一个包含images的节点
+    Find the first output node containing images
+
+    参数:
+        outputs: history条目中的outputs
+
+    Args:
+        outputs: outputs of a history entry
+
+    返回:
+        list: 图片元数据列表（filename / subfolder / type）
+
+    Returns:
+        list: Image metadata list (filename / subfolder / type)
+    """
+    for node_id, node_data in outputs.items():
+        if "images" in node_data:
+            return node_data["images"]
+    error_msg = "未找到包含images的输出节点 | No output node with images found"
+    default_logger.error(error_msg)
+    raise Exception(error_msg)
+
+class WorkflowResult:
+    """
+    一次ComfyUI任务的执行结果，记录接受该任务的后端，后续下载都发往同一后端
+    Result of a ComfyUI job; remembers the backend that accepted it so follow-up downloads go there
+    """
+
+    def __init__(self, comfyui_host: str, prompt_id: str, history: Dict[str, Any]):
+        self.comfyui_host = comfyui_host
+        self.prompt_id = prompt_id
+        self.outputs = history["outputs"]
+        self.images = find_output_images(self.outputs)
+
+    def image_url(self, img_meta: Dict[str, Any]) -> str:
+        """
+        构建输出图片的 /api/view 地址
+        Build the /api/view URL of an output image
+        """
+        return f"{self.comfyui_host}/api/view?filename={img_meta['filename']}&subfolder={img_meta['subfolder']}&type=output"
+
+async def execute_workflow(
+    prompt_template: Dict[str, Any],
+    extra_data: Optional[Dict[str, Any]] = None,
+    prepare: Optional[Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+) -> WorkflowResult:
+    """
+    经准入控制取得后端名额、提交工作流并等待完成
+    Obtain a backend slot through admission control, submit the workflow and wait for it to finish
+
+    上传（prepare）、提交、history查询都固定在同一个后端上。
+    Upload (prepare), submit and history queries all stay on the same backend.
+
+    参数:
+        prompt_template: 已填充参数的工作流
+        extra_data: 可选的extra_data字段
+        prepare: 提交前在选中后端上执行的回调 (comfyui_host, prompt_template) -> prompt_template，如上传图片
+
+    Args:
+        prompt_template: Workflow with parameters filled in
+        extra_data: Optional extra_data field
+        prepare: Callback run on the selected backend before submit, (comfyui_host, prompt_template) -> prompt_template, e.g. image upload
+
+    返回:
+        WorkflowResult: 执行结果
+
+    Returns:
+        WorkflowResult: Execution result
+
+    异常:
+        AdmissionRejected: 等待队列已满
+
+    Raises:
+        AdmissionRejected: The wait queue is full
+    """
+    pool = get_backend_pool()
+    client = get_comfyui_client()
+    tracker = get_completion_tracker()
+    tracer = get_tracer()
+    async with get_admission_controller().slot() as backend:
+        comfyui_host = backend.url
+        tracker.ensure_connected(comfyui_host)
+        with tracer.span('comfyui.job', {'comfyui.backend': comfyui_host, 'client_id': tracker.client_id}) as job_span:
+            # prepare（如获取外部图片、上传）的错误与 /api/prompt 提交无关：单独记录后原样抛出，
+            # 不计入后端健康状态，以免外部URL不可用时把健康的后端摘除
+            # Errors from prepare (e.g. fetching an external image, uploading) have nothing to do with the
+            # /api/prompt submit: log them separately and re-raise without counting them against the backend,
+            # so an unreachable external URL cannot eject a healthy backend
+            if prepare is not None:
+                try:
+                    prompt_template = await prepare(comfyui_host, prompt_template)
+                except Exception as e:
+                    default_logger.error(f"提交前准备失败（如上传图片）: {comfyui_host}, {type(e).__name__}: {str(e)}")
+                    raise
+            body = {
+                "client_id": tracker.client_id,
+                "prompt": prompt_template
+            }
+            if extra_data:
+                body["extra_data"] = extra_data
+            default_logger.debug("开始向ComfyUI发送API请求: %s/api/prompt", comfyui_host)
+            default_logger.payload("请求体内容", body)
+            start = time.perf_counter()
+            try:
+                with tracer.span('comfyui.submit', {'client_id': tracker.client_id}, kind=SPAN_KIND_CLIENT) as submit_span:
+                    prompt_id = (await client.submit_prompt(comfyui_host, body))["prompt_id"]
+                    submit_span.set_attribute('prompt_id', prompt_id)
+                BACKEND_JOBS.inc(comfyui_host)
+            except httpx.HTTPStatusError as e:
+                # ERROR 只记录摘要，完整请求体走调试负载通道（关闭时不序列化）
+                # ERROR only gets a summary; the full body goes to the debug payload channel (not serialized while off)
+                default_logger.error(
+                    f"ComfyUI接口报错: {comfyui_host}, 状态码 {e.response.status_code}, 工作流 {len(prompt_template)} 个节点，"
+                    f"响应内容：{e.response.text[:_ERROR_BODY_CHARS]}"
+                )
+                default_logger.payload("被拒绝的请求体", body)
+                raise
+            except httpx.TransportError as e:
+                # 只有 /api/prompt 提交的网络错误才计入后端失败 | Only network errors of the /api/prompt submit count against the backend
+                pool.report_failure(backend, e)
+                raise
+            job_span.set_attribute('prompt_id', prompt_id)
+            default_logger.debug("成功提交ComfyUI任务, prompt_id: %s, 后端: %s", prompt_id, comfyui_host)
+            tracker.trace_job(prompt_id, prompt_template)
+            note_submitted(comfyui_host, prompt_id, prompt_template)
+            try:
+                history = await tracker.wait_for_completion(comfyui_host, prompt_id)
+            finally:
+                tracker.end_trace(prompt_id)
+            observe_phase('execution', time.perf_counter() - start)
+            default_logger.debug("ComfyUI任务完成: %s", history['status']['status_str'])
+    return WorkflowResult(comfyui_host, prompt_id, history)
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from .settings import ResultCacheSettings, get_settings
+from .logger import default_logger
+from .downloader import copy_all
+
+_INDEX_FILE = 'index.json'
+
+class ResultCache:
+    """
+    按内容寻址的生成结果缓存：输出图片存放在磁盘上，按总字节数做LRU淘汰，条目有TTL
+    Content-addressed generation result cache: output images live on disk with LRU eviction
+    by total bytes and a per-entry TTL
+    """
+
+    def __init__(self, settings: Optional[ResultCacheSettings] = None):
+        """
+        初始化结果缓存；磁盘上的索引在首次 lookup/store 时于工作线程中加载，不阻塞事件循环
+        Initialize the result cache; the on-disk index is loaded in a worker thread on the first
+        lookup/store so the event loop is not blocked
+
+        参数:
+            settings: 缓存配置，如果为None则使用当前 [result_cache] 配置
+
+        Args:
+            settings: Cache settings, the current [result_cache] settings if None
+        """
+        self.settings = settings if settings is not None else get_settings().result_cache
+        # key -> {'files': [文件名 | file names], 'size': 字节数 | bytes, 'created': 时间戳 | timestamp}
+        # 顺序即LRU顺序，最近使用的在末尾
+        # Order is the LRU order, most recently used last
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._size = 0
+        # 索引只在工作线程中修改，用锁保证同一时间只有一个
+        # The index is only modified in worker threads, one at a time under this lock
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.enabled
+
+    def _index_path(self) -> str:
+        return os.path.join(self.settings.cache_dir, _INDEX_FILE)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.settings.cache_dir, key)
+
+    def _load_index(self) -> None:
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            default_logger.warning(f"读取结果缓存索引失败，将重建: {str(e)}")
+            return
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].get('accessed', 0)):
+            self._entries[key] = entry
+            self._size += entry['size']
+        default_logger.info(f"结果缓存已加载: {len(self._entries)} 条, {self._size} 字节")
+
+    async def _ensure_loaded(self) -> None:
+        # 持有 self._lock 时调用：首次使用时在工作线程中加载索引
+        # Called with self._lock held: load the index in a worker thread on first use
+        if not self._loaded:
+            await asyncio.to_thread(self._load_index)
+            self._loaded = True
+
+    def _save_index(self) -> None:
+        os.makedirs(self.settings.cache_dir, exist_ok=True)
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self._index_path())
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry['size']
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.settings.ttl > 0 and time.time() - entry['created'] > self.settings.ttl
+
+    def _lookup(self, key: str) -> Optional[Tuple[List[str], Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        paths = [os.path.join(self._entry_dir(key), name) for name in entry['files']]
+        if self._expired(entry) or not all(os.path.exists(p) for p in paths):
+            self._drop(key)
+            self._save_index()
+            return None
+        entry['accessed'] = time.time()
+        self._entries.move_to_end(key)
+        return paths, entry.get('metadata', {})
+
+    async def lookup(self, key: str) -> Optional[Tuple[List[str], Dict[str, Any]]]:
+        """
+        查找缓存的输出图片
+        Look up cached output images
+
+        参数:
+            key: canonical_hash() 得到的键
+
+        Args:
+            key: Key from canonical_hash()
+
+        返回:
+            tuple: (缓存文件路径, 存入时的元数据)；未命中、已过期或文件丢失时为None
+
+        Returns:
+            tuple: (cached file paths, metadata given at store time); None on a miss, expiry or missing files
+        """
+        async with self._lock:
+            await self._ensure_loaded()
+            hit = await asyncio.to_thread(self._lookup, key)
+        if hit is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            default_logger.info(f"结果缓存命中: {key[:16]}, {len(hit[0])} 张图片")
+        return hit
+
+    def _store(self, key: str, paths: List[str], metadata: Dict[str, Any]) -> None:
+        self._drop(key)
+        # 超过总上限的结果直接跳过，不为它清空其余条目
+        # A result larger than the whole limit is skipped instead of evicting every other entry for it
+        if sum(os.path.getsize(path) for path in paths) > self.settings.max_bytes:
+            default_logger.debug("结果超过缓存上限，不缓存: %s", key[:16])
+            self._save_index()
+            return
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        files = []
+        size = 0
+        for i, path in enumerate(paths):
+            name = f"{i}{os.path.splitext(path)[1] or '.png'}"
+            shutil.copyfile(path, os.path.join(entry_dir, name))
+            files.append(name)
+            size += os.path.getsize(path)
+        now = time.time()
+        self._entries[key] = {'files': files, 'size': size, 'created': now, 'accessed': now, 'metadata': metadata}
+        self._size += size
+        # 按总字节数淘汰最久未使用的条目
+        # Evict least recently used entries by total bytes
+        while self._size > self.settings.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+        self._save_index()
+
+    async def store(self, key: str, paths: List[str], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        把一次生成的输出图片复制进缓存
+        Copy the output images of a generation into the cache
+
+        参数:
+            key: canonical_hash() 得到的键
+            paths: 已下载到本地的图片路径
+            metadata: 随条目保存的JSON元数据（如实际使用的种子）
+
+        Args:
+            key: Key from canonical_hash()
+            paths: Local paths of the downloaded images
+            metadata: JSON metadata saved with the entry (e.g. the seeds actually used)
+        """
+        async with self._lock:
+            await self._ensure_loaded()
+            try:
+                await asyncio.to_thread(self._store, key, paths, metadata or {})
+            except Exception as e:
+                default_logger.error(f"写入结果缓存失败: {str(e)}")
+                await asyncio.to_thread(self._drop, key)
+
+    async def restore(self, key: str, targets: List[Tuple[str, str]]) -> Optional[List[str]]:
+        """
+        把缓存文件复制到调用方请求的保存路径；查找之后条目已被淘汰（文件不存在）时删除条目并按未命中处理
+        Copy cached files to the save paths requested by the caller; when the entry was evicted after the
+        lookup (files gone), drop it and treat it as a miss
+
+        参数:
+            key: lookup() 命中的键
+            targets: (缓存文件路径, 本地保存路径) 列表
+
+        Args:
+            key: Key that lookup() hit
+            targets: List of (cached file path, local save path)
+
+        返回:
+            list: 本地保存路径；条目已不存在时为None，调用方应改为执行工作流
+
+        Returns:
+            list: Local save paths; None when the entry is gone and the caller should run the workflow instead
+        """
+        async with self._lock:
+            try:
+                return await copy_all(targets)
+            except OSError as e:
+                # 只有缓存文件本身丢失才按未命中处理，写入目标失败等错误照常抛出
+                # Only missing cache files count as a miss; other errors such as an unwritable target are raised
+                if all(os.path.exists(src) for src, _ in targets):
+                    raise
+                default_logger.warning(f"结果缓存条目已失效，改为执行工作流: {key[:16]}, {str(e)}")
+                self.hits -= 1
+                self.misses += 1
+                await asyncio.to_thread(self._discard, key)
+                return None
+
+    def _discard(self, key: str) -> None:
+        self._drop(key)
+        self._save_index()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        缓存统计（索引在首次使用前尚未加载，loaded 为False）
+        Cache statistics (the index is not loaded before first use, with loaded False)
+        """
+        return {
+            'enabled': self.enabled,
+            'loaded': self._loaded,
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+# 进程内唯一的结果缓存
+# The single process-wide result cache
+_result_cache: Optional[ResultCache] = None
+
+def get_result_cache() -> ResultCache:
+    """
+    获取进程内共享的结果缓存
+    Get the process-wide shared result cache
+
+    返回:
+        ResultCache: 共享结果缓存
+
+    Returns:
+        ResultCache: Shared result cache
+    """
+    global _result_cache
+    if _result_cache is None or _result_cache.settings != get_settings().result_cache:
+        _result_cache = ResultCache()
+    return _result_cache
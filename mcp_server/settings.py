@@ -0,0 +1,512 @@
+import configparser
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 默认配置文件路径
+# Default configuration file path
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
+
+# 项目根目录，配置中的相对路径以它为基准
+# Project root, relative paths in the configuration are resolved against it
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LEVEL_MAP = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'CRITICAL': logging.CRITICAL
+}
+
+# [generation] seed_policy 的取值 | Values of [generation] seed_policy
+SEED_POLICIES = ('random', 'fixed', 'prompt_hash')
+# [comfyui_server] routing 的取值 | Values of [comfyui_server] routing
+ROUTING_POLICIES = ('least_queue', 'weighted')
+# 请求优先级，从高到低（[admission] default_priority 的取值）
+# Request priorities from highest to lowest (values of [admission] default_priority)
+PRIORITIES = ('high', 'normal', 'low')
+# [object_info] cache_format / fetch_mode 的取值 | Values of [object_info] cache_format / fetch_mode
+CACHE_FORMATS = ('json', 'msgpack')
+FETCH_MODES = ('full', 'per_node')
+# [mcp_server] transport 的取值 | Values of [mcp_server] transport
+TRANSPORTS = ('sse', 'streamable-http', 'stdio')
+# [tracing] exporter 的取值 | Values of [tracing] exporter
+TRACE_EXPORTERS = ('file', 'otlp')
+# [logging] queue_full_policy 的取值 | Values of [logging] queue_full_policy
+QUEUE_FULL_POLICIES = ('drop', 'block')
+
+@dataclass(frozen=True)
+class BackendSettings:
+    """单个ComfyUI后端 | A single ComfyUI backend"""
+    url: str
+    weight: int = 1
+
+@dataclass(frozen=True)
+class ComfyUIServerSettings:
+    """[comfyui_server] 配置 | [comfyui_server] settings"""
+    host: str
+    port: str
+    backends: Tuple[BackendSettings, ...]
+    routing: str
+    health_check_interval: float
+    health_check_timeout: float
+    max_failures: int
+
+    @property
+    def url(self) -> str:
+        """默认后端URL | Default backend URL"""
+        return f"http://{self.host}:{self.port}"
+
+@dataclass(frozen=True)
+class HttpClientSettings:
+    """[http_client] 配置 | [http_client] settings"""
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    http2: bool
+    connect_timeout: float
+    submit_timeout: float
+    history_timeout: float
+    view_timeout: float
+    upload_timeout: float
+
+@dataclass(frozen=True)
+class CompletionSettings:
+    """[completion] 配置 | [completion] settings"""
+    use_websocket: bool
+    reconnect_interval: float
+    poll_min_interval: float
+    poll_max_interval: float
+    job_timeout: float
+
+@dataclass(frozen=True)
+class GenerationSettings:
+    """[generation] 配置 | [generation] settings"""
+    seed_policy: str
+    fixed_seed: int
+
+@dataclass(frozen=True)
+class AdmissionSettings:
+    """[admission] 配置 | [admission] settings"""
+    max_inflight_per_backend: int
+    max_queue_size: int
+    default_priority: str
+
+@dataclass(frozen=True)
+class BatchSettings:
+    """[batch] 配置 | [batch] settings"""
+    max_items: int
+    max_concurrency: int
+
+@dataclass(frozen=True)
+class DownloadSettings:
+    """[download] 配置 | [download] settings"""
+    max_concurrent_per_job: int
+    max_concurrent_total: int
+
+@dataclass(frozen=True)
+class ResultCacheSettings:
+    """[result_cache] 配置 | [result_cache] settings"""
+    enabled: bool
+    cache_dir: str
+    max_bytes: int
+    ttl: float
+
+@dataclass(frozen=True)
+class JobsSettings:
+    """[jobs] 配置 | [jobs] settings"""
+    db_path: str
+    retention: float
+    max_wait: float
+
+@dataclass(frozen=True)
+class ObjectInfoSettings:
+    """[object_info] 配置 | [object_info] settings"""
+    cache_format: str
+    refresh_interval: float
+    fetch_mode: str
+
+@dataclass(frozen=True)
+class MCPServerSettings:
+    """[mcp_server] 配置 | [mcp_server] settings"""
+    host: str
+    port: int
+    transport: str
+
+@dataclass(frozen=True)
+class MetricsSettings:
+    """[metrics] 配置 | [metrics] settings"""
+    enabled: bool
+    path: str
+
+@dataclass(frozen=True)
+class TracingSettings:
+    """[tracing] 配置 | [tracing] settings"""
+    enabled: bool
+    exporter: str
+    file_path: str
+    otlp_endpoint: str
+    service_name: str
+    export_interval: float
+    max_queue_size: int
+
+@dataclass(frozen=True)
+class LoggingSettings:
+    """[logging] 配置 | [logging] settings"""
+    level: int
+    console_output: bool
+    log_path: str
+    max_file_size: int
+    backup_count: int
+    async_mode: bool
+    queue_size: int
+    queue_full_policy: str
+    payload_debug: bool
+
+@dataclass(frozen=True)
+class CallLogRule:
+    """单个工具的调用日志规则 | Call logging rule of a single tool"""
+    sample_rate: float
+    log_args: bool
+    log_result: bool
+    result_max_chars: int
+    redact_args: Tuple[str, ...]
+
+@dataclass(frozen=True)
+class CallLoggingSettings:
+    """[call_logging] 配置 | [call_logging] settings"""
+    default: CallLogRule
+    # 工具名 -> 覆盖后的规则 | tool name -> overridden rule
+    tools: Dict[str, CallLogRule]
+
+    def rule_for(self, tool_name: str) -> CallLogRule:
+        """
+        获取工具的调用日志规则
+        Get the call logging rule of a tool
+        """
+        # configparser 会把选项名转为小写 | configparser lower-cases option names
+        return self.tools.get(tool_name.lower(), self.default)
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    config.ini 解析后的类型化配置，启动时加载一次，之后只通过 reload_settings() 显式重新加载
+    Typed settings parsed from config.ini, loaded once at startup and only reloaded explicitly via reload_settings()
+    """
+    path: str
+    comfyui_server: ComfyUIServerSettings
+    http_client: HttpClientSettings
+    completion: CompletionSettings
+    generation: GenerationSettings
+    admission: AdmissionSettings
+    batch: BatchSettings
+    download: DownloadSettings
+    result_cache: ResultCacheSettings
+    jobs: JobsSettings
+    object_info: ObjectInfoSettings
+    mcp_server: MCPServerSettings
+    metrics: MetricsSettings
+    tracing: TracingSettings
+    logging: LoggingSettings
+    call_logging: CallLoggingSettings
+
+def _parse_backends(value: str, default_url: str) -> Tuple[BackendSettings, ...]:
+    # 格式: host:port 或 host:port*权重，逗号分隔；为空时使用默认后端
+    # Format: host:port or host:port*weight, comma separated; the default backend when empty
+    backends = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        address, _, weight = item.partition('*')
+        address = address.strip()
+        if not address.startswith(('http://', 'https://')):
+            address = f"http://{address}"
+        backends.append(BackendSettings(address.rstrip('/'), max(int(weight or 1), 1)))
+    if not backends:
+        backends.append(BackendSettings(default_url, 1))
+    return tuple(backends)
+
+def _parse_call_log_rule(options: Dict[str, str], base: CallLogRule) -> CallLogRule:
+    # 未出现的选项沿用base | Options that are absent keep the value from base
+    def boolean(name: str, fallback: bool) -> bool:
+        value = options.get(name, '').strip().lower()
+        return configparser.ConfigParser.BOOLEAN_STATES.get(value, fallback)
+
+    redact = options.get('redact_args')
+    return CallLogRule(
+        sample_rate=min(max(float(options.get('sample_rate') or base.sample_rate), 0.0), 1.0),
+        log_args=boolean('log_args', base.log_args),
+        log_result=boolean('log_result', base.log_result),
+        result_max_chars=max(int(options.get('result_max_chars') or base.result_max_chars), 0),
+        redact_args=base.redact_args if redact is None else tuple(n.strip() for n in redact.split(',') if n.strip()),
+    )
+
+def _parse_call_logging(section) -> CallLoggingSettings:
+    # 普通选项为默认规则，"工具名.选项" 形式的选项覆盖单个工具
+    # Plain options form the default rule; options named "tool.option" override a single tool
+    plain = {}
+    per_tool: Dict[str, Dict[str, str]] = {}
+    for key, value in section.items():
+        tool, dot, option = key.rpartition('.')
+        if dot:
+            per_tool.setdefault(tool, {})[option] = value
+        else:
+            plain[key] = value
+    builtin = CallLogRule(sample_rate=1.0, log_args=True, log_result=True, result_max_chars=1000, redact_args=())
+    default = _parse_call_log_rule(plain, builtin)
+    tools = {tool: _parse_call_log_rule(options, default) for tool, options in per_tool.items()}
+    return CallLoggingSettings(default=default, tools=tools)
+
+def _get_choice(config: configparser.ConfigParser, section: str, option: str, fallback: str,
+                choices: Tuple[str, ...]) -> str:
+    # 拼写错误不能悄悄退回默认行为 | A typo must not silently fall back to the default behaviour
+    value = config.get(section, option, fallback=fallback).strip().lower()
+    if value not in choices:
+        raise ValueError(f"[{section}] {option} 无效: {value!r}，可选 {', '.join(choices)} | "
+                         f"invalid [{section}] {option}: {value!r}, expected one of {', '.join(choices)}")
+    return value
+
+def load_settings(path: str = CONFIG_PATH) -> Settings:
+    """
+    读取并解析配置文件
+    Read and parse the configuration file
+
+    参数:
+        path: 配置文件路径
+
+    Args:
+        path: Configuration file path
+
+    返回:
+        Settings: 类型化配置
+
+    Returns:
+        Settings: Typed settings
+
+    异常:
+        ValueError: 选项取值无效（如未知的 seed_policy 或 routing）
+
+    Raises:
+        ValueError: An option has an invalid value (e.g. an unknown seed_policy or routing)
+    """
+    config = configparser.ConfigParser()
+    config.read(path, encoding='utf-8')
+
+    section = 'comfyui_server'
+    host = config.get(section, 'host', fallback='127.0.0.1')
+    port = config.get(section, 'port', fallback='8188')
+    comfyui_server = ComfyUIServerSettings(
+        host=host,
+        port=port,
+        backends=_parse_backends(config.get(section, 'backends', fallback=''), f"http://{host}:{port}"),
+        routing=_get_choice(config, section, 'routing', 'least_queue', ROUTING_POLICIES),
+        health_check_interval=config.getfloat(section, 'health_check_interval', fallback=10.0),
+        health_check_timeout=config.getfloat(section, 'health_check_timeout', fallback=5.0),
+        max_failures=config.getint(section, 'max_failures', fallback=2),
+    )
+
+    section = 'http_client'
+    http_client = HttpClientSettings(
+        max_connections=config.getint(section, 'max_connections', fallback=100),
+        max_keepalive_connections=config.getint(section, 'max_keepalive_connections', fallback=20),
+        keepalive_expiry=config.getfloat(section, 'keepalive_expiry', fallback=30.0),
+        http2=config.getboolean(section, 'http2', fallback=False),
+        connect_timeout=config.getfloat(section, 'connect_timeout', fallback=5.0),
+        submit_timeout=config.getfloat(section, 'submit_timeout', fallback=30.0),
+        history_timeout=config.getfloat(section, 'history_timeout', fallback=10.0),
+        view_timeout=config.getfloat(section, 'view_timeout', fallback=120.0),
+        upload_timeout=config.getfloat(section, 'upload_timeout', fallback=120.0),
+    )
+
+    section = 'completion'
+    completion = CompletionSettings(
+        use_websocket=config.getboolean(section, 'use_websocket', fallback=True),
+        reconnect_interval=config.getfloat(section, 'reconnect_interval', fallback=5.0),
+        poll_min_interval=config.getfloat(section, 'poll_min_interval', fallback=0.5),
+        poll_max_interval=config.getfloat(section, 'poll_max_interval', fallback=5.0),
+        job_timeout=config.getfloat(section, 'job_timeout', fallback=0.0),
+    )
+
+    section = 'generation'
+    generation = GenerationSettings(
+        seed_policy=_get_choice(config, section, 'seed_policy', 'random', SEED_POLICIES),
+        fixed_seed=config.getint(section, 'fixed_seed', fallback=0),
+    )
+
+    section = 'admission'
+    admission = AdmissionSettings(
+        max_inflight_per_backend=max(config.getint(section, 'max_inflight_per_backend', fallback=2), 1),
+        max_queue_size=max(config.getint(section, 'max_queue_size', fallback=100), 0),
+        default_priority=_get_choice(config, section, 'default_priority', 'normal', PRIORITIES),
+    )
+
+    section = 'batch'
+    batch = BatchSettings(
+        max_items=max(config.getint(section, 'max_items', fallback=32), 1),
+        max_concurrency=max(config.getint(section, 'max_concurrency', fallback=0), 0),
+    )
+
+    section = 'download'
+    download = DownloadSettings(
+        max_concurrent_per_job=max(config.getint(section, 'max_concurrent_per_job', fallback=4), 1),
+        max_concurrent_total=max(config.getint(section, 'max_concurrent_total', fallback=16), 1),
+    )
+
+    section = 'result_cache'
+    cache_dir = config.get(section, 'cache_dir', fallback='cache')
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.join(_PROJECT_ROOT, cache_dir)
+    result_cache = ResultCacheSettings(
+        enabled=config.getboolean(section, 'enabled', fallback=False),
+        cache_dir=cache_dir,
+        max_bytes=int(config.getfloat(section, 'max_size_mb', fallback=1024) * 1024 * 1024),
+        ttl=config.getfloat(section, 'ttl', fallback=86400.0),
+    )
+
+    section = 'jobs'
+    db_path = config.get(section, 'db_path', fallback=os.path.join('jobs', 'jobs.db'))
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(_PROJECT_ROOT, db_path)
+    jobs = JobsSettings(
+        db_path=db_path,
+        retention=max(config.getfloat(section, 'retention', fallback=604800.0), 0.0),
+        max_wait=max(config.getfloat(section, 'max_wait', fallback=300.0), 0.0),
+    )
+
+    section = 'object_info'
+    object_info = ObjectInfoSettings(
+        cache_format=_get_choice(config, section, 'cache_format', 'json', CACHE_FORMATS),
+        refresh_interval=max(config.getfloat(section, 'refresh_interval', fallback=300.0), 0.0),
+        fetch_mode=_get_choice(config, section, 'fetch_mode', 'full', FETCH_MODES),
+    )
+
+    section = 'mcp_server'
+    mcp_server = MCPServerSettings(
+        host=config.get(section, 'host', fallback='0.0.0.0'),
+        port=config.getint(section, 'port', fallback=9000),
+        transport=_get_choice(config, section, 'transport', 'sse', TRANSPORTS),
+    )
+
+    section = 'metrics'
+    metrics = MetricsSettings(
+        enabled=config.getboolean(section, 'enabled', fallback=True),
+        path='/' + config.get(section, 'path', fallback='/metrics').strip().lstrip('/'),
+    )
+
+    section = 'tracing'
+    trace_path = config.get(section, 'file_path', fallback='logs/traces.jsonl')
+    if not os.path.isabs(trace_path):
+        trace_path = os.path.join(_PROJECT_ROOT, trace_path)
+    tracing = TracingSettings(
+        enabled=config.getboolean(section, 'enabled', fallback=False),
+        exporter=_get_choice(config, section, 'exporter', 'file', TRACE_EXPORTERS),
+        file_path=trace_path,
+        otlp_endpoint=config.get(section, 'otlp_endpoint', fallback='http://127.0.0.1:4318').strip().rstrip('/'),
+        service_name=config.get(section, 'service_name', fallback='comfyui-mcp-server'),
+        export_interval=max(config.getfloat(section, 'export_interval', fallback=5.0), 0.1),
+        max_queue_size=max(config.getint(section, 'max_queue_size', fallback=4096), 1),
+    )
+
+    section = 'logging'
+    log_path = config.get(section, 'log_path', fallback='logs/mcp_server.log')
+    # 如果路径是相对路径，则转换为绝对路径
+    # If path is relative, convert to absolute path
+    if not os.path.isabs(log_path):
+        log_path = os.path.join(_PROJECT_ROOT, log_path)
+    logging_settings = LoggingSettings(
+        level=_LEVEL_MAP.get(config.get(section, 'level', fallback='INFO').upper(), logging.INFO),
+        console_output=config.getboolean(section, 'console_output', fallback=True),
+        log_path=log_path,
+        max_file_size=config.getint(section, 'max_file_size', fallback=10*1024*1024),  # 默认10MB
+        backup_count=config.getint(section, 'backup_count', fallback=5),
+        async_mode=config.getboolean(section, 'async_mode', fallback=True),
+        queue_size=max(config.getint(section, 'queue_size', fallback=10000), 1),
+        queue_full_policy=_get_choice(config, section, 'queue_full_policy', 'drop', QUEUE_FULL_POLICIES),
+        payload_debug=config.getboolean(section, 'payload_debug', fallback=False),
+    )
+
+    section = 'call_logging'
+    call_logging = _parse_call_logging(config[section] if config.has_section(section) else {})
+
+    return Settings(
+        path=path,
+        comfyui_server=comfyui_server,
+        http_client=http_client,
+        completion=completion,
+        generation=generation,
+        admission=admission,
+        batch=batch,
+        download=download,
+        result_cache=result_cache,
+        jobs=jobs,
+        object_info=object_info,
+        mcp_server=mcp_server,
+        metrics=metrics,
+        tracing=tracing,
+        logging=logging_settings,
+        call_logging=call_logging,
+    )
+
+# 当前生效的配置与重新加载监听器
+# Current settings and reload listeners
+_settings: Optional[Settings] = None
+_reload_listeners: List[Callable[[Settings, Settings], None]] = []
+
+def get_settings() -> Settings:
+    """
+    获取当前配置（首次调用时从磁盘加载，之后不再访问文件系统）
+    Get the current settings (loaded from disk on first call, no filesystem access afterwards)
+
+    返回:
+        Settings: 当前配置
+
+    Returns:
+        Settings: Current settings
+    """
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+def add_reload_listener(listener: Callable[[Settings, Settings], None]) -> None:
+    """
+    注册配置重新加载监听器，重新加载后以 (旧配置, 新配置) 调用
+    Register a reload listener, called with (old settings, new settings) after a reload
+
+    参数:
+        listener: 监听函数
+
+    Args:
+        listener: Listener function
+    """
+    _reload_listeners.append(listener)
+
+def reload_settings() -> Settings:
+    """
+    从磁盘重新加载配置并通知所有监听器（由SIGHUP或管理工具触发）
+    Reload the settings from disk and notify all listeners (triggered by SIGHUP or the admin tool)
+
+    mcp_server 的监听地址/端口/传输模式、http_client 连接池参数和日志输出目标需重启服务后生效。
+    The mcp_server host/port/transport, the http_client pool limits and the log outputs take effect only after a restart.
+
+    返回:
+        Settings: 新配置
+
+    Returns:
+        Settings: New settings
+    """
+    global _settings
+    old = get_settings()
+    new = load_settings(old.path)
+    _settings = new
+    logger = logging.getLogger("mcp_logger")
+    for listener in _reload_listeners:
+        try:
+            listener(old, new)
+        except Exception as e:
+            logger.error(f"应用新配置时出错: {str(e)}")
+    logger.info(f"配置已重新加载: {new.path}")
+    return new
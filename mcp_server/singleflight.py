@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from .logger import default_logger
+
+class SingleFlight:
+    """
+    相同键的并发调用只执行一次，其余调用等待并共享同一结果
+    Concurrent calls with the same key run only once; the others wait for and share the same result
+
+    共享的工作在独立任务中运行，发起者被取消不会影响仍在等待的调用方。
+    The shared work runs in its own task, so cancelling the caller that started it does not
+    affect the callers still waiting.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行或加入键为key的调用
+        Run or join the call for key
+
+        参数:
+            key: 合并键（如工作流哈希）
+            fn: 实际执行的协程函数
+
+        Args:
+            key: Coalescing key (e.g. workflow hash)
+            fn: Coroutine function doing the actual work
+
+        返回:
+            tuple: (结果, 是否由本次调用执行)
+
+        Returns:
+            tuple: (result, whether this call ran the work itself)
+        """
+        task = self._inflight.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+            default_logger.info(f"合并相同的并发任务: {key[:16]}")
+        return await asyncio.shield(task), leader
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+        # Avoid "exception was never retrieved" warnings when every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def inflight(self) -> int:
+        """
+        正在执行的不同键数
+        Number of distinct keys currently running
+        """
+        return len(self._inflight)
+
+# 进程内唯一的合并器
+# The single process-wide coalescer
+_single_flight: Optional[SingleFlight] = None
+
+def get_single_flight() -> SingleFlight:
+    """
+    获取进程内共享的任务合并器
+    Get the process-wide shared job coalescer
+
+    返回:
+        SingleFlight: 共享合并器
+
+    Returns:
+        SingleFlight: Shared coalescer
+    """
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,486 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from .logger import default_logger
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时使用标准库json | Standard library json when orjson is not installed
+    orjson = None
+
+# 两次检查模板文件mtime之间的最小间隔（秒）
+# Minimum interval between two mtime checks of a template file (seconds)
+_MTIME_CHECK_INTERVAL = 1.0
+
+# 视为随机种子的输入名
+# Input names treated as random seeds
+SEED_INPUTS = ('seed', 'noise_seed')
+
+def dumps(value: Any) -> bytes:
+    """
+    紧凑序列化为UTF-8 JSON字节，安装了orjson时使用orjson
+    Serialize to compact UTF-8 JSON bytes, using orjson when installed
+
+    输出与 httpx 的 json= 参数一致（不转义非ASCII字符、不允许NaN）。
+    The output matches httpx's json= argument (non-ASCII kept as is, NaN not allowed).
+
+    参数:
+        value: 可序列化为JSON的对象
+
+    Args:
+        value: JSON-serializable object
+
+    返回:
+        bytes: JSON字节
+
+    Returns:
+        bytes: JSON bytes
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            # orjson不支持的值（如超过64位的整数）交给标准库 | Values orjson rejects (e.g. ints over 64 bits) go to the standard library
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+def copy_graph(value: Any) -> Any:
+    """
+    结构化复制JSON工作流（只复制dict/list，其余值共享）
+    Structurally copy a JSON workflow (only dicts/lists are copied, other values are shared)
+
+    比 copy.deepcopy 和 json.loads(json.dumps(...)) 都快得多。
+    Much faster than both copy.deepcopy and json.loads(json.dumps(...)).
+
+    参数:
+        value: 工作流或其子树
+
+    Args:
+        value: Workflow or one of its subtrees
+
+    返回:
+        复制后的对象
+
+    Returns:
+        The copied object
+    """
+    if isinstance(value, dict):
+        return {k: copy_graph(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_graph(v) for v in value]
+    return value
+
+def canonical_hash(graph: Dict[str, Any], include_seeds: bool = False) -> str:
+    """
+    计算填充后工作流的规范哈希（键排序、紧凑序列化）
+    Compute the canonical hash of a filled workflow (sorted keys, compact serialization)
+
+    参数:
+        graph: 工作流
+        include_seeds: 是否计入随机种子；仅当调用方固定了种子时才应计入
+
+    Args:
+        graph: Workflow
+        include_seeds: Whether seeds are part of the hash; only when the caller pinned them
+
+    返回:
+        str: sha256十六进制摘要
+
+    Returns:
+        str: sha256 hex digest
+    """
+    if not include_seeds:
+        graph = {
+            node_id: {
+                **node,
+                'inputs': {k: v for k, v in node.get('inputs', {}).items() if k not in SEED_INPUTS},
+            } if isinstance(node, dict) else node
+            for node_id, node in graph.items()
+        }
+    data = json.dumps(graph, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+# 工作流中的一个输入位置 (节点ID, 输入名)
+# An input position in a workflow: (node ID, input name)
+Slot = Tuple[str, str]
+
+def seed_slots(template: Dict[str, Any]) -> Tuple[Slot, ...]:
+    """
+    模板中所有随机种子输入的位置
+    Positions of every random seed input in a template
+    """
+    return tuple(
+        (node_id, name)
+        for node_id, node in template.items() if isinstance(node, dict)
+        for name in SEED_INPUTS if name in node.get('inputs', {})
+    )
+
+def _read_only(self, *args: Any, **kwargs: Any) -> None:
+    raise TypeError("共享的模板节点是只读的，请先复制节点再修改 | "
+                    "shared template nodes are read-only; copy the node before editing it")
+
+class _FrozenDict(dict):
+    # 注入计划共享的节点：任何修改都会报错，序列化结果与普通dict相同
+    # A node shared by an injection plan: every modification raises; serializes like a plain dict
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        # copy / deepcopy / pickle 得到普通dict | copy / deepcopy / pickle give a plain dict
+        return dict, (dict(self),)
+
+class _FrozenList(list):
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        return list, (list(self),)
+
+def _freeze(value: Any) -> Any:
+    # 递归复制为只读的dict/list | Recursively copy into read-only dicts/lists
+    if isinstance(value, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return _FrozenList(_freeze(v) for v in value)
+    return value
+
+class WorkflowGraph(dict):
+    """
+    由注入计划生成的工作流，记住生成它的计划，以便序列化时复用预编码的节点
+    Workflow built by an injection plan; remembers the plan so serialization can reuse the pre-encoded nodes
+    """
+
+    __slots__ = ('plan',)
+
+class InjectionPlan:
+    """
+    模板的参数注入计划：编译时记录参数和种子写入的 (节点, 输入) 位置，其余节点作为不可变子树
+    在所有请求间共享。生成请求体只复制这些位置所在的节点，开销与参数数量成正比，而不是与图的大小成正比。
+
+    Parameter injection plan of a template: compiled once with the (node, input) slots that parameters
+    and seeds are written to, while every other node is an immutable subtree shared between requests.
+    Building a request body copies only the nodes holding those slots, so it costs O(number of
+    parameters) rather than O(graph size).
+
+    build() 返回的工作流中，除注入位置所在节点外的节点都是共享的只读节点，修改会抛出 TypeError；
+    需要改动时先替换为副本（如 graph[node_id] = copy_graph(graph[node_id])）。
+    In workflows returned by build(), nodes other than those holding slots are shared and read-only, so
+    modifying them raises TypeError; replace such a node with a copy first (e.g.
+    graph[node_id] = copy_graph(graph[node_id])).
+    """
+
+    __slots__ = ('template', 'slots', 'seed_slots', 'shared', '_base', '_mutable', '_fragments')
+
+    def __init__(self, template: Dict[str, Any], slots: Iterable[Slot] = ()):
+        """
+        编译注入计划
+        Compile an injection plan
+
+        参数:
+            template: 共享的模板（TemplateRegistry.peek 的返回值）
+            slots: 参数写入的 (节点ID, 输入名) 位置
+
+        Args:
+            template: The shared template (as returned by TemplateRegistry.peek)
+            slots: (node ID, input name) slots the parameters are written to
+        """
+        self.template = template
+        self.slots = tuple(slots)
+        self.seed_slots = seed_slots(template)
+        mutable = {node_id for node_id, _ in self.slots + self.seed_slots}
+        missing = mutable - template.keys()
+        if missing:
+            raise KeyError(f"模板中不存在节点 | nodes not found in template: {sorted(missing)}")
+        self._mutable = tuple(sorted(mutable))
+        # 请求间共享的不可变子树；模板整体冻结为只读副本，预编码的片段因此始终与节点内容一致，
+        # build() 只为注入位置所在节点复制 inputs
+        # Immutable subtrees shared between requests; the whole template is frozen into a read-only copy so
+        # the pre-encoded fragments always match the node contents, and build() only copies the inputs of
+        # the nodes holding slots
+        self.shared = tuple(node_id for node_id in template if node_id not in mutable)
+        self._base = {node_id: _freeze(node) for node_id, node in template.items()}
+        # 共享节点预先编码的 "节点ID":{...} JSON片段 | Pre-encoded "node_id":{...} JSON fragments of the shared nodes
+        self._fragments = {node_id: dumps(node_id) + b':' + dumps(self._base[node_id]) for node_id in self.shared}
+
+    def build(self, values: Mapping[Slot, Any]) -> Dict[str, Any]:
+        """
+        生成单次请求的工作流：复制注入位置所在的节点并写入参数值，其余节点共享
+        Build the workflow of one request: copy the nodes holding slots and write the values, sharing the rest
+
+        参数:
+            values: (节点ID, 输入名) -> 值，须为编译时声明的位置
+
+        Args:
+            values: (node ID, input name) -> value, for slots declared at compile time
+
+        返回:
+            dict: 工作流；种子输入仍为模板中的值，由 apply_seeds() 填充
+
+        Returns:
+            dict: Workflow; seed inputs keep the template values until apply_seeds() fills them
+        """
+        graph = WorkflowGraph(self._base)
+        graph.plan = self
+        for node_id in self._mutable:
+            node = graph[node_id]
+            graph[node_id] = {**node, 'inputs': dict(node.get('inputs', {}))}
+        for (node_id, name), value in values.items():
+            graph[node_id]['inputs'][name] = value
+        return graph
+
+    def encode(self, graph: Dict[str, Any]) -> bytes:
+        """
+        序列化由本计划生成的工作流：共享节点直接拼接预编码的片段，只编码被复制或新增的节点
+        Serialize a workflow built by this plan: shared nodes splice in their pre-encoded fragments and
+        only copied or added nodes are encoded
+
+        参数:
+            graph: build() 返回的工作流（之后可增删节点）
+
+        Args:
+            graph: Workflow returned by build() (nodes may have been added or removed since)
+
+        返回:
+            bytes: JSON字节
+
+        Returns:
+            bytes: JSON bytes
+        """
+        base = self._base
+        fragments = self._fragments
+        parts = []
+        for node_id, node in graph.items():
+            fragment = fragments.get(node_id)
+            # 只读的共享节点内容不会变化；被替换的节点重新编码
+            # Read-only shared nodes cannot change; replaced nodes are encoded again
+            if fragment is None or node is not base.get(node_id):
+                fragment = dumps(node_id) + b':' + dumps(node)
+            parts.append(fragment)
+        return b'{' + b','.join(parts) + b'}'
+
+def encode_workflow(graph: Dict[str, Any]) -> bytes:
+    """
+    序列化工作流；由注入计划生成的工作流复用预编码的静态节点
+    Serialize a workflow; workflows built by an injection plan reuse the pre-encoded static nodes
+    """
+    if isinstance(graph, WorkflowGraph):
+        return graph.plan.encode(graph)
+    return dumps(graph)
+
+def encode_prompt_body(body: Dict[str, Any]) -> bytes:
+    """
+    序列化 /api/prompt 请求体，工作流部分按 encode_workflow() 拼接
+    Serialize an /api/prompt request body, splicing the workflow in via encode_workflow()
+
+    参数:
+        body: 请求体（client_id、prompt，可选extra_data）
+
+    Args:
+        body: Request body (client_id, prompt, optional extra_data)
+
+    返回:
+        bytes: JSON字节，与 json.dumps 的结果等价
+
+    Returns:
+        bytes: JSON bytes, equivalent to the json.dumps result
+    """
+    parts = []
+    for key, value in body.items():
+        encoded = encode_workflow(value) if key == 'prompt' else dumps(value)
+        parts.append(dumps(key) + b':' + encoded)
+    return b'{' + b','.join(parts) + b'}'
+
+class TemplateRegistry:
+    """
+    工作流模板注册表：每个 *_api.json 只解析一次并常驻内存，文件修改后（mtime变化）自动重新加载
+    Workflow template registry: each *_api.json is parsed once and kept in memory,
+    and reloaded automatically when the file changes (mtime)
+    """
+
+    def __init__(self, tools_dir: Optional[str] = None):
+        """
+        初始化模板注册表
+        Initialize the template registry
+
+        参数:
+            tools_dir: 模板所在目录，默认为 mcp_server/tools
+
+        Args:
+            tools_dir: Directory containing the templates, mcp_server/tools by default
+        """
+        self.tools_dir = tools_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools')
+        # api_name -> (mtime, 上次检查时间 | last check time, 模板 | template)
+        self._entries: Dict[str, Tuple[float, float, Dict[str, Any]]] = {}
+        # (api_name, 注入位置 | slots) -> 编译好的注入计划 | compiled injection plan
+        self._plans: Dict[Tuple[str, Tuple[Slot, ...]], InjectionPlan] = {}
+
+    def template_path(self, api_name: str) -> str:
+        """
+        获取模板文件路径
+        Get the template file path
+        """
+        return os.path.join(self.tools_dir, f'{api_name}_api.json')
+
+    def peek(self, api_name: str) -> Dict[str, Any]:
+        """
+        获取共享的模板对象（只读，调用方不得修改）
+        Get the shared template object (read-only, callers must not modify it)
+
+        参数:
+            api_name: API名称，如 txt2img
+
+        Args:
+            api_name: API name, e.g. txt2img
+
+        返回:
+            dict: 模板
+
+        Returns:
+            dict: Template
+        """
+        now = time.monotonic()
+        entry = self._entries.get(api_name)
+        if entry is not None and now - entry[1] < _MTIME_CHECK_INTERVAL:
+            return entry[2]
+        path = self.template_path(api_name)
+        mtime = os.stat(path).st_mtime
+        if entry is not None and entry[0] == mtime:
+            self._entries[api_name] = (mtime, now, entry[2])
+            return entry[2]
+        with open(path, 'r', encoding='utf-8') as f:
+            template = json.load(f)
+        if entry is not None:
+            default_logger.info(f"模板文件已修改，重新加载: {path}")
+        self._entries[api_name] = (mtime, now, template)
+        return template
+
+    def get(self, api_name: str) -> Dict[str, Any]:
+        """
+        获取模板的独立副本，可在单次请求中随意修改
+        Get an independent copy of the template that a single request may modify freely
+
+        参数:
+            api_name: API名称，如 txt2img
+
+        Args:
+            api_name: API name, e.g. txt2img
+
+        返回:
+            dict: 模板副本
+
+        Returns:
+            dict: Template copy
+        """
+        return copy_graph(self.peek(api_name))
+
+    def plan(self, api_name: str, slots: Iterable[Slot] = ()) -> InjectionPlan:
+        """
+        获取模板的注入计划；每组注入位置只编译一次，模板文件修改后自动重新编译
+        Get the injection plan of a template; each set of slots is compiled once and recompiled
+        automatically when the template file changes
+
+        参数:
+            api_name: API名称，如 txt2img
+            slots: 参数写入的 (节点ID, 输入名) 位置
+
+        Args:
+            api_name: API name, e.g. txt2img
+            slots: (node ID, input name) slots the parameters are written to
+
+        返回:
+            InjectionPlan: 注入计划
+
+        Returns:
+            InjectionPlan: Injection plan
+        """
+        template = self.peek(api_name)
+        key = (api_name, tuple(slots))
+        plan = self._plans.get(key)
+        if plan is None or plan.template is not template:
+            plan = self._plans[key] = InjectionPlan(template, key[1])
+        return plan
+
+    async def aplan(self, api_name: str, slots: Iterable[Slot] = ()) -> InjectionPlan:
+        """
+        plan() 的异步版本：检查窗口内且已编译时直接返回，否则在线程池中检查mtime并按需重新加载、编译，不阻塞事件循环
+        Async version of plan(): returns at once within the check window once compiled, otherwise checks the
+        mtime and reloads and recompiles as needed in the thread pool, without blocking the event loop
+
+        参数:
+            api_name: API名称，如 txt2img
+            slots: 参数写入的 (节点ID, 输入名) 位置
+
+        Args:
+            api_name: API name, e.g. txt2img
+            slots: (node ID, input name) slots the parameters are written to
+
+        返回:
+            InjectionPlan: 注入计划
+
+        Returns:
+            InjectionPlan: Injection plan
+        """
+        key = (api_name, tuple(slots))
+        entry = self._entries.get(api_name)
+        plan = self._plans.get(key)
+        if (entry is not None and time.monotonic() - entry[1] < _MTIME_CHECK_INTERVAL
+                and plan is not None and plan.template is entry[2]):
+            return plan
+        return await asyncio.to_thread(self.plan, api_name, key[1])
+
+    def api_names(self) -> List[str]:
+        """
+        模板目录中所有 *_api.json 对应的API名称
+        API names of every *_api.json in the template directory
+        """
+        return sorted(f[:-len('_api.json')] for f in os.listdir(self.tools_dir) if f.endswith('_api.json'))
+
+    def node_classes(self) -> Set[str]:
+        """
+        所有模板中用到的节点类（class_type）
+        Node classes (class_type) used by all templates
+        """
+        classes = set()
+        for api_name in self.api_names():
+            for node in self.peek(api_name).values():
+                if isinstance(node, dict) and node.get('class_type'):
+                    classes.add(node['class_type'])
+        return classes
+
+    def invalidate(self, api_name: Optional[str] = None) -> None:
+        """
+        清除缓存的模板，api_name为None时清除全部
+        Drop cached templates, all of them if api_name is None
+        """
+        if api_name is None:
+            self._entries.clear()
+            self._plans.clear()
+        else:
+            self._entries.pop(api_name, None)
+            for key in [key for key in self._plans if key[0] == api_name]:
+                del self._plans[key]
+
+# 进程内唯一的模板注册表
+# The single process-wide template registry
+_template_registry: Optional[TemplateRegistry] = None
+
+def get_template_registry() -> TemplateRegistry:
+    """
+    获取进程内共享的模板注册表
+    Get the process-wide shared template registry
+
+    返回:
+        TemplateRegistry: 共享模板注册表
+
+    Returns:
+        TemplateRegistry: Shared template registry
+    """
+    global _template_registry
+    if _template_registry is None:
+        _template_registry = TemplateRegistry()
+    return _template_registry
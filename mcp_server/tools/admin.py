@@ -0,0 +1,43 @@
+import json
+from mcp_server.logger_decorator import log_mcp_call
+from mcp_server.logger import default_logger
+from mcp_server.settings import reload_settings
+from mcp_server.admission import get_admission_controller
+from mcp_server.result_cache import get_result_cache
+from mcp_server.singleflight import get_single_flight
+
+def register_admin_tool(mcp):
+    @mcp.tool()
+    @log_mcp_call
+    async def reload_config() -> str:
+        """
+        管理工具：从磁盘重新加载 config.ini，后端列表、超时和日志级别等立即生效
+        Admin tool: reload config.ini from disk; backends, timeouts, log level etc. take effect immediately
+        Returns:
+            str 重新加载结果 | reload result
+        """
+        try:
+            settings = reload_settings()
+        except Exception as e:
+            default_logger.error(f"重新加载配置失败: {str(e)}")
+            return f"重新加载配置失败 | Failed to reload config: {str(e)}"
+        backends = ", ".join(b.url for b in settings.comfyui_server.backends)
+        return (
+            f"配置已重新加载 | Config reloaded: {settings.path}\n"
+            f"ComfyUI后端 | backends: {backends} ({settings.comfyui_server.routing})"
+        )
+
+    @mcp.tool()
+    @log_mcp_call
+    async def server_status() -> str:
+        """
+        管理工具：查看任务等待队列深度、等待时间、各ComfyUI后端的在途任务数和结果缓存统计
+        Admin tool: show the job wait queue depth, wait times, in-flight jobs of each ComfyUI backend and result cache stats
+        Returns:
+            str JSON格式的状态 | status as JSON
+        """
+        status = get_admission_controller().stats()
+        status['result_cache'] = get_result_cache().stats()
+        single_flight = get_single_flight()
+        status['coalescing'] = {'inflight': single_flight.inflight(), 'coalesced': single_flight.coalesced}
+        return json.dumps(status, ensure_ascii=False, indent=2)
@@ -0,0 +1,70 @@
+import os
+from typing import Any, Dict, List
+from mcp.server.fastmcp import Context
+from mcp_server.manifest import get_manifest, run_batch
+from mcp_server.logger_decorator import log_mcp_call
+from mcp_server.logger import default_logger
+
+def register_batch_tool(mcp):
+    @mcp.tool()
+    @log_mcp_call
+    async def batch_generate(
+        tool: str,
+        items: List[Dict[str, Any]],
+        save_dir: str | None = None,
+        ctx: Context = None,
+    ) -> str:
+        """
+        批量生成服务：一次调用提交多组参数给同一个生成工具（如20个不同prompt），任务同时提交并分散到各ComfyUI后端，
+        每完成一个就通过进度和日志通知推送，最后返回汇总结果。
+        Batch generation service: one call runs many argument sets through the same generation tool (e.g. 20 different
+        prompts). Jobs are submitted together and spread across the ComfyUI backends; each finished job is pushed as a
+        progress and log notification, and an aggregated result is returned at the end.
+
+        Args:
+            tool (str): Name of the generation tool, e.g. "txt2img", "txt2bg" or "img2img".
+            items (list[dict]): One dict of arguments per job, with the same names as the tool's own arguments,
+                e.g. [{"prompt": "a red fox"}, {"prompt": "a blue bird", "seed": 42}]. Omitted arguments use the tool's defaults.
+            save_dir (str | None): Optional. Absolute directory for items that do not set their own save_dir.
+                Images without a filename are named <tool>_<timestamp>_<index>. Not accepted by tools that
+                return image URLs (e.g. "img2img").
+
+        Returns:
+            str: One section per job in input order: its images in Markdown format and seed, or the error message.
+        """
+        manifest = get_manifest(tool)
+        if save_dir and manifest.output != 'files':
+            # 返回URL的工具不保存文件 | Tools returning URLs do not save files
+            raise ValueError(f"{tool} 返回图片URL，不接受 save_dir | {tool} returns image URLs and does not accept save_dir")
+        if save_dir:
+            # 批量的 save_dir 总是目录，先创建，避免被当作单个文件路径
+            # The batch save_dir is always a directory; create it first so it is not taken for a file path
+            os.makedirs(save_dir, exist_ok=True)
+            items = [{'save_dir': save_dir, **item} for item in items]
+        total = len(items)
+        done = 0
+        default_logger.info(f"接收到批量生成请求: {tool} x {total}")
+
+        async def on_result(index: int, ok: bool, text: str) -> None:
+            # 每完成一个任务就通知客户端，不必等待整批结束
+            # Notify the client as each job finishes instead of waiting for the whole batch
+            nonlocal done
+            done += 1
+            if ctx is None:
+                return
+            status = "完成 | done" if ok else "失败 | failed"
+            try:
+                await ctx.report_progress(done, total)
+                await ctx.log('info' if ok else 'error', f"[{index + 1}/{total}] {status}\n{text}")
+            except ValueError:
+                # 不在MCP请求中（如直接调用）时没有可通知的客户端 | No client to notify outside an MCP request
+                pass
+
+        results = await run_batch(manifest, items, on_result)
+        succeeded = sum(1 for ok, _ in results if ok)
+        default_logger.info(f"批量生成请求完成: {tool}, 成功 {succeeded}/{total}")
+        sections = [f"{tool}: {succeeded}/{total} 成功 | succeeded"]
+        for index, (ok, text) in enumerate(results):
+            header = f"[{index + 1}/{total}]" if ok else f"[{index + 1}/{total}] 失败 | failed:"
+            sections.append(f"{header}\n{text}")
+        return "\n\n".join(sections)
@@ -0,0 +1,124 @@
+import json
+import time
+from typing import Any, Dict
+from mcp.server.fastmcp import Context
+from mcp_server.jobs import SUCCEEDED, get_job_manager
+from mcp_server.manifest import manifest_tools
+from mcp_server.logger_decorator import log_mcp_call
+from mcp_server.logger import default_logger
+
+# 只有生成工具（清单工具和下列工具）可以作为异步任务提交；管理、查询、批量和任务工具不行
+# Only generation tools (the manifest tools plus these) can be submitted as jobs; admin, lookup, batch and job tools cannot
+EXTRA_JOB_TOOLS = ('imgedit',)
+
+def _format_time(timestamp: float) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+def _job_view(job: Dict[str, Any]) -> str:
+    # 返回给客户端的任务状态（不含参数和结果正文）| Job status returned to the client (without arguments and result body)
+    view = {
+        'job_id': job['job_id'],
+        'tool': job['tool'],
+        'status': job['status'],
+        'progress': round(job['progress'] or 0.0, 3),
+        'prompt_id': job['prompt_id'],
+        'backend': job['backend'],
+        'created_at': _format_time(job['created_at']),
+        'updated_at': _format_time(job['updated_at']),
+    }
+    if job['error']:
+        view['error'] = job['error']
+    return json.dumps(view, ensure_ascii=False, indent=2)
+
+def register_jobs_tool(mcp):
+    @mcp.tool()
+    @log_mcp_call
+    async def submit_job(tool: str, arguments: Dict[str, Any] | None = None) -> str:
+        """
+        异步任务服务：提交一次工具调用（如 txt2img）后立即返回 job_id，不必保持请求等待生成完成；
+        之后用 job_status 查询进度、job_result 获取结果、job_cancel 取消。任务记录在服务重启后仍然保留。
+        Async job service: submit one tool call (e.g. txt2img) and get a job_id back right away instead of holding the
+        request open until generation finishes; then use job_status for progress, job_result for the result and
+        job_cancel to cancel. Job records survive server restarts.
+
+        Args:
+            tool (str): Name of the generation tool to run: "txt2img", "txt2bg", "img2img", "imgedit" or another manifest tool.
+            arguments (dict | None): The tool's own arguments, e.g. {"prompt": "a red fox", "seed": 42}.
+
+        Returns:
+            str: The job_id and initial status as JSON.
+        """
+        if tool not in manifest_tools() and tool not in EXTRA_JOB_TOOLS:
+            raise ValueError(f"只有生成工具可以作为异步任务提交 | only generation tools can be submitted as jobs: {tool}")
+        if tool not in {t.name for t in await mcp.list_tools()}:
+            raise ValueError(f"未知工具 | unknown tool: {tool}")
+        arguments = arguments or {}
+
+        async def run() -> str:
+            contents = await mcp.call_tool(tool, arguments)
+            return "\n".join(content.text for content in contents if getattr(content, 'text', None))
+
+        manager = get_job_manager()
+        job_id = await manager.submit(tool, arguments, run)
+        return _job_view(await manager.status(job_id))
+
+    @mcp.tool()
+    @log_mcp_call
+    async def job_status(job_id: str) -> str:
+        """
+        查询异步任务的状态：queued（等待后端）、running（ComfyUI执行中）、succeeded、failed 或 cancelled，以及进度（0~1）
+        Query an async job's status: queued (waiting for a backend), running (executing on ComfyUI), succeeded, failed
+        or cancelled, plus its progress (0 to 1)
+
+        Args:
+            job_id (str): The job_id returned by submit_job.
+
+        Returns:
+            str: Job status as JSON, including the ComfyUI prompt_id and backend once submitted.
+        """
+        return _job_view(await get_job_manager().status(job_id))
+
+    @mcp.tool()
+    @log_mcp_call
+    async def job_result(job_id: str, wait: float = 0, ctx: Context = None) -> str:
+        """
+        获取异步任务的结果；可选等待任务完成，等待期间通过进度通知推送执行进度
+        Get an async job's result; optionally wait for it to finish, pushing execution progress as progress notifications meanwhile
+
+        Args:
+            job_id (str): The job_id returned by submit_job.
+            wait (float): Optional. Seconds to wait for the job to finish (capped by the server), 0 returns immediately.
+
+        Returns:
+            str: The tool's result (e.g. images in Markdown format) once succeeded, otherwise the job status as JSON.
+        """
+        async def on_progress(progress: float) -> None:
+            if ctx is None:
+                return
+            try:
+                await ctx.report_progress(progress, 1.0)
+            except ValueError:
+                # 不在MCP请求中（如直接调用）时没有可通知的客户端 | No client to notify outside an MCP request
+                pass
+
+        job = await get_job_manager().wait(job_id, wait, on_progress)
+        if job['status'] == SUCCEEDED:
+            return job['result'] or ""
+        return _job_view(job)
+
+    @mcp.tool()
+    @log_mcp_call
+    async def job_cancel(job_id: str) -> str:
+        """
+        取消异步任务：从ComfyUI队列中删除，或中断正在执行的工作流；已结束的任务不受影响
+        Cancel an async job: remove it from the ComfyUI queue or interrupt the running workflow; finished jobs are unaffected
+
+        Args:
+            job_id (str): The job_id returned by submit_job.
+
+        Returns:
+            str: Job status after cancellation as JSON.
+        """
+        job = await get_job_manager().cancel(job_id)
+        default_logger.info(f"任务取消请求完成: {job_id}, 状态: {job['status']}")
+        return _job_view(job)
@@ -4,9 +4,14 @@ import httpx
 import asyncio
 from mcp_server.logger_decorator import log_mcp_call
 from mcp_server.logger import default_logger
-from mcp_server.utils import load_object_info, load_config
+from mcp_server.utils import load_config
+from mcp_server.object_info import combo_options, get_object_info_store, require_node_classes
 
 def register_resource_info_tool(mcp):
+    # per_node 模式下预先获取资源接口用到的节点类
+    # Prefetch the node classes used by the resource endpoints in per_node mode
+    require_node_classes("CheckpointLoaderSimple")
+
     @mcp.resource("info://ckpt")
     @log_mcp_call
     async def get_checkpoint_list() -> str:
@@ -18,36 +23,21 @@ def register_resource_info_tool(mcp):
             str 格式化的模型清单 | Formatted checkpoint list
         """
         try:
-            # 加载节点描述信息
-            # Load node description information
-            object_info = load_object_info(default_logger)
+            # 节点描述只解析一次，之后直接查询内存中的索引
+            # Node descriptions are parsed once; later reads query the in-memory index
+            index = await get_object_info_store().ensure(["CheckpointLoaderSimple"])
             
-            if not object_info:
+            if not len(index):
                 return "无法加载ComfyUI节点描述信息，请确保MCP服务已成功从ComfyUI获取节点描述信息。"
             
             # 获取CheckpointLoaderSimple节点的ckpt_name选项
             # Get ckpt_name options from CheckpointLoaderSimple node
-            if "CheckpointLoaderSimple" not in object_info:
+            if "CheckpointLoaderSimple" not in index:
                 return "未找到CheckpointLoaderSimple节点，无法获取模型清单。"
             
-            node_info = object_info["CheckpointLoaderSimple"]
-            
-            # 检查input和required字段
-            if "input" not in node_info:
-                return "CheckpointLoaderSimple节点中未找到input字段。"
-                
-            input_info = node_info["input"]
-            
-            if "required" not in input_info:
-                return "CheckpointLoaderSimple节点中未找到required字段。"
-                
-            required_info = input_info["required"]
-            
-            if "ckpt_name" not in required_info:
+            ckpt_info = index.input_spec("CheckpointLoaderSimple", "ckpt_name")
+            if ckpt_info is None:
                 return "CheckpointLoaderSimple节点中未找到ckpt_name字段。"
-                
-            # 获取模型列表和描述
-            ckpt_info = required_info["ckpt_name"]
             
             # 获取tooltip描述
             tooltip = "无描述"
@@ -58,10 +48,7 @@ def register_resource_info_tool(mcp):
                     tooltip = tooltip_obj["tooltip"]
             
             # 获取模型列表
-            model_list = []
-            if isinstance(ckpt_info, list) and len(ckpt_info) > 0 and isinstance(ckpt_info[0], list):
-                # 数组的第一个元素通常包含模型列表
-                model_list = ckpt_info[0]
+            model_list = combo_options(ckpt_info) or []
             
             # 格式化输出
             # Format output
@@ -85,7 +72,7 @@ def register_resource_info_tool(mcp):
     @mcp.resource("info://all")
     async def get_all_object_info() -> dict:
         """
-        返回完整的ComfyUI节点描述信息（object_info.json）
-        Return the full ComfyUI node description info (object_info.json)
+        返回ComfyUI节点描述信息（object_info.json）；per_node 模式下只包含已获取的节点类
+        Return the ComfyUI node description info (object_info.json); in per_node mode only the classes fetched so far
         """
-        return load_object_info(default_logger) 
\ No newline at end of file
+        return (await get_object_info_store().load()).nodes
\ No newline at end of file
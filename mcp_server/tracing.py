@@ -0,0 +1,317 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from .settings import TracingSettings, get_settings
+from .logger import default_logger
+
+# OTLP 中的 span 类型与状态码
+# Span kinds and status codes as defined by OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+# 缓冲的span达到该数量时立即导出
+# Export right away once this many spans are buffered
+_EXPORT_BATCH_SIZE = 512
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    # 按 OTLP/JSON 编码属性值 | Encode an attribute value as OTLP/JSON
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class Span:
+    """
+    一个计时区间，结束后按 OpenTelemetry (OTLP/JSON) 的格式导出
+    A timed operation, exported in the OpenTelemetry (OTLP/JSON) format once it ends
+    """
+
+    __slots__ = ('_tracer', 'name', 'kind', 'trace_id', 'span_id', 'parent_span_id',
+                 'start_ns', 'end_ns', 'attributes', 'status_code', 'status_message')
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], kind: int,
+                 attributes: Optional[Dict[str, Any]], start_ns: Optional[int]):
+        self._tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent is not None else ''
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes) if attributes else {}
+        self.status_code = 0
+        self.status_message = ''
+
+    @property
+    def is_recording(self) -> bool:
+        return self.end_ns is None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """设置属性 | Set an attribute"""
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_exception(self, error: BaseException) -> None:
+        """
+        标记为失败并记录异常
+        Mark the span as failed and record the exception
+        """
+        self.status_code = _STATUS_ERROR
+        self.status_message = str(error)
+        self.attributes['exception.type'] = type(error).__name__
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        """
+        结束span并交给导出器；重复调用无效
+        End the span and hand it to the exporter; calling it again has no effect
+        """
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        self._tracer._on_end(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': k, 'value': _attribute_value(v)} for k, v in self.attributes.items()],
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        if self.status_code:
+            span['status'] = {'code': self.status_code, 'message': self.status_message}
+        return span
+
+class _NoopSpan:
+    """
+    关闭跟踪时使用的空span
+    Empty span used while tracing is disabled
+    """
+
+    is_recording = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+# 当前上下文中的活动span，新span默认以它为父span
+# Active span of the current context; new spans use it as their parent by default
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('mcp_span', default=None)
+
+class Tracer:
+    """
+    轻量的跟踪器：在进程内生成与 OpenTelemetry 兼容的span，批量导出到本地文件（每行一个
+    OTLP/JSON 请求）或 OTLP/HTTP 收集器，不依赖 opentelemetry SDK。
+
+    Lightweight tracer: produces OpenTelemetry-compatible spans in process and exports them in
+    batches to a local file (one OTLP/JSON request per line) or an OTLP/HTTP collector, without
+    depending on the opentelemetry SDK.
+    """
+
+    def __init__(self):
+        self._buffer: List[Span] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    @property
+    def settings(self) -> TracingSettings:
+        """
+        当前 [tracing] 配置（重新加载后立即生效）
+        Current [tracing] settings (take effect right after a reload)
+        """
+        return get_settings().tracing
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.enabled
+
+    def current_span(self) -> Optional[Span]:
+        """
+        当前上下文中的活动span
+        Active span of the current context
+        """
+        return _current_span.get()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, attributes: Optional[Dict[str, Any]] = None,
+                   start_ns: Optional[int] = None, kind: int = SPAN_KIND_INTERNAL):
+        """
+        开始一个span，调用方负责调用 end()；不会改变当前上下文的活动span
+        Start a span the caller must end(); the active span of the current context is left unchanged
+
+        参数:
+            name: span名称
+            parent: 父span，为None时使用当前上下文中的活动span
+            attributes: 初始属性
+            start_ns: 开始时间（纳秒时间戳），为None时取当前时间
+            kind: span类型
+
+        Args:
+            name: Span name
+            parent: Parent span, the active span of the current context if None
+            attributes: Initial attributes
+            start_ns: Start time (ns timestamp), now if None
+            kind: Span kind
+
+        返回:
+            Span: 新span；关闭跟踪时为空span
+
+        Returns:
+            Span: The new span; an empty span while tracing is disabled
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, parent if parent is not None else _current_span.get(), kind, attributes, start_ns)
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+             kind: int = SPAN_KIND_INTERNAL) -> Iterator[Any]:
+        """
+        在上下文中记录一个span，期间它是活动span；异常会被记录到span上
+        Record a span around the block, active meanwhile; exceptions are recorded on the span
+
+        参数:
+            name: span名称
+            attributes: 初始属性
+            kind: span类型
+
+        Args:
+            name: Span name
+            attributes: Initial attributes
+            kind: Span kind
+        """
+        span = self.start_span(name, attributes=attributes, kind=kind)
+        if span is _NOOP_SPAN:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _on_end(self, span: Span) -> None:
+        if len(self._buffer) >= self.settings.max_queue_size:
+            self.dropped += 1
+            return
+        self._buffer.append(span)
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+            except RuntimeError:
+                # 不在事件循环中时留到下次导出 | Outside an event loop, leave it for the next export
+                pass
+
+    async def _flush_later(self) -> None:
+        deadline = time.monotonic() + self.settings.export_interval
+        while self._buffer and len(self._buffer) < _EXPORT_BATCH_SIZE and time.monotonic() < deadline:
+            await asyncio.sleep(min(0.5, self.settings.export_interval))
+        await self.flush()
+
+    def _otlp_request(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [
+                    {'key': 'service.name', 'value': {'stringValue': self.settings.service_name}},
+                ]},
+                'scopeSpans': [{
+                    'scope': {'name': 'mcp_server'},
+                    'spans': [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+
+    def _write_file(self, line: str) -> None:
+        path = self.settings.file_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    async def flush(self) -> None:
+        """
+        立即导出所有缓冲的span
+        Export all buffered spans right away
+        """
+        while self._buffer:
+            spans, self._buffer = self._buffer[:_EXPORT_BATCH_SIZE], self._buffer[_EXPORT_BATCH_SIZE:]
+            payload = self._otlp_request(spans)
+            try:
+                if self.settings.exporter == 'otlp':
+                    from .comfyui_client import get_comfyui_client
+                    resp = await get_comfyui_client().client.post(
+                        f"{self.settings.otlp_endpoint}/v1/traces", json=payload, timeout=10.0
+                    )
+                    resp.raise_for_status()
+                else:
+                    line = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+                    await asyncio.to_thread(self._write_file, line)
+            except Exception as e:
+                default_logger.warning(f"导出跟踪数据失败，丢弃 {len(spans)} 个span: {str(e)}")
+
+    async def aclose(self) -> None:
+        """
+        停止后台导出任务并导出剩余的span
+        Stop the background export task and export the remaining spans
+        """
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+
+# 进程内唯一的跟踪器
+# The single process-wide tracer
+_tracer: Optional[Tracer] = None
+
+def get_tracer() -> Tracer:
+    """
+    获取进程内共享的跟踪器
+    Get the process-wide shared tracer
+
+    返回:
+        Tracer: 共享跟踪器
+
+    Returns:
+        Tracer: Shared tracer
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+async def close_tracer() -> None:
+    """
+    导出剩余的span（服务退出时调用）
+    Export the remaining spans (called on server shutdown)
+    """
+    global _tracer
+    if _tracer is not None:
+        await _tracer.aclose()
+        _tracer = None
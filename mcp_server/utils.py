@@ -1,25 +1,11 @@
 import json
-import configparser
+import dataclasses
 import os
 import random
 import logging
 import httpx
 import asyncio
-
-def _get_config_parser():
-    """
-    获取配置解析器
-    Get config parser
-    
-    返回:
-        configparser.ConfigParser: 配置解析器
-    
-    Returns:
-        configparser.ConfigParser: Config parser
-    """
-    config = configparser.ConfigParser()
-    config.read(os.path.join(os.path.dirname(__file__), 'config.ini'), encoding='utf-8')
-    return config
+from .settings import get_settings
 
 def load_comfyui_server_info():
     """
@@ -32,10 +18,8 @@ def load_comfyui_server_info():
     Returns:
         tuple: (host, port)
     """
-    config = _get_config_parser()
-    host = config.get('comfyui_server', 'host', fallback='127.0.0.1')
-    port = config.get('comfyui_server', 'port', fallback='8188')
-    return host, port
+    server = get_settings().comfyui_server
+    return server.host, server.port
 
 def load_config():
     """
@@ -48,8 +32,7 @@ def load_config():
     Returns:
         str: Complete ComfyUI server URL
     """
-    host, port = load_comfyui_server_info()
-    return f"http://{host}:{port}"
+    return get_settings().comfyui_server.url
 
 def load_uvicorn_config():
     """
@@ -62,11 +45,8 @@ def load_uvicorn_config():
     Returns:
         tuple: (host, port, transport)
     """
-    config = _get_config_parser()
-    uvicorn_host = config.get('mcp_server', 'host', fallback='0.0.0.0')
-    uvicorn_port = config.getint('mcp_server', 'port', fallback=9000)
-    transport = config.get('mcp_server', 'transport', fallback='sse')
-    return uvicorn_host, uvicorn_port, transport
+    server = get_settings().mcp_server
+    return server.host, server.port, server.transport
 
 def load_logging_config():
     """
@@ -79,48 +59,7 @@ def load_logging_config():
     Returns:
         dict logging configuration
     """
-    config = _get_config_parser()
-    
-    # 获取日志级别
-    # Get log level
-    level_str = config.get('logging', 'level', fallback='INFO').upper()
-    level_map = {
-        'DEBUG': logging.DEBUG,
-        'INFO': logging.INFO,
-        'WARNING': logging.WARNING,
-        'ERROR': logging.ERROR,
-        'CRITICAL': logging.CRITICAL
-    }
-    level = level_map.get(level_str, logging.INFO)
-    
-    # 获取控制台输出设置
-    # Get console output setting
-    console_output = config.getboolean('logging', 'console_output', fallback=True)
-    
-    # 获取日志文件路径
-    # Get log file path
-    log_path = config.get('logging', 'log_path', fallback='logs/mcp_server.log')
-    
-    # 如果路径是相对路径，则转换为绝对路径
-    # If path is relative, convert to absolute path
-    if not os.path.isabs(log_path):
-        log_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), log_path)
-    
-    # 获取日志文件大小限制
-    # Get log file size limit
-    max_file_size = config.getint('logging', 'max_file_size', fallback=10*1024*1024)  # 默认10MB
-    
-    # 获取备份文件数量
-    # Get backup count
-    backup_count = config.getint('logging', 'backup_count', fallback=5)
-    
-    return {
-        'level': level,
-        'console_output': console_output,
-        'log_path': log_path,
-        'max_file_size': max_file_size,
-        'backup_count': backup_count
-    }
+    return dataclasses.asdict(get_settings().logging)
 
 async def fetch_and_save_object_info(logger=None):
     """
@@ -139,52 +78,40 @@ async def fetch_and_save_object_info(logger=None):
     Returns:
         bool: Whether successfully fetched and saved
     """
+    from .object_info import get_object_info_store
     try:
-        # 获取ComfyUI服务器信息
-        # Get ComfyUI server information
-        host, port = load_comfyui_server_info()
-        comfyui_url = f"http://{host}:{port}"
-        
-        # 构建目标文件名
-        # Build target filename
-        object_info_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'object_info')
-        os.makedirs(object_info_dir, exist_ok=True)
-        
-        object_info_filename = f"{host}_{port}_object_info.json"
-        object_info_path = os.path.join(object_info_dir, object_info_filename)
+        store = get_object_info_store()
+        comfyui_url = load_config()
         
         # 检查文件是否已存在
         # Check if the file already exists
-        if os.path.exists(object_info_path):
+        if store.exists():
             if logger:
-                logger.info(f"ComfyUI节点描述文件已存在: {object_info_path}")
+                logger.info(f"ComfyUI节点描述文件已存在: {store.json_path}")
             return True
         
         # 从ComfyUI API获取节点描述信息
         # Get node description information from ComfyUI API
-        object_info_url = f"{comfyui_url}/api/object_info"
         if logger:
-            logger.info(f"正在从ComfyUI服务器获取节点描述信息: {object_info_url}")
+            logger.info(f"正在从ComfyUI服务器获取节点描述信息: {comfyui_url}")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(object_info_url, timeout=30.0)
-            
-            if response.status_code != 200:
-                if logger:
-                    logger.error(f"获取ComfyUI节点描述信息失败，状态码: {response.status_code}")
-                return False
-            
-            object_info = response.json()
-            
-            # 保存到文件
-            # Save to file
-            with open(object_info_path, 'w', encoding='utf-8') as f:
-                json.dump(object_info, f, ensure_ascii=False, indent=2)
-            
+        # 按 [object_info] fetch_mode 获取完整描述或只获取用到的节点类（使用共享连接池）
+        # Fetch the full descriptions or only the classes in use, per [object_info] fetch_mode (on the shared pool)
+        try:
+            object_info = await store.fetch()
+        except httpx.HTTPStatusError as e:
             if logger:
-                logger.info(f"已成功获取并保存ComfyUI节点描述信息: {object_info_path}")
-            
-            return True
+                logger.error(f"获取ComfyUI节点描述信息失败，状态码: {e.response.status_code}")
+            return False
+        
+        # 保存到文件（紧凑格式）并更新内存索引
+        # Save to file (compact format) and update the in-memory index
+        await asyncio.to_thread(store.save, object_info)
+        
+        if logger:
+            logger.info(f"已成功获取并保存ComfyUI节点描述信息: {len(object_info)} 个节点类")
+        
+        return True
     
     except Exception as e:
         if logger:
@@ -193,14 +120,15 @@ async def fetch_and_save_object_info(logger=None):
 
 def load_object_info(logger=None):
     """
-    加载ComfyUI节点描述信息
-    Load ComfyUI node description information
+    获取ComfyUI节点描述信息（文件由启动任务在工作线程中解析一次，之前为空字典；异步代码应使用 ObjectInfoStore.load()）
+    Get ComfyUI node description information (the file is parsed once by the startup job in a worker thread,
+    empty before that; async code should use ObjectInfoStore.load())
     
     参数:
-        logger: 日志记录器，如果为None则不记录日志
+        logger: 保留以兼容旧调用，日志由节点描述存储记录
     
     Args:
-        logger: Logger, if None, no logs will be recorded
+        logger: Kept for compatibility with existing callers, logging is done by the store
     
     返回:
         dict: 节点描述信息，如果加载失败则返回空字典
@@ -208,54 +136,93 @@ def load_object_info(logger=None):
     Returns:
         dict: Node description information, empty dict if loading fails
     """
-    try:
-        # 获取ComfyUI服务器信息
-        # Get ComfyUI server information
-        host, port = load_comfyui_server_info()
-        
-        # 构建目标文件名
-        # Build target filename
-        object_info_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'object_info')
-        object_info_filename = f"{host}_{port}_object_info.json"
-        object_info_path = os.path.join(object_info_dir, object_info_filename)
-        
-        # 检查文件是否存在
-        # Check if the file exists
-        if not os.path.exists(object_info_path):
-            if logger:
-                logger.warning(f"ComfyUI节点描述文件不存在: {object_info_path}")
-            return {}
-        
-        # 加载节点描述信息
-        # Load node description information
-        with open(object_info_path, 'r', encoding='utf-8') as f:
-            object_info = json.load(f)
-        
-        if logger:
-            logger.debug(f"已加载ComfyUI节点描述信息: {object_info_path}")
-        
-        return object_info
-    
-    except Exception as e:
-        if logger:
-            logger.error(f"加载ComfyUI节点描述信息时出错: {str(e)}")
-        return {}
+    from .object_info import get_object_info_store
+    return get_object_info_store().index.nodes
 
 def load_prompt_template(api_name):
-    # 加载指定API的prompt模板（JSON格式）
-    # Load the prompt template (JSON) for the specified API
-    with open(os.path.join(os.path.dirname(__file__), 'tools', f'{api_name}_api.json'), 'r', encoding='utf-8') as f:
-        return json.load(f)
+    # 从模板注册表获取指定API的prompt模板副本（文件只解析一次，修改后自动重新加载）
+    # Get a copy of the prompt template for the specified API from the template registry
+    # (the file is parsed once and reloaded automatically when modified)
+    from .templates import get_template_registry
+    return get_template_registry().get(api_name)
+
+# ComfyUI种子输入的取值范围 | Valid range of ComfyUI seed inputs
+SEED_MAX = 0xffffffffffffffff
+
+def _seed_nodes(prompt_template, seed_slots=None):
+    # 有预先编译的种子位置时直接使用，否则遍历所有节点
+    # Use the precompiled seed slots when given, otherwise scan every node
+    if seed_slots is None:
+        from .templates import seed_slots as find_seed_slots
+        seed_slots = find_seed_slots(prompt_template)
+    for node_id, name in seed_slots:
+        yield node_id, prompt_template[node_id]["inputs"], name
+
+def randomize_all_seeds(prompt_template, seed_slots=None):
+    # 随机化所有seed/noise_seed字段（未给出种子位置时遍历所有节点）
+    # Randomize all seed/noise_seed fields (scanning every node when no seed slots are given)
+    for node_id, inputs, name in _seed_nodes(prompt_template, seed_slots):
+        # 生成15位随机数
+        # Generate a 15-digit random number
+        inputs[name] = random.randint(10**14, 10**15 - 1)
+
+def is_seed_pinned(seed=None):
+    """
+    种子是否可复现（调用方指定或策略不是random），决定能否使用结果缓存
+    Whether seeds are reproducible (caller-given or a non-random policy); decides whether the result cache applies
+    """
+    return seed is not None or get_settings().generation.seed_policy != 'random'
 
-def randomize_all_seeds(prompt_template):
-    # 遍历所有节点，递归随机化所有seed字段
-    # Traverse all nodes and recursively randomize all seed fields
-    for node in prompt_template.values():
-        inputs = node.get("inputs", {})
-        if "seed" in inputs:
-            # 生成15位随机数
-            # Generate a 15-digit random number
-            inputs["seed"] = random.randint(10**14, 10**15 - 1)
+def apply_seeds(prompt_template, seed=None, seed_slots=None):
+    """
+    按调用方指定的seed或 [generation] seed_policy 填充所有种子输入；需在其余参数填充后调用
+    Fill every seed input from the caller's seed or the [generation] seed_policy; call after all other parameters are set
+    
+    参数:
+        prompt_template: 工作流
+        seed: 调用方指定的种子，为None时按 seed_policy 决定
+        seed_slots: 注入计划中编译好的种子位置，为None时遍历所有节点查找
+    
+    Args:
+        prompt_template: Workflow
+        seed: Caller-given seed, decided by seed_policy if None
+        seed_slots: Seed slots compiled into an injection plan; every node is scanned if None
+    
+    返回:
+        dict: 节点ID -> 实际使用的种子
+    
+    Returns:
+        dict: node ID -> seed actually used
+    """
+    if seed is not None:
+        seed = int(seed)
+        if not 0 <= seed <= SEED_MAX:
+            raise ValueError(f"seed必须在0到{SEED_MAX}之间 | seed must be between 0 and {SEED_MAX}")
+    else:
+        generation = get_settings().generation
+        if generation.seed_policy == 'fixed':
+            seed = generation.fixed_seed
+        elif generation.seed_policy == 'prompt_hash':
+            from .templates import canonical_hash
+            seed = 10**14 + int(canonical_hash(prompt_template), 16) % (9 * 10**14)
+        else:
+            randomize_all_seeds(prompt_template, seed_slots)
+    seeds = {}
+    for node_id, inputs, name in _seed_nodes(prompt_template, seed_slots):
+        if seed is not None:
+            inputs[name] = seed
+        seeds[node_id] = inputs[name]
+    return seeds
+
+def format_seeds(seeds):
+    """
+    把实际使用的种子格式化为工具结果中的一行，便于之后用相同seed复现
+    Format the seeds actually used as a line of the tool result, so a later call can reproduce them
+    """
+    values = sorted(set(seeds.values()))
+    if len(values) == 1:
+        return f"seed: {values[0]}"
+    return "seeds: " + ", ".join(f"{node_id}={value}" for node_id, value in seeds.items())
 
 async def init_mcp(logger=None):
     """
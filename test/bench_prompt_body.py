@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import timeit
+
+# 将项目根目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from mcp_server import templates
+from mcp_server.templates import copy_graph, encode_prompt_body, get_template_registry
+from mcp_server.utils import apply_seeds
+
+# 测试的工作流和每次请求写入的参数 | Workflow under test and the parameters written per request
+API_NAME = 'txt2bg'
+PARAMS = {
+    ('76', 'prompt1'): 'a quiet mountain lake at dawn, mist, pine trees',
+    ('77', 'width'): 768,
+    ('77', 'height'): 512,
+    ('77', 'batch_size'): 1,
+}
+CLIENT_ID = '00000000-0000-0000-0000-000000000000'
+ROUNDS = 20000
+
+def current_path():
+    # 复制整个模板、写入参数、遍历节点填充种子，再由httpx序列化整个请求体
+    # Copy the whole template, write parameters, scan nodes for seeds, then let httpx serialize the whole body
+    graph = copy_graph(get_template_registry().peek(API_NAME))
+    for (node_id, name), value in PARAMS.items():
+        graph[node_id]['inputs'][name] = value
+    apply_seeds(graph)
+    body = {'client_id': CLIENT_ID, 'prompt': graph}
+    return httpx.Request('POST', 'http://127.0.0.1:8188/api/prompt', json=body).content
+
+def fast_path():
+    # 注入计划只复制参数所在节点，静态节点拼接预编码的JSON片段
+    # The injection plan copies only the parameter nodes, static nodes splice in pre-encoded JSON fragments
+    plan = get_template_registry().plan(API_NAME, tuple(PARAMS))
+    graph = plan.build(PARAMS)
+    apply_seeds(graph, None, plan.seed_slots)
+    body = {'client_id': CLIENT_ID, 'prompt': graph}
+    return httpx.Request('POST', 'http://127.0.0.1:8188/api/prompt', content=encode_prompt_body(body),
+                         headers={'Content-Type': 'application/json'}).content
+
+def strip_seeds(body):
+    # 种子是随机的，比较前去掉 | Seeds are random, drop them before comparing
+    for node in body['prompt'].values():
+        for name in templates.SEED_INPUTS:
+            node.get('inputs', {}).pop(name, None)
+    return body
+
+def run(label, func):
+    seconds = timeit.timeit(func, number=ROUNDS)
+    print(f"{label:<32} {seconds / ROUNDS * 1e6:8.1f} us/请求 | us/request, {len(func())} bytes")
+    return seconds
+
+def main():
+    print(f"工作流 | workflow: {get_template_registry().template_path(API_NAME)}, {ROUNDS} 次 | rounds")
+    assert strip_seeds(json.loads(current_path())) == strip_seeds(json.loads(fast_path())), "请求体不一致 | bodies differ"
+
+    orjson = templates.orjson
+    baseline = run('current (copy + json=)', current_path)
+    templates.orjson = None
+    get_template_registry().invalidate(API_NAME)
+    fast_json = run('plan + fragments (json)', fast_path)
+    print(f"  加速 | speedup: {baseline / fast_json:.1f}x")
+    if orjson is not None:
+        templates.orjson = orjson
+        get_template_registry().invalidate(API_NAME)
+        fast_orjson = run('plan + fragments (orjson)', fast_path)
+        print(f"  加速 | speedup: {baseline / fast_orjson:.1f}x")
+    else:
+        print("未安装orjson，跳过 | orjson not installed, skipped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import asyncio
+import configparser
+import json
+import os
+import sys
+import tempfile
+import uuid
+from typing import Any, Dict, Optional
+
+import httpx
+import pytest
+
+# 将项目根目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import settings as settings_module
+
+# 手动运行的脚本（python test/xxx.py），不由pytest收集 | Scripts run by hand (python test/xxx.py), not collected by pytest
+collect_ignore = ['test_object_info.py', 'test_resource_info.py']
+
+# 测试用ComfyUI地址，请求由 FakeComfyUI 在进程内应答 | Test ComfyUI address, answered in-process by FakeComfyUI
+COMFYUI_URL = 'http://127.0.0.1:8188'
+
+def write_config(directory: str, overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    以仓库的 config.ini 为基础写一份测试配置：所有文件都落在 directory 下，完成跟踪只用轮询
+    Write a test configuration based on the repo's config.ini: every file lives under directory and
+    completion tracking only polls
+    """
+    config = configparser.ConfigParser()
+    config.read(settings_module.CONFIG_PATH, encoding='utf-8')
+    values = {
+        'comfyui_server': {'host': '127.0.0.1', 'port': '8188', 'backends': '', 'health_check_interval': '3600'},
+        'completion': {'use_websocket': 'false', 'poll_min_interval': '0.01', 'poll_max_interval': '0.05'},
+        'result_cache': {'cache_dir': os.path.join(directory, 'cache')},
+        'jobs': {'db_path': os.path.join(directory, 'jobs', 'jobs.db')},
+        'object_info': {'refresh_interval': '0'},
+        'metrics': {'enabled': 'false'},
+        'tracing': {'enabled': 'false'},
+        'logging': {'log_path': os.path.join(directory, 'logs', 'mcp_server.log'), 'async_mode': 'false',
+                    'console_output': 'false'},
+    }
+    for section, options in (overrides or {}).items():
+        values.setdefault(section, {}).update(options)
+    for section, options in values.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for name, value in options.items():
+            config.set(section, name, str(value))
+    path = os.path.join(directory, 'config.ini')
+    with open(path, 'w', encoding='utf-8') as f:
+        config.write(f)
+    return path
+
+# 在任何模块创建日志记录器之前换成测试配置，日志不写入仓库的 logs/ 目录
+# Switch to a test configuration before any module creates the logger, so logs stay out of the repo's logs/
+settings_module._settings = settings_module.load_settings(write_config(tempfile.mkdtemp(prefix='mcp-test-')))
+
+class FakeComfyUI:
+    """
+    进程内的假ComfyUI服务器（httpx.MockTransport），提交的任务立即完成并输出一张图片
+    In-process fake ComfyUI server (httpx.MockTransport); submitted jobs finish at once with one output image
+    """
+
+    def __init__(self):
+        # prompt_id -> 提交的工作流 | prompt_id -> submitted workflow
+        self.prompts: Dict[str, Dict[str, Any]] = {}
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.object_info: Dict[str, Any] = {}
+        self.requests = []
+        self.cancelled = []
+
+    def complete(self, prompt_id: str) -> None:
+        self.history[prompt_id] = {
+            'status': {'status_str': 'success', 'completed': True},
+            'outputs': {'9': {'images': [{'filename': f'{prompt_id}_0.png', 'subfolder': '', 'type': 'output'}]}},
+        }
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.requests.append((request.method, path))
+        if path == '/api/prompt':
+            prompt_id = str(uuid.uuid4())
+            self.prompts[prompt_id] = json.loads(request.content)['prompt']
+            self.complete(prompt_id)
+            return httpx.Response(200, json={'prompt_id': prompt_id, 'number': len(self.prompts)})
+        if path.startswith('/api/history/'):
+            prompt_id = path.rsplit('/', 1)[1]
+            entry = self.history.get(prompt_id)
+            return httpx.Response(200, json={prompt_id: entry} if entry else {})
+        if path == '/api/view':
+            return httpx.Response(200, content=request.url.params['filename'].encode())
+        if path == '/api/queue':
+            if request.method == 'POST':
+                self.cancelled.extend(json.loads(request.content).get('delete', []))
+                return httpx.Response(200, json={})
+            return httpx.Response(200, json={'queue_running': [], 'queue_pending': []})
+        if path in ('/api/interrupt', '/system_stats'):
+            return httpx.Response(200, json={})
+        if path == '/api/object_info':
+            return httpx.Response(200, json=self.object_info)
+        if path.startswith('/api/object_info/'):
+            class_name = path.rsplit('/', 1)[1]
+            if class_name not in self.object_info:
+                return httpx.Response(404, json={})
+            return httpx.Response(200, json={class_name: self.object_info[class_name]})
+        return httpx.Response(404)
+
+def _reset_singletons() -> None:
+    from mcp_server import (admission, backends, comfyui_client, completion, downloader, jobs, manifest,
+                            object_info, result_cache, singleflight, templates)
+    admission._admission_controller = None
+    backends._backend_pool = None
+    comfyui_client._comfyui_client = None
+    completion._completion_tracker = None
+    downloader._global_semaphore = None
+    jobs._job_manager = None
+    object_info._object_info_store = None
+    result_cache._result_cache = None
+    singleflight._single_flight = None
+    templates._template_registry = None
+    manifest._manifests.clear()
+
+def _install(fake: FakeComfyUI) -> None:
+    from mcp_server.comfyui_client import get_comfyui_client
+    get_comfyui_client()._client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+
+class _TestEnvironment:
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.fake: Optional[FakeComfyUI] = None
+
+    def configure(self, **overrides: Dict[str, Any]) -> settings_module.Settings:
+        settings_module._settings = settings_module.load_settings(write_config(str(self.tmp_path), overrides))
+        _reset_singletons()
+        if self.fake is not None:
+            _install(self.fake)
+        return settings_module._settings
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """
+    每个测试使用独立目录下的配置；configure(节={选项: 值}) 覆盖选项并重新加载
+    Each test gets settings under its own directory; configure(section={option: value}) overrides options and reloads
+    """
+    from mcp_server import object_info
+    monkeypatch.setattr(object_info, 'OBJECT_INFO_DIR', str(tmp_path / 'object_info'))
+    previous = settings_module._settings
+    env = _TestEnvironment(tmp_path)
+    env.configure()
+    yield env
+    _reset_singletons()
+    settings_module._settings = previous
+
+@pytest.fixture
+def comfy(settings) -> FakeComfyUI:
+    """
+    假ComfyUI服务器，共享HTTP客户端的请求都发往它（重新配置后仍然有效）
+    Fake ComfyUI server receiving every request of the shared HTTP client (kept across reconfiguration)
+    """
+    settings.fake = FakeComfyUI()
+    _install(settings.fake)
+    return settings.fake
+
+async def _run(env: _TestEnvironment, coro):
+    from mcp_server.backends import close_backend_pool
+    from mcp_server.comfyui_client import close_comfyui_client
+    from mcp_server.completion import close_completion_tracker
+    from mcp_server.jobs import close_job_manager
+    if env.fake is not None:
+        _install(env.fake)
+    try:
+        return await coro
+    finally:
+        await close_job_manager()
+        await close_backend_pool()
+        await close_completion_tracker()
+        await close_comfyui_client()
+
+@pytest.fixture
+def run(settings):
+    """
+    在新的事件循环中运行协程，结束后关闭共享的后台任务和连接池
+    Run a coroutine on a fresh event loop, closing the shared background tasks and pool afterwards
+    """
+    return lambda coro: asyncio.run(_run(settings, coro))
@@ -0,0 +1,28 @@
+from mcp_server.manifest import WorkflowManifest, run_batch
+
+def test_unpinned_items_get_their_own_jobs(comfy, run, tmp_path):
+    # 相同prompt、未固定种子的N个任务是N个变体，各自提交 | N items with one prompt and no pinned seed are N variations, each submitted
+    manifest = WorkflowManifest.load('txt2img')
+    items = [{'prompt': 'a red fox', 'save_dir': str(tmp_path)} for _ in range(5)]
+    results = run(run_batch(manifest, items))
+    assert all(ok for ok, _ in results)
+    assert len(comfy.prompts) == 5
+    assert len({text for _, text in results}) == 5
+    assert len(list(tmp_path.glob('txt2img_*.png'))) == 5
+
+def test_save_dir_is_rejected_for_url_tools(comfy, run, tmp_path):
+    from mcp.server.fastmcp import FastMCP
+    from mcp.server.fastmcp.exceptions import ToolError
+    from mcp_server.manifest import register_manifest_tools
+    from mcp_server.tools.batch import register_batch_tool
+    mcp = FastMCP('test')
+    register_manifest_tools(mcp)
+    register_batch_tool(mcp)
+    arguments = {'tool': 'img2img', 'items': [{'prompt': 'a red fox'}], 'save_dir': str(tmp_path)}
+    try:
+        run(mcp.call_tool('batch_generate', arguments))
+    except ToolError as e:
+        assert 'does not accept save_dir' in str(e)
+    else:
+        raise AssertionError('save_dir was accepted for a URL tool')
+    assert comfy.prompts == {}
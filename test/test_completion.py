@@ -0,0 +1,14 @@
+import json
+
+from mcp_server.completion import get_completion_tracker
+
+def test_execution_error_without_a_message_finishes_the_job(settings, run):
+    tracker = get_completion_tracker()
+
+    async def main():
+        # ComfyUI 可能推送 exception_message: null | ComfyUI may push exception_message: null
+        tracker._handle_message(json.dumps({'type': 'execution_error', 'data': {
+            'prompt_id': 'p1', 'node_id': '3', 'node_type': 'KSampler', 'exception_message': None}}))
+
+    run(main())
+    assert tracker._finished['p1'] == 'ComfyUI执行失败: 节点 3 (KSampler): '
@@ -0,0 +1,52 @@
+import asyncio
+
+from mcp_server.manifest import WorkflowManifest, run_manifest
+from mcp_server.singleflight import get_single_flight
+from mcp_server.templates import SEED_INPUTS
+
+def _seeds(graph):
+    return {(node_id, name): node['inputs'][name]
+            for node_id, node in graph.items() for name in SEED_INPUTS if name in node.get('inputs', {})}
+
+def test_identical_unpinned_calls_are_submitted_separately(comfy, run, tmp_path):
+    # 参数相同但种子随机的并发调用是不同的请求 | Concurrent calls with equal parameters but random seeds are different requests
+    manifest = WorkflowManifest.load('txt2img')
+
+    async def main():
+        return await asyncio.gather(*(
+            run_manifest(manifest, {'prompt': 'a red fox', 'save_dir': str(tmp_path), 'filename': f'fox{i}'})
+            for i in range(3)
+        ))
+
+    results = run(main())
+    assert len(comfy.prompts) == 3
+    assert get_single_flight().coalesced == 0
+    assert len({str(_seeds(graph)) for graph in comfy.prompts.values()}) == 3
+    assert len(set(results)) == 3
+
+def test_identical_pinned_calls_are_coalesced(comfy, run, tmp_path):
+    out = tmp_path / 'out'
+    out.mkdir()
+    manifest = WorkflowManifest.load('txt2img')
+
+    async def main():
+        return await asyncio.gather(*(
+            run_manifest(manifest, {'prompt': 'a red fox', 'seed': 42, 'save_dir': str(out), 'filename': f'fox{i}'})
+            for i in range(3)
+        ))
+
+    run(main())
+    assert len(comfy.prompts) == 1
+    assert get_single_flight().coalesced == 2
+    assert sorted(p.name for p in out.iterdir()) == ['fox0.png', 'fox1.png', 'fox2.png']
+
+def test_unpinned_calls_skip_the_result_cache(comfy, run, settings, tmp_path):
+    settings.configure(result_cache={'enabled': 'true'})
+    manifest = WorkflowManifest.load('txt2img')
+    values = {'prompt': 'a red fox', 'save_dir': str(tmp_path)}
+    run(run_manifest(manifest, {**values, 'filename': 'a'}))
+    run(run_manifest(manifest, {**values, 'filename': 'b'}))
+    assert len(comfy.prompts) == 2
+    run(run_manifest(manifest, {**values, 'filename': 'c', 'seed': 7}))
+    run(run_manifest(manifest, {**values, 'filename': 'd', 'seed': 7}))
+    assert len(comfy.prompts) == 3
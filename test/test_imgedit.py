@@ -0,0 +1,20 @@
+import httpx
+from mcp.server.fastmcp import FastMCP
+
+from mcp_server.tools.imgedit import register_imgedit_tool
+
+def test_result_lines_are_separated_by_real_newlines(comfy, run, tmp_path):
+    handler = comfy.handler
+    comfy.handler = lambda request: (httpx.Response(200, json={'name': 'fox.png'})
+                                     if request.url.path == '/upload/image' else handler(request))
+    image = tmp_path / 'fox.png'
+    image.write_bytes(b'png')
+    mcp = FastMCP('test')
+    register_imgedit_tool(mcp)
+
+    contents = run(mcp.call_tool('imgedit', {'prompt': 'a red fox', 'image1': str(image), 'seed': 7,
+                                             'save_dir': str(tmp_path)}))
+    lines = contents[0].text.split('\n')
+    assert len(lines) == 2
+    assert lines[0].startswith('![image](file:///') and '7' in lines[1]
+    assert '\\n' not in contents[0].text
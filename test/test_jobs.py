@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+import time
+
+from mcp_server.completion import get_completion_tracker
+from mcp_server.jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobStore, get_job_manager, note_submitted
+from mcp_server.manifest import WorkflowManifest, run_manifest
+from mcp_server.settings import get_settings
+
+def _job(job_id, status, prompt_id=None):
+    now = time.time()
+    return {'job_id': job_id, 'tool': 'txt2img', 'arguments': '{}', 'status': status, 'prompt_id': prompt_id,
+            'backend': get_settings().comfyui_server.url if prompt_id else None, 'created_at': now, 'updated_at': now}
+
+def test_store_is_opened_on_the_job_thread(settings, run, monkeypatch):
+    threads = []
+    original = JobStore.__init__
+
+    def init(self, path):
+        threads.append(threading.current_thread().name)
+        original(self, path)
+
+    monkeypatch.setattr(JobStore, '__init__', init)
+
+    async def main():
+        manager = get_job_manager()
+        assert await manager.open() is await manager.open()
+
+    run(main())
+    assert len(threads) == 1 and threads[0].startswith('mcp-jobs')
+
+def test_unfinished_jobs_are_recovered_after_a_restart(comfy, run):
+    store = JobStore(get_settings().jobs.db_path)
+    store.insert(_job('queued', QUEUED))
+    store.insert(_job('done', RUNNING, 'p-done'))
+    store.insert(_job('pending', RUNNING, 'p-pending'))
+    store.close()
+    comfy.complete('p-done')
+
+    async def main():
+        manager = get_job_manager()
+        return [await manager.status(job_id) for job_id in ('queued', 'done', 'pending')]
+
+    queued, done, pending = run(main())
+    assert queued['status'] == FAILED
+    assert done['status'] == SUCCEEDED and 'p-done_0.png' in done['result']
+    assert pending['status'] == RUNNING and pending['prompt_id'] == 'p-pending'
+
+def test_jobs_are_not_coalesced_and_cancel_only_their_own_prompt(comfy, run, tmp_path):
+    manifest = WorkflowManifest.load('txt2img')
+    values = {'prompt': 'a red fox', 'seed': 42, 'save_dir': str(tmp_path)}
+    # 任务提交后保持运行，直到被取消 | Submitted jobs keep running until cancelled
+    comfy.complete = lambda prompt_id: None
+
+    async def main():
+        manager = get_job_manager()
+        job_ids = [await manager.submit('txt2img', values, lambda: run_manifest(manifest, values)) for _ in range(2)]
+        for _ in range(100):
+            statuses = [await manager.status(job_id) for job_id in job_ids]
+            if all(status['prompt_id'] for status in statuses):
+                break
+            await asyncio.sleep(0.01)
+        first, second = [await manager.status(job_id) for job_id in job_ids]
+        cancelled = await manager.cancel(job_ids[0])
+        return first, second, cancelled, await manager.status(job_ids[1])
+
+    first, second, cancelled, other = run(main())
+    assert first['prompt_id'] and second['prompt_id'] and first['prompt_id'] != second['prompt_id']
+    assert cancelled['status'] == CANCELLED
+    assert comfy.cancelled == [first['prompt_id']]
+    assert other['status'] == RUNNING
+
+def test_progress_events_update_only_their_own_prompt(settings, run):
+    tracker = get_completion_tracker()
+    host = get_settings().comfyui_server.url
+    workflow = {'1': {}, '2': {}}
+
+    def push(prompt_id, value):
+        tracker._handle_message(json.dumps({'type': 'progress', 'data': {'prompt_id': prompt_id, 'value': value, 'max': 1}}))
+
+    async def main():
+        manager = get_job_manager()
+        release = asyncio.Event()
+
+        async def job():
+            note_submitted(host, 'p1', workflow)
+            note_submitted(host, 'p2', workflow)
+            await release.wait()
+            return 'done'
+
+        job_id = await manager.submit('batch_generate', {}, job)
+        for _ in range(100):
+            if (await manager.status(job_id))['prompt_id'] == 'p2':
+                break
+            await asyncio.sleep(0.01)
+        # p1 的事件不能喂给后提交的 p2 | Events of p1 must not feed the later p2
+        push('p1', 1)
+        first = (await manager.status(job_id))['progress']
+        push('p2', 1)
+        second = (await manager.status(job_id))['progress']
+        release.set()
+        return first, second
+
+    first, second = run(main())
+    assert first == 0.25
+    assert second == 0.5
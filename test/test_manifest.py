@@ -0,0 +1,64 @@
+import inspect
+
+import pytest
+
+from mcp_server.manifest import ManifestError, ParamSpec, WorkflowManifest
+
+TEMPLATE = {
+    '1': {'class_type': 'EmptyLatentImage', 'inputs': {'width': 512, 'batch_size': 1, 'tiled': False}},
+    '2': {'class_type': 'KSampler', 'inputs': {'cfg': 7.0, 'sampler_name': 'euler', 'text': ''}},
+}
+
+def spec(name, **declaration):
+    return ParamSpec(name, declaration, TEMPLATE)
+
+def test_integer_accepts_integral_values_only():
+    width = spec('width', type='integer', inputs='1.width')
+    assert width.default == 512
+    assert width.coerce(768) == 768
+    assert width.coerce(768.0) == 768
+    assert width.coerce('768') == 768
+    for value in (512.7, '512.7', True, 'wide', None):
+        with pytest.raises(ValueError):
+            width.coerce(value)
+
+def test_boolean_parses_strings_explicitly():
+    tiled = spec('tiled', type='boolean', inputs='1.tiled')
+    assert tiled.coerce('false') is False and tiled.coerce('False') is False and tiled.coerce('0') is False
+    assert tiled.coerce('true') is True and tiled.coerce('on') is True and tiled.coerce(1) is True
+    for value in ('maybe', '', 2, None):
+        with pytest.raises(ValueError):
+            tiled.coerce(value)
+
+def test_number_range_and_choices():
+    cfg = spec('cfg', type='number', inputs='2.cfg', minimum=1, maximum=30)
+    assert cfg.coerce('7.5') == 7.5 and cfg.coerce(3) == 3.0
+    with pytest.raises(ValueError):
+        cfg.coerce(0.5)
+    with pytest.raises(ValueError):
+        cfg.coerce(31)
+    sampler = spec('sampler', inputs='2.sampler_name', enum=['euler', 'dpmpp_2m'])
+    assert sampler.coerce('dpmpp_2m') == 'dpmpp_2m'
+    with pytest.raises(ValueError):
+        sampler.coerce('ddim')
+    with pytest.raises(ValueError):
+        spec('batch', type='integer', inputs='1.batch_size', minimum=2)
+
+def test_required_parameters_have_no_default():
+    manifest = WorkflowManifest('test', {'params': {
+        'text': {'type': 'string', 'required': True, 'inputs': '2.text'},
+        'width': {'type': 'integer', 'inputs': '1.width'},
+    }}, TEMPLATE)
+    parameters = manifest.signature().parameters
+    assert parameters['text'].default is inspect.Parameter.empty
+    assert parameters['width'].default == 512
+    assert manifest.slot_values({'text': 'a fox'}) == {('2', 'text'): 'a fox', ('1', 'width'): 512}
+    with pytest.raises(ValueError):
+        manifest.slot_values({})
+    with pytest.raises(ManifestError):
+        spec('text', required=True, default='x', inputs='2.text')
+
+def test_prompt_is_required_by_the_bundled_manifests(settings):
+    for api_name in ('txt2img', 'txt2bg', 'img2img'):
+        prompt = WorkflowManifest.load(api_name).signature().parameters['prompt']
+        assert prompt.default is inspect.Parameter.empty
@@ -0,0 +1,19 @@
+import types
+
+from mcp_server.comfyui_client import get_comfyui_client
+from mcp_server.metrics import get_metrics_registry
+
+def test_pool_stats_fall_back_to_empty_without_httpcore_internals(comfy, run):
+    async def main():
+        client = get_comfyui_client()
+        # 假服务器的 MockTransport 没有 httpcore 连接池 | The fake server's MockTransport has no httpcore pool
+        without_pool = client.pool_stats()
+        transport = client.client._transport
+        client.client._transport = types.SimpleNamespace(_pool=types.SimpleNamespace(connections=[object()]))
+        unexpected_shape = client.pool_stats()
+        client.client._transport = transport
+        return without_pool, unexpected_shape, get_metrics_registry().render()
+
+    without_pool, unexpected_shape, rendered = run(main())
+    assert without_pool == {} and unexpected_shape == {}
+    assert 'comfyui_http_connections{' not in rendered
@@ -0,0 +1,93 @@
+import json
+import os
+
+import httpx
+
+from mcp_server import object_info
+from mcp_server.object_info import ObjectInfoStore
+
+NODES = {
+    'CheckpointLoaderSimple': {'input': {'required': {'ckpt_name': [['a.safetensors', 'b.safetensors'], {}]}}},
+    'KSampler': {'input': {'required': {'seed': ['INT', {}], 'sampler_name': [['euler', 'dpmpp_2m'], {}]}}},
+}
+
+def write_dump(nodes):
+    os.makedirs(object_info.OBJECT_INFO_DIR, exist_ok=True)
+    store = ObjectInfoStore('127.0.0.1', '8188')
+    with open(store.json_path, 'w', encoding='utf-8') as f:
+        json.dump(nodes, f)
+    return store
+
+def test_index_is_empty_until_loaded_and_parsed_once(settings, run, monkeypatch):
+    store = write_dump(NODES)
+    reads = []
+    original = store._read
+    monkeypatch.setattr(store, '_read', lambda: reads.append(1) or original())
+    assert len(store.index) == 0 and not store.loaded
+    index = run(store.load())
+    assert index is store.index
+    assert index.combo_values('ckpt_name') == ('a.safetensors', 'b.safetensors')
+    assert store.digest == object_info.object_info_digest(NODES)
+    run(store.load())
+    assert reads == [1]
+
+def test_missing_file_loads_an_empty_index(settings, run):
+    store = ObjectInfoStore('127.0.0.1', '8188')
+    assert len(run(store.load())) == 0
+    assert store.loaded and store.digest is None
+
+def test_diff_reports_nodes_and_combo_options():
+    old = object_info.ObjectInfoIndex(NODES)
+    changed = json.loads(json.dumps(NODES))
+    changed['CheckpointLoaderSimple']['input']['required']['ckpt_name'][0] = ['b.safetensors', 'c.safetensors']
+    del changed['KSampler']
+    changed['LoraLoader'] = {'input': {'required': {'lora_name': [['l1.safetensors'], {}]}}}
+    diff = object_info.diff_object_info(old, object_info.ObjectInfoIndex(changed))
+    assert diff['added_nodes'] == ['LoraLoader']
+    assert diff['removed_nodes'] == ['KSampler']
+    assert diff['options']['ckpt_name'] == {'added': ['c.safetensors'], 'removed': ['a.safetensors']}
+    assert diff['options']['sampler_name'] == {'added': [], 'removed': ['dpmpp_2m', 'euler']}
+    assert diff['options']['lora_name'] == {'added': ['l1.safetensors'], 'removed': []}
+
+def test_full_refresh_swaps_the_index_only_when_content_changed(comfy, run):
+    store = write_dump(NODES)
+    comfy.object_info = NODES
+    assert run(store.refresh()) is False
+    comfy.object_info = {**NODES, 'LoraLoader': {'input': {'required': {'lora_name': [['l1.safetensors'], {}]}}}}
+    assert run(store.refresh()) is True
+    assert store.index.combo_values('lora_name') == ('l1.safetensors',)
+    with open(store.json_path, encoding='utf-8') as f:
+        assert 'LoraLoader' in json.load(f)
+
+def test_per_node_refresh_only_fetches_tracked_classes(comfy, settings, run):
+    settings.configure(object_info={'fetch_mode': 'per_node'})
+    # 磁盘上有旧的完整描述（大量节点类），刷新不应逐个请求它们
+    # An older full dump (many classes) is on disk; a refresh must not request each of them
+    old_dump = {f'Custom{i}': {'input': {}} for i in range(200)}
+    store = write_dump({**old_dump, **NODES})
+    comfy.object_info = {**old_dump, **NODES, 'Extra': {'input': {}}}
+    index = run(store.ensure(['Extra', 'Missing']))
+    assert 'Extra' in index
+    comfy.requests.clear()
+    run(store.refresh())
+    fetched = {path.rsplit('/', 1)[1] for _, path in comfy.requests if path.startswith('/api/object_info/')}
+    assert fetched == object_info.required_node_classes() | {'Extra', 'Missing'}
+    assert 'Custom0' not in store.index and 'Extra' in store.index and 'KSampler' in store.index
+
+def test_fetch_uses_a_healthy_backend_when_the_configured_one_is_down(comfy, settings, run):
+    from mcp_server.backends import get_backend_pool
+    from mcp_server.comfyui_client import get_comfyui_client
+    settings.configure(comfyui_server={'backends': '127.0.0.1:8188, 127.0.0.1:8189'})
+    comfy.object_info = NODES
+    hosts = []
+
+    async def fetch():
+        get_comfyui_client()._client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: hosts.append(request.url.port) or comfy.handler(request)))
+        store = ObjectInfoStore('127.0.0.1', '8188')
+        await store.fetch()
+        get_backend_pool().get('http://127.0.0.1:8188').healthy = False
+        return await store.fetch()
+
+    assert run(fetch()) == NODES
+    assert hosts == [8188, 8189]
@@ -0,0 +1,53 @@
+import httpx
+import pytest
+
+from mcp_server import pipeline
+from mcp_server.templates import copy_graph, get_template_registry
+
+def test_rejected_prompt_logs_a_summary_and_sends_the_body_to_the_payload_channel(comfy, run, monkeypatch):
+    errors, payloads = [], []
+    monkeypatch.setattr(pipeline.default_logger, 'error', lambda message, *args, **kwargs: errors.append(message))
+    monkeypatch.setattr(pipeline.default_logger, 'payload', lambda label, payload: payloads.append((label, payload)))
+    handler = comfy.handler
+    comfy.handler = lambda request: (httpx.Response(400, json={'error': 'invalid prompt', 'node_errors': {}})
+                                     if request.url.path == '/api/prompt' else handler(request))
+    workflow = copy_graph(get_template_registry().peek('txt2img'))
+    workflow['76']['inputs']['prompt1'] = 'secret prompt text'
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(pipeline.execute_workflow(workflow))
+    assert len(errors) == 1
+    assert '400' in errors[0] and 'invalid prompt' in errors[0] and 'secret prompt text' not in errors[0]
+    assert payloads[-1][1]['prompt'] is workflow
+
+def test_upload_error_status_propagates_from_prepare(comfy, run):
+    from mcp_server.comfyui_client import get_comfyui_client
+    handler = comfy.handler
+    comfy.handler = lambda request: (httpx.Response(500, text='disk full')
+                                     if request.url.path == '/upload/image' else handler(request))
+
+    async def prepare(comfyui_host, workflow):
+        await get_comfyui_client().upload_image(comfyui_host, 'fox.png', b'png')
+        return workflow
+
+    with pytest.raises(httpx.HTTPStatusError) as raised:
+        run(pipeline.execute_workflow(copy_graph(get_template_registry().peek('txt2img')), prepare=prepare))
+    assert raised.value.response.status_code == 500
+    assert comfy.prompts == {}
+
+def test_network_errors_in_prepare_are_not_counted_against_the_backend(comfy, run, monkeypatch):
+    from mcp_server.backends import get_backend_pool
+    reported = []
+    monkeypatch.setattr(pipeline.default_logger, 'error', lambda message, *args, **kwargs: reported.append(message))
+
+    async def prepare(comfyui_host, workflow):
+        raise httpx.ConnectError('external image host unreachable')
+
+    async def main():
+        for _ in range(3):
+            with pytest.raises(httpx.ConnectError):
+                await pipeline.execute_workflow(copy_graph(get_template_registry().peek('txt2img')), prepare=prepare)
+        return [(backend.healthy, backend.failures) for backend in get_backend_pool().backends]
+
+    assert run(main()) == [(True, 0)]
+    assert len(reported) == 3 and all('ComfyUI接口报错' not in message for message in reported)
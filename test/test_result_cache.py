@@ -0,0 +1,68 @@
+import os
+
+from mcp_server import result_cache
+from mcp_server.result_cache import ResultCache
+from mcp_server.settings import ResultCacheSettings
+
+def make_cache(tmp_path, max_bytes=250, ttl=0.0):
+    return ResultCache(ResultCacheSettings(enabled=True, cache_dir=str(tmp_path / 'cache'), max_bytes=max_bytes, ttl=ttl))
+
+def image(tmp_path, name, size=100):
+    path = tmp_path / f'{name}.png'
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+def test_least_recently_used_entries_are_evicted_by_size(settings, run, tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def main():
+        await cache.store('a', [image(tmp_path, 'a')], {'seeds': {'3.seed': 1}})
+        await cache.store('b', [image(tmp_path, 'b')])
+        # 读取 a 使 b 成为最久未使用的条目 | Reading a makes b the least recently used entry
+        assert (await cache.lookup('a'))[1] == {'seeds': {'3.seed': 1}}
+        await cache.store('c', [image(tmp_path, 'c')])
+        await cache.store('huge', [image(tmp_path, 'huge', 300)])
+        return [key for key in ('a', 'b', 'c', 'huge') if await cache.lookup(key) is not None]
+
+    assert run(main()) == ['a', 'c']
+    assert cache.stats()['bytes'] == 200
+    assert not os.path.exists(tmp_path / 'cache' / 'b')
+    # 索引持久化，重新打开后保留条目和LRU顺序 | The index is persisted; reopening keeps the entries and LRU order
+    # 构造时不读盘，首次查找时在工作线程中加载 | Nothing is read at construction; the first lookup loads it in a worker thread
+    reopened = make_cache(tmp_path)
+    assert reopened.stats()['entries'] == 0 and not reopened.stats()['loaded']
+    assert run(reopened.lookup('missing')) is None
+    assert list(reopened._entries) == ['a', 'c'] and reopened.stats()['bytes'] == 200
+
+def test_expired_entries_miss_and_are_removed(settings, run, tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl=60)
+    now = result_cache.time.time()
+    run(cache.store('a', [image(tmp_path, 'a')]))
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now + 30)
+    assert run(cache.lookup('a')) is not None
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now + 61)
+    assert run(cache.lookup('a')) is None
+    assert cache.stats()['entries'] == 0 and not os.path.exists(tmp_path / 'cache' / 'a')
+
+def test_restore_copies_cached_files_to_the_requested_paths(settings, run, tmp_path):
+    cache = make_cache(tmp_path)
+    run(cache.store('a', [image(tmp_path, 'a')]))
+    cached, _ = run(cache.lookup('a'))
+    target = str(tmp_path / 'out' / 'fox.png')
+    assert run(cache.restore('a', [(cached[0], target)])) == [target]
+    with open(target, 'rb') as f:
+        assert f.read() == b'x' * 100
+
+def test_entry_evicted_between_lookup_and_restore_is_a_miss(settings, run, tmp_path):
+    cache = make_cache(tmp_path, max_bytes=150)
+
+    async def main():
+        await cache.store('a', [image(tmp_path, 'a')])
+        cached, _ = await cache.lookup('a')
+        # 查找之后另一个请求写入新条目，淘汰了 a | Another request stores a new entry after the lookup, evicting a
+        await cache.store('b', [image(tmp_path, 'b')])
+        return await cache.restore('a', [(cached[0], str(tmp_path / 'out' / 'fox.png'))])
+
+    assert run(main()) is None
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 1
+    assert not os.path.exists(tmp_path / 'out' / 'fox.png')
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from mcp.server.fastmcp.exceptions import ToolError
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from mcp_server import mcpserver
+
+def test_import_does_not_build_the_server():
+    code = "import mcp_server.mcpserver as m, mcp_server.manifest as f; assert m._mcp is None and not f._manifests"
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.dirname(mcpserver.__file__)))
+
+def test_lifespan_is_wired_into_fastmcp_and_shared_by_sessions(settings, run, monkeypatch):
+    events = []
+    monkeypatch.setattr(mcpserver, '_start_runtime', lambda: events.append('start'))
+
+    async def stop():
+        events.append('stop')
+
+    monkeypatch.setattr(mcpserver, '_stop_runtime', stop)
+    server = mcpserver.create_server()
+    assert server.settings.lifespan is mcpserver.lifespan
+
+    async def main():
+        # 与 mcp run / mcp dev 一样只通过 FastMCP 的会话进入生命周期 | Enter the lifespan only through FastMCP sessions, like mcp run / mcp dev
+        async with create_connected_server_and_client_session(server._mcp_server) as first:
+            assert 'batch_generate' in {tool.name for tool in (await first.list_tools()).tools}
+            async with create_connected_server_and_client_session(server._mcp_server):
+                assert events == ['start']
+            assert events == ['start']
+        assert events == ['start', 'stop']
+
+    run(main())
+
+def test_submit_job_accepts_only_generation_tools(settings, run):
+    server = mcpserver.create_server()
+
+    async def main():
+        for tool in ('reload_config', 'server_status', 'get_checkpoint_list', 'batch_generate', 'submit_job'):
+            with pytest.raises(ToolError, match='only generation tools'):
+                await server.call_tool('submit_job', {'tool': tool})
+
+    run(main())
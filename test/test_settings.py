@@ -0,0 +1,39 @@
+import pytest
+
+from test.conftest import write_config
+from mcp_server.settings import (
+    CACHE_FORMATS, FETCH_MODES, PRIORITIES, QUEUE_FULL_POLICIES, ROUTING_POLICIES, SEED_POLICIES, TRACE_EXPORTERS,
+    TRANSPORTS, load_settings,
+)
+
+def test_every_seed_policy_loads(tmp_path):
+    for policy in SEED_POLICIES:
+        path = write_config(str(tmp_path), {'generation': {'seed_policy': policy.upper()}})
+        assert load_settings(path).generation.seed_policy == policy
+
+def test_unknown_seed_policy_fails_loudly(tmp_path):
+    path = write_config(str(tmp_path), {'generation': {'seed_policy': 'prompt-hash'}})
+    with pytest.raises(ValueError, match='seed_policy'):
+        load_settings(path)
+
+ENUM_OPTIONS = [
+    ('comfyui_server', 'routing', ROUTING_POLICIES, lambda s: s.comfyui_server.routing),
+    ('admission', 'default_priority', PRIORITIES, lambda s: s.admission.default_priority),
+    ('object_info', 'cache_format', CACHE_FORMATS, lambda s: s.object_info.cache_format),
+    ('object_info', 'fetch_mode', FETCH_MODES, lambda s: s.object_info.fetch_mode),
+    ('mcp_server', 'transport', TRANSPORTS, lambda s: s.mcp_server.transport),
+    ('tracing', 'exporter', TRACE_EXPORTERS, lambda s: s.tracing.exporter),
+    ('logging', 'queue_full_policy', QUEUE_FULL_POLICIES, lambda s: s.logging.queue_full_policy),
+]
+
+@pytest.mark.parametrize('section, option, choices, read', ENUM_OPTIONS)
+def test_every_enum_value_loads(tmp_path, section, option, choices, read):
+    for value in choices:
+        path = write_config(str(tmp_path), {section: {option: value.upper()}})
+        assert read(load_settings(path)) == value
+
+@pytest.mark.parametrize('section, option, choices, read', ENUM_OPTIONS)
+def test_unknown_enum_value_fails_loudly(tmp_path, section, option, choices, read):
+    path = write_config(str(tmp_path), {section: {option: 'bogus'}})
+    with pytest.raises(ValueError, match=f'\\[{section}\\] {option}'):
+        load_settings(path)
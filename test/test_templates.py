@@ -0,0 +1,83 @@
+import json
+import threading
+
+import pytest
+
+from mcp_server.templates import InjectionPlan, TemplateRegistry, copy_graph, encode_prompt_body
+
+TEMPLATE = {
+    '3': {'class_type': 'KSampler', 'inputs': {'seed': 1, 'steps': 20, 'model': ['4', 0]}},
+    '4': {'class_type': 'CheckpointLoaderSimple', 'inputs': {'ckpt_name': 'a.safetensors'}},
+    '6': {'class_type': 'CLIPTextEncode', 'inputs': {'text': '', 'clip': ['4', 1]}, '_meta': {'title': '正向'}},
+}
+
+def body_bytes(graph):
+    return encode_prompt_body({'client_id': 'c', 'prompt': graph})
+
+def test_shared_nodes_are_read_only():
+    graph = InjectionPlan(TEMPLATE, [('6', 'text')]).build({('6', 'text'): 'a fox'})
+    with pytest.raises(TypeError):
+        graph['4']['inputs']['ckpt_name'] = 'b.safetensors'
+    with pytest.raises(TypeError):
+        graph['6']['inputs']['clip'].append(2)
+    with pytest.raises(TypeError):
+        graph['4'].update(class_type='Other')
+    assert TEMPLATE['4']['inputs']['ckpt_name'] == 'a.safetensors'
+
+def test_edited_nodes_are_sent_with_their_new_contents():
+    plan = InjectionPlan(TEMPLATE, [('6', 'text')])
+    graph = plan.build({('6', 'text'): 'a fox'})
+    # 复制后修改共享节点，请求体必须带上新内容而不是预编码的旧片段
+    # Editing a shared node after copying it must send the new contents, not the stale pre-encoded fragment
+    graph['4'] = copy_graph(graph['4'])
+    graph['4']['inputs']['ckpt_name'] = 'b.safetensors'
+    sent = json.loads(body_bytes(graph))
+    assert sent['prompt']['4']['inputs']['ckpt_name'] == 'b.safetensors'
+    assert sent['prompt'] == json.loads(json.dumps(graph))
+    # 计划本身不受影响 | The plan itself is unaffected
+    assert json.loads(body_bytes(plan.build({})))['prompt']['4']['inputs']['ckpt_name'] == 'a.safetensors'
+
+def compact(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+def test_encoded_body_matches_json_dumps():
+    plan = InjectionPlan(TEMPLATE, [('6', 'text'), ('3', 'steps')])
+    graph = plan.build({('6', 'text'): '一只红狐狸 "quoted"', ('3', 'steps'): 30})
+    graph['3']['inputs']['seed'] = 2 ** 70
+    graph['9'] = {'class_type': 'SaveImage', 'inputs': {'images': ['8', 0]}}
+    del graph['4']
+    body = {'client_id': 'c', 'prompt': graph, 'extra_data': {'api_key_comfy_org': 'k'}}
+    assert json.loads(encode_prompt_body(body)) == json.loads(compact(body))
+    assert encode_prompt_body({'client_id': 'c', 'prompt': plan.build({})}) == compact(
+        {'client_id': 'c', 'prompt': {**TEMPLATE}})
+
+def test_bundled_templates_encode_like_json_dumps(settings):
+    from mcp_server.templates import get_template_registry
+    registry = get_template_registry()
+    for api_name in registry.api_names():
+        template = registry.peek(api_name)
+        plan = registry.plan(api_name)
+        graph = plan.build({})
+        assert plan.encode(graph) == compact(template), api_name
+
+def test_aplan_checks_the_template_file_off_the_event_loop(tmp_path, run):
+    (tmp_path / 'demo_api.json').write_text(json.dumps(TEMPLATE), encoding='utf-8')
+    registry = TemplateRegistry(str(tmp_path))
+    threads = []
+    peek = registry.peek
+
+    def recording_peek(api_name):
+        threads.append(threading.current_thread() is threading.main_thread())
+        return peek(api_name)
+
+    registry.peek = recording_peek
+
+    async def main():
+        first = await registry.aplan('demo', [('6', 'text')])
+        # 检查窗口内直接复用已编译的计划 | Within the check window the compiled plan is reused directly
+        second = await registry.aplan('demo', [('6', 'text')])
+        return first, second
+
+    first, second = run(main())
+    assert first is second
+    assert threads == [False]